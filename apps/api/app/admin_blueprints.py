@@ -15,6 +15,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_db
 from .auth import require_superadmin
+from .admin_portraits import PORTRAIT_THUMBNAIL_SIZE, pick_portrait_uri
+from .counting import WINDOW_TOTAL, CountMode, page_total, plan_count
+from .loaders import blueprint_children_loader, blueprint_parents_loader
 
 router = APIRouter(prefix="/admin/blueprints", tags=["admin-blueprints"])
 
@@ -96,7 +99,8 @@ class BlueprintResponse(BaseModel):
     default_last_name: str
     default_bio: LocalizedText  # Always return as LocalizedText dict
     default_portrait_id: Optional[str]
-    default_portrait_uri: Optional[str]
+    default_portrait_uri: Optional[str]  # original
+    default_portrait_thumbnail_uri: Optional[str]  # list/avatar size derivative
     skills: list[str]
     system_prompt: LocalizedText  # Always return as LocalizedText dict
     webhooks: dict
@@ -110,7 +114,8 @@ class BlueprintResponse(BaseModel):
 
 class BlueprintListResponse(BaseModel):
     items: list[BlueprintResponse]
-    total: int
+    total: int | None
+    total_estimated: bool = False
     page: int
     page_size: int
 
@@ -126,6 +131,7 @@ async def list_blueprints(
     search: Optional[str] = None,
     level: Optional[str] = None,
     is_active: Optional[bool] = None,
+    count: CountMode = Query("auto", description="Total: auto, exact, estimated or none"),
     db: AsyncSession = Depends(get_db),
     _user: dict = Depends(require_superadmin)
 ):
@@ -137,7 +143,8 @@ async def list_blueprints(
     params = {"limit": page_size, "offset": offset}
     
     if search:
-        conditions.append("(b.code ILIKE :search OR b.role ILIKE :search OR b.default_first_name ILIKE :search OR b.default_last_name ILIKE :search)")
+        # code, role (fr/en), default names -> search_doc + trigram index (schema v8)
+        conditions.append("b.search_doc ILIKE :search")
         params["search"] = f"%{search}%"
     
     if level:
@@ -150,22 +157,20 @@ async def list_blueprints(
     
     where_clause = " AND ".join(conditions) if conditions else "TRUE"
     
-    # Count total
-    count_result = await db.execute(
-        text(f"SELECT COUNT(*) FROM blueprints b WHERE {where_clause}"),
-        params
-    )
-    total = count_result.scalar()
+    from_sql = f"FROM blueprints b WHERE {where_clause}"
+    count_plan = await plan_count(db, count, from_sql, params)
+    total_column = f", {WINDOW_TOTAL}" if count_plan.window else ""
     
-    # Fetch blueprints
+    # Fetch blueprints (+ exact total in the same query when needed)
     result = await db.execute(
         text(f"""
             SELECT 
                 b.id, b.code, b.role, b.level::text, 
                 b.default_first_name, b.default_last_name, b.default_bio,
-                b.default_portrait_id::text, p.uri as portrait_uri,
+                b.default_portrait_id::text, p.uri as portrait_uri, p.derivatives as portrait_derivatives,
                 b.skills, b.system_prompt, b.webhooks,
                 b.is_active, b.created_at, b.updated_at
+                {total_column}
             FROM blueprints b
             LEFT JOIN portrait_library p ON p.id = b.default_portrait_id
             WHERE {where_clause}
@@ -175,35 +180,18 @@ async def list_blueprints(
         params
     )
     rows = result.mappings().all()
+    total = await page_total(db, count_plan, rows, from_sql, params, offset)
     
-    # Fetch relations for each blueprint
+    # Fetch relations for the whole page: one query per relation
+    page_ids = [row["id"] for row in rows]
+    parents_by_id = await blueprint_parents_loader(db).load_many(page_ids)
+    children_by_id = await blueprint_children_loader(db).load_many(page_ids)
+
     items = []
     for row in rows:
         blueprint_id = str(row["id"])
-        
-        # Get parent blueprints (N-1 managers for this N-2)
-        parents_result = await db.execute(
-            text("""
-                SELECT bp.id::text, bp.code, bp.role 
-                FROM blueprint_relations br
-                JOIN blueprints bp ON bp.id = br.parent_blueprint_id
-                WHERE br.child_blueprint_id = :id
-            """),
-            {"id": blueprint_id}
-        )
-        parents = [dict(r) for r in parents_result.mappings().all()]
-        
-        # Get child blueprints (N-2 subordinates for this N-1)
-        children_result = await db.execute(
-            text("""
-                SELECT bp.id::text, bp.code, bp.role 
-                FROM blueprint_relations br
-                JOIN blueprints bp ON bp.id = br.child_blueprint_id
-                WHERE br.parent_blueprint_id = :id
-            """),
-            {"id": blueprint_id}
-        )
-        children = [dict(r) for r in children_result.mappings().all()]
+        parents = parents_by_id[blueprint_id]
+        children = children_by_id[blueprint_id]
         
         items.append(BlueprintResponse(
             id=blueprint_id,
@@ -215,6 +203,7 @@ async def list_blueprints(
             default_bio=row["default_bio"],
             default_portrait_id=row["default_portrait_id"],
             default_portrait_uri=row["portrait_uri"],
+            default_portrait_thumbnail_uri=pick_portrait_uri(row["portrait_uri"], row["portrait_derivatives"], PORTRAIT_THUMBNAIL_SIZE),
             skills=row["skills"] or [],
             system_prompt=row["system_prompt"],
             webhooks=row["webhooks"] or {},
@@ -225,7 +214,13 @@ async def list_blueprints(
             updated_at=row["updated_at"],
         ))
     
-    return BlueprintListResponse(items=items, total=total, page=page, page_size=page_size)
+    return BlueprintListResponse(
+        items=items,
+        total=total,
+        total_estimated=count_plan.estimated,
+        page=page,
+        page_size=page_size,
+    )
 
 
 @router.post("", response_model=BlueprintResponse, status_code=status.HTTP_201_CREATED)
@@ -310,14 +305,16 @@ async def create_blueprint(
     
     # Fetch portrait URI if set
     portrait_uri = None
+    portrait_thumbnail_uri = None
     if data.default_portrait_id:
         p_result = await db.execute(
-            text("SELECT uri FROM portrait_library WHERE id = CAST(:id AS uuid)"),
+            text("SELECT uri, derivatives FROM portrait_library WHERE id = CAST(:id AS uuid)"),
             {"id": data.default_portrait_id}
         )
         p_row = p_result.first()
         if p_row:
             portrait_uri = p_row[0]
+            portrait_thumbnail_uri = pick_portrait_uri(p_row[0], p_row[1], PORTRAIT_THUMBNAIL_SIZE)
     
     return BlueprintResponse(
         id=blueprint_id,
@@ -329,6 +326,7 @@ async def create_blueprint(
         default_bio=data.default_bio,
         default_portrait_id=data.default_portrait_id,
         default_portrait_uri=portrait_uri,
+        default_portrait_thumbnail_uri=portrait_thumbnail_uri,
         skills=data.skills,
         system_prompt=data.system_prompt,
         webhooks=data.webhooks.model_dump(),
@@ -352,7 +350,7 @@ async def get_blueprint(
             SELECT 
                 b.id, b.code, b.role, b.level::text, 
                 b.default_first_name, b.default_last_name, b.default_bio,
-                b.default_portrait_id::text, p.uri as portrait_uri,
+                b.default_portrait_id::text, p.uri as portrait_uri, p.derivatives as portrait_derivatives,
                 b.skills, b.system_prompt, b.webhooks,
                 b.is_active, b.created_at, b.updated_at
             FROM blueprints b
@@ -367,27 +365,8 @@ async def get_blueprint(
         raise HTTPException(status_code=404, detail="Blueprint not found")
     
     # Get relations
-    parents_result = await db.execute(
-        text("""
-            SELECT bp.id::text, bp.code, bp.role 
-            FROM blueprint_relations br
-            JOIN blueprints bp ON bp.id = br.parent_blueprint_id
-            WHERE br.child_blueprint_id = CAST(:id AS uuid)
-        """),
-        {"id": blueprint_id}
-    )
-    parents = [dict(r) for r in parents_result.mappings().all()]
-    
-    children_result = await db.execute(
-        text("""
-            SELECT bp.id::text, bp.code, bp.role 
-            FROM blueprint_relations br
-            JOIN blueprints bp ON bp.id = br.child_blueprint_id
-            WHERE br.parent_blueprint_id = CAST(:id AS uuid)
-        """),
-        {"id": blueprint_id}
-    )
-    children = [dict(r) for r in children_result.mappings().all()]
+    parents = await blueprint_parents_loader(db).load(row["id"])
+    children = await blueprint_children_loader(db).load(row["id"])
     
     return BlueprintResponse(
         id=str(row["id"]),
@@ -399,6 +378,7 @@ async def get_blueprint(
         default_bio=row["default_bio"],
         default_portrait_id=row["default_portrait_id"],
         default_portrait_uri=row["portrait_uri"],
+        default_portrait_thumbnail_uri=pick_portrait_uri(row["portrait_uri"], row["portrait_derivatives"], PORTRAIT_THUMBNAIL_SIZE),
         skills=row["skills"] or [],
         system_prompt=row["system_prompt"],
         webhooks=row["webhooks"] or {},
@@ -13,6 +13,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_db
 from .auth import require_superadmin
+from .counting import WINDOW_TOTAL, CountMode, page_total, plan_count
+from .loaders import company_users_loader
 
 router = APIRouter(prefix="/admin/companies", tags=["admin-companies"])
 
@@ -76,7 +78,8 @@ class CompanyResponse(BaseModel):
 
 class CompanyListResponse(BaseModel):
     items: list[CompanyResponse]
-    total: int
+    total: int | None
+    total_estimated: bool = False
     page: int
     page_size: int
 
@@ -98,6 +101,7 @@ async def list_companies(
     search: str | None = Query(None, description="Search by code, name, legal_name"),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    count: CountMode = Query("auto", description="Total: auto, exact, estimated or none"),
     db: AsyncSession = Depends(get_db),
     _: dict = Depends(require_superadmin)
 ):
@@ -109,49 +113,34 @@ async def list_companies(
     params = {"limit": page_size, "offset": offset}
     
     if search:
-        search_condition = """
-            AND (
-                code ILIKE :search 
-                OR name ILIKE :search 
-                OR legal_name ILIKE :search
-            )
-        """
+        # search_doc: generated column + trigram index (schema v8)
+        search_condition = "AND search_doc ILIKE :search"
         params["search"] = f"%{search}%"
     
-    # Get total count
-    count_result = await db.execute(
-        text(f"SELECT COUNT(*) FROM companies WHERE 1=1 {search_condition}"),
-        params
-    )
-    total = count_result.scalar()
+    from_sql = f"FROM companies WHERE 1=1 {search_condition}"
+    count_plan = await plan_count(db, count, from_sql, params)
+    total_column = f", {WINDOW_TOTAL}" if count_plan.window else ""
     
-    # Get companies
+    # Get companies (+ exact total in the same query when needed)
     result = await db.execute(
         text(f"""
             SELECT id, code, name, legal_name, tagline, description_short, website_url,
                    country_code, siret, locale, timezone, currency, is_active, created_at, updated_at
-            FROM companies
-            WHERE 1=1 {search_condition}
+                   {total_column}
+            {from_sql}
             ORDER BY created_at DESC
             LIMIT :limit OFFSET :offset
         """),
         params
     )
     companies = result.mappings().all()
+    total = await page_total(db, count_plan, companies, from_sql, params, offset)
     
-    # Fetch assigned users for each company
+    # Fetch assigned users for the whole page in one query
+    assigned = await company_users_loader(db).load_many(c["id"] for c in companies)
     items = []
     for company in companies:
-        users_result = await db.execute(
-            text("""
-                SELECT u.id::text, u.email, u.first_name, u.last_name, u.role
-                FROM admin_users u
-                JOIN admin_user_companies auc ON u.id = auc.admin_user_id
-                WHERE auc.company_id = :company_id
-            """),
-            {"company_id": company["id"]}
-        )
-        users = [dict(row) for row in users_result.mappings().all()]
+        users = assigned[str(company["id"])]
         
         items.append(CompanyResponse(
             id=str(company["id"]),
@@ -175,6 +164,7 @@ async def list_companies(
     return CompanyListResponse(
         items=items,
         total=total,
+        total_estimated=count_plan.estimated,
         page=page,
         page_size=page_size,
     )
@@ -284,16 +274,7 @@ async def get_company(
         raise HTTPException(status_code=404, detail="Company not found")
     
     # Get assigned users
-    users_result = await db.execute(
-        text("""
-            SELECT u.id::text, u.email, u.first_name, u.last_name, u.role
-            FROM admin_users u
-            JOIN admin_user_companies auc ON u.id = auc.admin_user_id
-            WHERE auc.company_id = :company_id
-        """),
-        {"company_id": company_id}
-    )
-    users = [dict(row) for row in users_result.mappings().all()]
+    users = await company_users_loader(db).load(company["id"])
     
     return CompanyResponse(
         id=str(company["id"]),
@@ -1,24 +1,45 @@
 """
 Admin Portrait Library API
 Endpoints for managing portrait images (upload, list, delete)
+Uploads also get resized derivatives (64/128/256 px, WebP + JPEG), generated
+in the background and recorded in portrait_library.derivatives.
+Files are content-addressed in the portrait storage backend (sha256 names):
+uploading the same image twice returns the existing portrait.
 """
 
+import io
+import json
+import logging
 import os
-import uuid
 from datetime import datetime
-from typing import Optional
+from hashlib import sha256
+from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .db import get_db
+from .db import AsyncSessionLocal, get_db
 from .auth import require_superadmin, get_current_user
+from .portrait_storage import get_portrait_storage
 from .settings import settings
 
 router = APIRouter(prefix="/admin/portraits", tags=["admin-portraits"])
 
+log = logging.getLogger(__name__)
+
+# Derivatives: square, center-cropped
+PORTRAIT_SIZES = (64, 128, 256)
+PORTRAIT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+PORTRAIT_THUMBNAIL_SIZE = 128
+
+PORTRAIT_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/gif": ".gif"}
+
 
 # =============================================================================
 # Pydantic Models
@@ -28,6 +49,8 @@ class PortraitResponse(BaseModel):
     id: str
     filename: str
     uri: str
+    thumbnail_uri: str
+    derivatives: dict[str, dict[str, str]] = {}
     uploaded_by: Optional[str]
     created_at: datetime
 
@@ -41,17 +64,122 @@ class PortraitListResponse(BaseModel):
 # Helper Functions
 # =============================================================================
 
-def get_upload_dir() -> str:
-    """Get the directory for portrait uploads."""
-    upload_dir = getattr(settings, "PORTRAIT_UPLOAD_DIR", "/tmp/portraits")
-    os.makedirs(upload_dir, exist_ok=True)
-    return upload_dir
-
-
 def get_portrait_url(filename: str) -> str:
     """Get the public URL for a portrait."""
-    base_url = getattr(settings, "PORTRAIT_BASE_URL", "/static/portraits")
-    return f"{base_url}/{filename}"
+    return f"{settings.PORTRAIT_BASE_URL}/{filename}"
+
+
+def portrait_key(uri: str) -> str:
+    """Storage key of a portrait URI (its file name)."""
+    return os.path.basename(uri)
+
+
+async def _store(key: str, data: bytes) -> None:
+    """Content-addressed put: an existing key already holds these bytes."""
+    storage = get_portrait_storage()
+    if await storage.stat(key) is None:
+        await storage.put(key, data)
+
+
+def pick_portrait_uri(uri: Optional[str], derivatives: Any, size: int, fmt: str = "webp") -> Optional[str]:
+    """
+    URI of the smallest derivative >= size (largest one otherwise), `uri`
+    (the original) while derivatives are not generated yet or for size 0.
+    """
+    if not uri or not size or not derivatives:
+        return uri
+    if isinstance(derivatives, str):
+        derivatives = json.loads(derivatives)
+    sizes = sorted(int(k) for k in derivatives)
+    if not sizes:
+        return uri
+    best = next((s for s in sizes if s >= size), sizes[-1])
+    variant = derivatives.get(str(best)) or {}
+    return variant.get(fmt) or variant.get("jpeg") or uri
+
+
+def _render_derivatives(content: bytes) -> tuple[int, int, dict[tuple[int, str], bytes]]:
+    """CPU-bound (run in threadpool): original size + encoded variants."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(content)) as img:
+        img.seek(0)  # GIF animés: première image
+        img = ImageOps.exif_transpose(img)
+        width, height = img.size
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+
+        out: dict[tuple[int, str], bytes] = {}
+        for size in PORTRAIT_SIZES:
+            square = ImageOps.fit(img, (size, size), method=Image.Resampling.LANCZOS)
+            for fmt, (pil_format, options) in PORTRAIT_FORMATS.items():
+                frame = square
+                if pil_format == "JPEG" and frame.mode == "RGBA":
+                    # pas d'alpha en JPEG: fond blanc
+                    bg = Image.new("RGB", frame.size, (255, 255, 255))
+                    bg.paste(frame, mask=frame.getchannel("A"))
+                    frame = bg
+                buf = io.BytesIO()
+                frame.save(buf, format=pil_format, **options)
+                out[(size, fmt)] = buf.getvalue()
+    return width, height, out
+
+
+async def generate_derivatives(portrait_id: str, key: str, content: Optional[bytes] = None) -> None:
+    """Background task: store the variants (`<stem>_<size>.<ext>`) and record them."""
+    try:
+        if content is None:
+            content = await get_portrait_storage().get(key)
+            if content is None:
+                raise FileNotFoundError(key)
+        width, height, variants = await run_in_threadpool(_render_derivatives, content)
+
+        stem = os.path.splitext(key)[0]
+        derivatives: dict[str, dict[str, str]] = {}
+        for (size, fmt), data in variants.items():
+            ext = "jpg" if fmt == "jpeg" else fmt
+            filename = f"{stem}_{size}.{ext}"
+            await _store(filename, data)
+            derivatives.setdefault(str(size), {})[fmt] = get_portrait_url(filename)
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                text("""
+                    UPDATE portrait_library
+                    SET derivatives = CAST(:derivatives AS jsonb),
+                        width = :width,
+                        height = :height
+                    WHERE id = CAST(:id AS uuid)
+                """),
+                {"id": portrait_id, "derivatives": json.dumps(derivatives), "width": width, "height": height},
+            )
+            await db.commit()
+    except Exception:
+        # l'original reste servi (pick_portrait_uri retombe sur uri)
+        log.exception("portrait derivatives failed for %s", portrait_id)
+
+
+async def _portrait_by_hash(db: AsyncSession, digest: str) -> Optional[PortraitResponse]:
+    result = await db.execute(
+        text("""
+            SELECT p.id::text, p.filename, p.uri, p.derivatives, p.uploaded_by::text, p.created_at
+            FROM portrait_library p
+            WHERE p.content_sha256 = :digest
+        """),
+        {"digest": digest}
+    )
+    row = result.mappings().first()
+    if not row:
+        return None
+    return PortraitResponse(
+        id=row["id"],
+        filename=row["filename"],
+        uri=row["uri"],
+        thumbnail_uri=pick_portrait_uri(row["uri"], row["derivatives"], PORTRAIT_THUMBNAIL_SIZE),
+        derivatives=row["derivatives"] or {},
+        uploaded_by=row["uploaded_by"],
+        created_at=row["created_at"],
+    )
 
 
 # =============================================================================
@@ -82,7 +210,7 @@ async def list_portraits(
     # Fetch
     result = await db.execute(
         text(f"""
-            SELECT p.id::text, p.filename, p.uri, p.uploaded_by::text, p.created_at
+            SELECT p.id::text, p.filename, p.uri, p.derivatives, p.uploaded_by::text, p.created_at
             FROM portrait_library p
             WHERE {where_clause}
             ORDER BY p.created_at DESC
@@ -96,6 +224,8 @@ async def list_portraits(
             id=row["id"],
             filename=row["filename"],
             uri=row["uri"],
+            thumbnail_uri=pick_portrait_uri(row["uri"], row["derivatives"], PORTRAIT_THUMBNAIL_SIZE),
+            derivatives=row["derivatives"] or {},
             uploaded_by=row["uploaded_by"],
             created_at=row["created_at"],
         )
@@ -107,11 +237,13 @@ async def list_portraits(
 
 @router.post("", response_model=PortraitResponse, status_code=status.HTTP_201_CREATED)
 async def upload_portrait(
+    background_tasks: BackgroundTasks,
+    response: Response,
     file: UploadFile = File(...),
     db: AsyncSession = Depends(get_db),
     user: dict = Depends(require_superadmin)
 ):
-    """Upload a new portrait image."""
+    """Upload a new portrait image (derivatives are generated in the background)."""
     # Validate file type
     allowed_types = ["image/jpeg", "image/png", "image/webp", "image/gif"]
     if file.content_type not in allowed_types:
@@ -125,42 +257,47 @@ async def upload_portrait(
     if len(content) > 5 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="File too large. Max 5MB.")
     
-    # Generate unique filename
-    ext = os.path.splitext(file.filename or "image.png")[1].lower()
-    if ext not in [".jpg", ".jpeg", ".png", ".webp", ".gif"]:
-        ext = ".png"
-    unique_filename = f"{uuid.uuid4()}{ext}"
-    
-    # Save file
-    upload_dir = get_upload_dir()
-    file_path = os.path.join(upload_dir, unique_filename)
-    
-    with open(file_path, "wb") as f:
-        f.write(content)
-    
-    # Get public URI
-    uri = get_portrait_url(unique_filename)
+    # Content-addressed name
+    digest = sha256(content).hexdigest()
+    key = f"{digest}{PORTRAIT_EXTENSIONS[file.content_type]}"
+    uri = get_portrait_url(key)
+
+    # Dedupe: same bytes -> existing portrait
+    existing = await _portrait_by_hash(db, digest)
+    if existing:
+        response.status_code = status.HTTP_200_OK
+        return existing
+
+    await _store(key, content)
     
-    # Insert into database
+    # Insert into database (a concurrent upload of the same image wins the race)
     result = await db.execute(
         text("""
-            INSERT INTO portrait_library (filename, uri, uploaded_by)
-            VALUES (:filename, :uri, CAST(:uploaded_by AS uuid))
+            INSERT INTO portrait_library (filename, uri, uploaded_by, content_sha256)
+            VALUES (:filename, :uri, CAST(:uploaded_by AS uuid), :digest)
+            ON CONFLICT (content_sha256) WHERE content_sha256 IS NOT NULL DO NOTHING
             RETURNING CAST(id AS text), created_at
         """),
         {
-            "filename": file.filename or unique_filename,
+            "filename": file.filename or key,
             "uri": uri,
             "uploaded_by": user["id"],
+            "digest": digest,
         }
     )
     row = result.mappings().first()
     await db.commit()
+    if not row:
+        response.status_code = status.HTTP_200_OK
+        return await _portrait_by_hash(db, digest)
+
+    background_tasks.add_task(generate_derivatives, row["id"], key, content)
     
     return PortraitResponse(
         id=row["id"],
-        filename=file.filename or unique_filename,
+        filename=file.filename or key,
         uri=uri,
+        thumbnail_uri=uri,
         uploaded_by=user["id"],
         created_at=row["created_at"],
     )
@@ -176,7 +313,7 @@ async def delete_portrait(
     """Delete a portrait from the library."""
     # Get portrait info
     result = await db.execute(
-        text("SELECT uri FROM portrait_library WHERE id = CAST(:id AS uuid)"),
+        text("SELECT uri, derivatives FROM portrait_library WHERE id = CAST(:id AS uuid)"),
         {"id": portrait_id}
     )
     row = result.first()
@@ -222,10 +359,33 @@ async def delete_portrait(
     
     # Try to delete file from disk (best-effort, don't fail if file missing)
     try:
-        uri = row[0]
-        filename = os.path.basename(uri)
-        file_path = os.path.join(get_upload_dir(), filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        storage = get_portrait_storage()
+        uris = [row[0]] + [u for variant in (row[1] or {}).values() for u in variant.values()]
+        for uri in uris:
+            await storage.delete(portrait_key(uri))
     except Exception:
         pass  # File cleanup is best-effort
+
+
+@router.post("/{portrait_id}/derivatives", status_code=status.HTTP_202_ACCEPTED)
+async def regenerate_derivatives(
+    portrait_id: str,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    _user: dict = Depends(require_superadmin)
+):
+    """(Re)generate the resized variants, e.g. for portraits uploaded before derivatives existed."""
+    result = await db.execute(
+        text("SELECT uri FROM portrait_library WHERE id = CAST(:id AS uuid)"),
+        {"id": portrait_id}
+    )
+    row = result.first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Portrait not found")
+
+    key = portrait_key(row[0])
+    if await get_portrait_storage().stat(key) is None:
+        raise HTTPException(status_code=404, detail="Portrait file not found")
+
+    background_tasks.add_task(generate_derivatives, portrait_id, key)
+    return {"ok": True, "portrait_id": portrait_id}
@@ -0,0 +1,98 @@
+"""
+Admin global search
+One ranked search over companies, admin users and blueprints
+(pg_trgm indexes on search_doc, schema v8)
+"""
+
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import get_db
+from .auth import require_superadmin
+
+router = APIRouter(prefix="/admin/search", tags=["admin-search"])
+
+SearchType = Literal["company", "user", "blueprint"]
+
+# Une branche par type: chaque branche reste servie par son index trigram
+# et est bornée avant le classement global.
+SEARCH_BRANCHES: dict[str, str] = {
+    "company": """
+        SELECT 'company' AS type, id::text AS id, code AS label, name AS subtitle,
+               is_active,
+               CASE WHEN lower(code) = :q THEN 1.0
+                    ELSE word_similarity(:q, search_doc) END AS score
+        FROM companies
+        WHERE search_doc LIKE :pattern OR :q <% search_doc
+        ORDER BY score DESC
+        LIMIT :limit
+    """,
+    "user": """
+        SELECT 'user' AS type, id::text AS id, email::text AS label,
+               trim(first_name || ' ' || last_name) AS subtitle,
+               is_active,
+               CASE WHEN lower(email::text) = :q THEN 1.0
+                    ELSE word_similarity(:q, search_doc) END AS score
+        FROM admin_users
+        WHERE search_doc LIKE :pattern OR :q <% search_doc
+        ORDER BY score DESC
+        LIMIT :limit
+    """,
+    "blueprint": """
+        SELECT 'blueprint' AS type, id::text AS id, code AS label,
+               COALESCE(NULLIF(role->>'fr', ''), role->>'en') AS subtitle,
+               is_active,
+               CASE WHEN lower(code) = :q THEN 1.0
+                    ELSE word_similarity(:q, search_doc) END AS score
+        FROM blueprints
+        WHERE search_doc LIKE :pattern OR :q <% search_doc
+        ORDER BY score DESC
+        LIMIT :limit
+    """,
+}
+
+
+class SearchHit(BaseModel):
+    type: SearchType
+    id: str
+    label: str
+    subtitle: Optional[str]
+    is_active: bool
+    score: float
+
+
+class SearchResponse(BaseModel):
+    q: str
+    items: list[SearchHit]
+
+
+@router.get("", response_model=SearchResponse)
+async def admin_search(
+    q: str = Query(..., min_length=2, max_length=100),
+    types: Optional[list[SearchType]] = Query(None, description="Restrict to some entity types"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    _: dict = Depends(require_superadmin),
+):
+    """Search companies, admin users and blueprints, ranked together."""
+    needle = q.strip().lower()
+    selected = [t for t in SEARCH_BRANCHES if not types or t in types]
+
+    union = " UNION ALL ".join(f"({SEARCH_BRANCHES[t]})" for t in selected)
+    rows = (await db.execute(
+        text(f"""
+            SELECT * FROM ({union}) hits
+            ORDER BY score DESC, label
+            LIMIT :limit
+        """),
+        {"q": needle, "pattern": f"%{needle}%", "limit": limit},
+    )).mappings().all()
+
+    return SearchResponse(
+        q=q,
+        items=[SearchHit(**{**r, "score": float(r["score"])}) for r in rows],
+    )
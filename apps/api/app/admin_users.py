@@ -13,6 +13,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_db
 from .auth import require_superadmin, hash_password
+from .counting import WINDOW_TOTAL, CountMode, page_total, plan_count
+from .loaders import user_companies_loader
 
 router = APIRouter(prefix="/admin/users", tags=["admin-users"])
 
@@ -57,7 +59,8 @@ class AdminUserResponse(BaseModel):
 
 class AdminUserListResponse(BaseModel):
     items: list[AdminUserResponse]
-    total: int
+    total: int | None
+    total_estimated: bool = False
     page: int
     page_size: int
 
@@ -79,6 +82,7 @@ async def list_admin_users(
     search: str | None = Query(None, description="Search by email, first_name, last_name"),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    count: CountMode = Query("auto", description="Total: auto, exact, estimated or none"),
     db: AsyncSession = Depends(get_db),
     _: dict = Depends(require_superadmin)
 ):
@@ -90,50 +94,34 @@ async def list_admin_users(
     params = {"limit": page_size, "offset": offset}
     
     if search:
-        search_condition = """
-            AND (
-                email ILIKE :search 
-                OR first_name ILIKE :search 
-                OR last_name ILIKE :search
-                OR organization ILIKE :search
-            )
-        """
+        # search_doc: generated column + trigram index (schema v8)
+        search_condition = "AND search_doc ILIKE :search"
         params["search"] = f"%{search}%"
     
-    # Get total count
-    count_result = await db.execute(
-        text(f"SELECT COUNT(*) FROM admin_users WHERE 1=1 {search_condition}"),
-        params
-    )
-    total = count_result.scalar()
+    from_sql = f"FROM admin_users WHERE 1=1 {search_condition}"
+    count_plan = await plan_count(db, count, from_sql, params)
+    total_column = f", {WINDOW_TOTAL}" if count_plan.window else ""
     
-    # Get users
+    # Get users (+ exact total in the same query when needed)
     result = await db.execute(
         text(f"""
             SELECT id, email, first_name, last_name, role, organization, 
                    valid_until, is_active, created_at, updated_at
-            FROM admin_users
-            WHERE 1=1 {search_condition}
+                   {total_column}
+            {from_sql}
             ORDER BY created_at DESC
             LIMIT :limit OFFSET :offset
         """),
         params
     )
     users = result.mappings().all()
+    total = await page_total(db, count_plan, users, from_sql, params, offset)
     
-    # Fetch companies for each user
+    # Fetch companies for the whole page in one query
+    assigned = await user_companies_loader(db).load_many(u["id"] for u in users)
     items = []
     for user in users:
-        companies_result = await db.execute(
-            text("""
-                SELECT c.id::text, c.code, c.name
-                FROM companies c
-                JOIN admin_user_companies auc ON c.id = auc.company_id
-                WHERE auc.admin_user_id = :user_id
-            """),
-            {"user_id": user["id"]}
-        )
-        companies = [dict(row) for row in companies_result.mappings().all()]
+        companies = assigned[str(user["id"])]
         
         items.append(AdminUserResponse(
             id=str(user["id"]),
@@ -152,6 +140,7 @@ async def list_admin_users(
     return AdminUserListResponse(
         items=items,
         total=total,
+        total_estimated=count_plan.estimated,
         page=page,
         page_size=page_size,
     )
@@ -239,16 +228,7 @@ async def get_admin_user(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get companies
-    companies_result = await db.execute(
-        text("""
-            SELECT c.id::text, c.code, c.name
-            FROM companies c
-            JOIN admin_user_companies auc ON c.id = auc.company_id
-            WHERE auc.admin_user_id = :user_id
-        """),
-        {"user_id": user_id}
-    )
-    companies = [dict(row) for row in companies_result.mappings().all()]
+    companies = await user_companies_loader(db).load(user["id"])
     
     return AdminUserResponse(
         id=str(user["id"]),
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_db
+from .pagination import cursor_params, next_cursor
 
 router = APIRouter()
 
@@ -24,17 +25,34 @@ async def get_artifact(company_code: str, artifact_id: str, db: AsyncSession = D
 
 
 @router.get("/companies/{company_code}/artifacts")
-async def list_artifacts(company_code: str, limit: int = 50, db: AsyncSession = Depends(get_db)):
-    rows = (await db.execute(text("""
+async def list_artifacts(
+    company_code: str,
+    limit: int = 50,
+    cursor: str | None = Query(None, description="Opaque next_cursor from a previous page"),
+    db: AsyncSession = Depends(get_db),
+):
+    limit = max(1, min(limit, 200))
+
+    keyset = ""
+    if cursor:
+        keyset = """
+          AND (a.created_at, a.id) < (
+              CAST(:cursor_created_at AS timestamptz),
+              CAST(:cursor_id AS uuid)
+          )
+        """
+
+    rows = (await db.execute(text(f"""
         SELECT a.id, a.type, a.title, a.uri, a.metadata, a.created_at
         FROM artifacts a
         JOIN companies c ON c.id = a.company_id
         WHERE c.code = :company_code
-        ORDER BY a.created_at DESC
+          {keyset}
+        ORDER BY a.created_at DESC, a.id DESC
         LIMIT :limit
-    """), {"company_code": company_code, "limit": max(1, min(limit, 200))})).mappings().all()
+    """), {"company_code": company_code, "limit": limit + 1, **cursor_params(cursor)})).mappings().all()
 
-    return {"items": [dict(r) for r in rows]}
+    return {"items": [dict(r) for r in rows[:limit]], "next_cursor": next_cursor(rows, limit)}
 
 
 @router.get("/companies/{company_code}/projects/{project_code}/tasks/{task_id}/previews")
@@ -1,10 +1,73 @@
+import json
 import os
+from typing import Any, Optional
+
 from celery import Celery
+from celery.result import AsyncResult
+from starlette.concurrency import run_in_threadpool
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
+# Queue topology: keep in sync with apps/worker/worker/celery_app.py
+QUEUE_DEFAULT = "fm.default"
+QUEUE_PREVIEWS = "fm.previews"
+QUEUE_LONG = "fm.long"
+QUEUE_WEBHOOKS = "fm.webhooks"
+
+JOB_TYPE_QUEUES = {
+    "long_demo": QUEUE_LONG,
+    "webhook": QUEUE_WEBHOOKS,
+    "n8n_webhook": QUEUE_WEBHOOKS,
+    "langflow_webhook": QUEUE_WEBHOOKS,
+}
+JOB_TYPE_QUEUES.update(json.loads(os.getenv("FM_JOB_TYPE_QUEUES") or "{}"))
+
+# tasks.priority -> broker priority (Redis transport: 0 = highest)
+PRIORITY_LEVELS = {"urgent": 0, "high": 3, "normal": 5, "low": 8}
+DEFAULT_PRIORITY = PRIORITY_LEVELS["normal"]
+
 celery_app = Celery(
     "fluidmanager_api",
     broker=REDIS_URL,
     backend=REDIS_URL,
 )
+
+celery_app.conf.update(
+    task_default_queue=QUEUE_DEFAULT,
+    task_routes={
+        "fm.publish_preview_zip": {"queue": QUEUE_PREVIEWS},
+        "fm.echo": {"queue": QUEUE_DEFAULT},
+    },
+    task_default_priority=DEFAULT_PRIORITY,
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+        # bounded publishes (see publisher.PUBLISH_RETRY_POLICY)
+        "socket_connect_timeout": 2,
+        "socket_timeout": 5,
+    },
+)
+
+
+def run_options(job_type: Optional[str], priority: Optional[str]) -> dict[str, Any]:
+    """send_task options for fm.run_task (stored in task_outbox.options)."""
+    return {
+        "queue": JOB_TYPE_QUEUES.get(job_type or "", QUEUE_DEFAULT),
+        "priority": PRIORITY_LEVELS.get(priority or "normal", DEFAULT_PRIORITY),
+    }
+
+
+def _read_job_state(celery_task_id: str) -> dict[str, Any]:
+    r = AsyncResult(celery_task_id, app=celery_app)
+    out: dict[str, Any] = {"state": r.state}
+    if r.successful():
+        out["result"] = r.result
+    elif r.failed():
+        out["error"] = str(r.result)
+    return out
+
+
+async def fetch_job_state(celery_task_id: str) -> dict[str, Any]:
+    """Result-backend lookup (blocking Redis calls) run off the event loop."""
+    return await run_in_threadpool(_read_job_state, celery_task_id)
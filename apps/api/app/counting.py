@@ -0,0 +1,71 @@
+"""
+Count strategies for paginated admin lists.
+
+`count` query parameter:
+- exact     : exact total, computed by the page query itself (COUNT(*) OVER())
+- estimated : planner row estimate (EXPLAIN), no scan at all
+- auto      : exact while the planner expects a small result, estimated beyond
+- none      : no total
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Literal, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+CountMode = Literal["auto", "exact", "estimated", "none"]
+
+# above this planner estimate, "auto" stops counting exactly
+EXACT_COUNT_THRESHOLD = 10_000
+
+# select-list entry added to the page query when the window count is used
+WINDOW_TOTAL = "COUNT(*) OVER() AS _total"
+
+
+@dataclass
+class CountPlan:
+    window: bool = False
+    total: Optional[int] = None
+    estimated: bool = False
+
+
+async def planner_estimate(db: AsyncSession, from_sql: str, params: dict) -> int:
+    plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) SELECT 1 {from_sql}"), params)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def plan_count(db: AsyncSession, mode: CountMode, from_sql: str, params: dict) -> CountPlan:
+    """`from_sql` is the `FROM ... WHERE ...` part shared with the page query."""
+    if mode == "none":
+        return CountPlan()
+    if mode == "exact":
+        return CountPlan(window=True)
+
+    estimate = await planner_estimate(db, from_sql, params)
+    if mode == "estimated" or estimate > EXACT_COUNT_THRESHOLD:
+        return CountPlan(total=estimate, estimated=True)
+    return CountPlan(window=True)
+
+
+async def page_total(
+    db: AsyncSession,
+    plan: CountPlan,
+    rows: list,
+    from_sql: str,
+    params: dict,
+    offset: int,
+) -> Optional[int]:
+    if not plan.window:
+        return plan.total
+    if rows:
+        return int(rows[0]["_total"])
+    if offset == 0:
+        return 0
+    # page past the end: the window had no row to report on
+    return (await db.execute(text(f"SELECT COUNT(*) {from_sql}"), params)).scalar()
@@ -1,3 +1,4 @@
+import orjson
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from .settings import settings
@@ -6,6 +7,9 @@ engine: AsyncEngine = create_async_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
     future=True,
+    # json/jsonb codecs registered on every asyncpg connection
+    json_serializer=lambda v: orjson.dumps(v).decode("utf-8"),
+    json_deserializer=orjson.loads,
 )
 
 AsyncSessionLocal = sessionmaker(
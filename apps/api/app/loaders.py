@@ -0,0 +1,88 @@
+"""
+Request-scoped batch loaders (DataLoader-style) for admin list endpoints.
+
+A loader collects the ids of a whole page and resolves a one-to-many
+relation with a single `= ANY(:ids)` query instead of one query per row.
+Results are cached on the loader, so reusing it within a request never
+hits the database twice for the same id.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class BatchLoader:
+    """
+    `sql` must select a `_key` column and filter with `= ANY(CAST(:ids AS uuid[]))`.
+    Every other column ends up in the returned dicts.
+    """
+
+    def __init__(self, db: AsyncSession, sql: str):
+        self.db = db
+        self.sql = text(sql)
+        self._cache: dict[str, list[dict]] = {}
+
+    async def load_many(self, keys: Iterable) -> dict[str, list[dict]]:
+        keys = [str(k) for k in keys]
+        missing = [k for k in dict.fromkeys(keys) if k not in self._cache]
+
+        if missing:
+            for k in missing:
+                self._cache[k] = []
+            rows = (await self.db.execute(self.sql, {"ids": missing})).mappings().all()
+            for r in rows:
+                d = dict(r)
+                self._cache[str(d.pop("_key"))].append(d)
+
+        return {k: self._cache[k] for k in keys}
+
+    async def load(self, key) -> list[dict]:
+        return (await self.load_many([key]))[str(key)]
+
+
+def company_users_loader(db: AsyncSession) -> BatchLoader:
+    """company id -> assigned admin users"""
+    return BatchLoader(db, """
+        SELECT auc.company_id AS _key,
+               u.id::text, u.email, u.first_name, u.last_name, u.role
+        FROM admin_users u
+        JOIN admin_user_companies auc ON u.id = auc.admin_user_id
+        WHERE auc.company_id = ANY(CAST(:ids AS uuid[]))
+    """)
+
+
+def user_companies_loader(db: AsyncSession) -> BatchLoader:
+    """admin user id -> assigned companies"""
+    return BatchLoader(db, """
+        SELECT auc.admin_user_id AS _key,
+               c.id::text, c.code, c.name
+        FROM companies c
+        JOIN admin_user_companies auc ON c.id = auc.company_id
+        WHERE auc.admin_user_id = ANY(CAST(:ids AS uuid[]))
+    """)
+
+
+def blueprint_parents_loader(db: AsyncSession) -> BatchLoader:
+    """child blueprint id -> parent blueprints (N-1 managers of an N-2)"""
+    return BatchLoader(db, """
+        SELECT br.child_blueprint_id AS _key,
+               bp.id::text, bp.code, bp.role
+        FROM blueprint_relations br
+        JOIN blueprints bp ON bp.id = br.parent_blueprint_id
+        WHERE br.child_blueprint_id = ANY(CAST(:ids AS uuid[]))
+    """)
+
+
+def blueprint_children_loader(db: AsyncSession) -> BatchLoader:
+    """parent blueprint id -> child blueprints (N-2 subordinates of an N-1)"""
+    return BatchLoader(db, """
+        SELECT br.parent_blueprint_id AS _key,
+               bp.id::text, bp.code, bp.role
+        FROM blueprint_relations br
+        JOIN blueprints bp ON bp.id = br.child_blueprint_id
+        WHERE br.parent_blueprint_id = ANY(CAST(:ids AS uuid[]))
+    """)
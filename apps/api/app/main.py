@@ -1,22 +1,14 @@
 from fastapi import FastAPI, Depends, HTTPException
-from fastapi.staticfiles import StaticFiles
-import os
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_db
 from .settings import settings
 from .security import JWTAuthMiddleware
+from .responses import FastJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="fluidmanager API", version="0.1.0")
-
-# Ensure portrait upload directory exists
-PORTRAIT_DIR = "/tmp/portraits"
-os.makedirs(PORTRAIT_DIR, exist_ok=True)
-
-# Mount static files for portraits
-app.mount("/static/portraits", StaticFiles(directory=PORTRAIT_DIR), name="portraits")
+app = FastAPI(title="fluidmanager API", version="0.1.0", default_response_class=FastJSONResponse)
 
 app.add_middleware(JWTAuthMiddleware)
 # CORS middleware (must be added before auth middleware)
@@ -49,6 +41,13 @@ app.include_router(admin_blueprints_router)
 from .admin_portraits import router as admin_portraits_router
 app.include_router(admin_portraits_router)
 
+# Portrait files (content-addressed, served from the portrait storage backend)
+from .portraits_static import router as portraits_static_router
+app.include_router(portraits_static_router)
+
+from .admin_search import router as admin_search_router
+app.include_router(admin_search_router)
+
 from .org_chart import router as org_chart_router
 app.include_router(org_chart_router)
 
@@ -85,6 +84,20 @@ app.include_router(tasks_dependencies_router)
 from .tasks_callback import router as tasks_callback_router
 app.include_router(tasks_callback_router)
 
+from .tasks_results import router as tasks_results_router
+app.include_router(tasks_results_router)
+
+from .task_stream import task_hub
+from .redis_client import close_redis
+from .publisher import publisher
+
+
+@app.on_event("shutdown")
+async def stop_task_hub():
+    await task_hub.stop()
+    await close_redis()
+    await publisher.close()
+
 
 
 @app.get("/health")
@@ -120,23 +133,19 @@ async def list_artifacts(company_code: str, db: AsyncSession = Depends(get_db)):
     return {"items": list(rows)}
 
 from pydantic import BaseModel
-from celery.result import AsyncResult
-from .celery_client import celery_app
+from .celery_client import fetch_job_state
 
 class EchoIn(BaseModel):
     message: str
 
 @app.post("/jobs/echo")
 async def job_echo(payload: EchoIn):
-    r = celery_app.send_task("fm.echo", args=[payload.message])
-    return {"task_id": r.id}
+    try:
+        celery_task_id = await publisher.send_task("fm.echo", args=[payload.message])
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Celery enqueue failed: {e}")
+    return {"task_id": celery_task_id}
 
 @app.get("/jobs/{task_id}")
 async def job_status(task_id: str):
-    r = AsyncResult(task_id, app=celery_app)
-    out = {"task_id": task_id, "state": r.state}
-    if r.successful():
-        out["result"] = r.result
-    elif r.failed():
-        out["error"] = str(r.result)
-    return out
+    return {"task_id": task_id, **(await fetch_job_state(task_id))}
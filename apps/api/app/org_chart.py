@@ -15,9 +15,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_db
 from .auth import get_current_user, require_company_access
+from .admin_portraits import PORTRAIT_SIZES, pick_portrait_uri
 
 router = APIRouter(prefix="/companies/{company_id}", tags=["org-chart"])
 
+# avatars de l'organigramme (~64 px CSS, écrans 2x); 0 = image originale
+ORG_CHART_PORTRAIT_SIZE = 128
+
 
 # =============================================================================
 # Pydantic Models
@@ -115,6 +119,7 @@ def normalize_localized_text(value) -> dict:
 @router.get("/org-chart", response_model=OrgChartResponse)
 async def get_org_chart(
     company_id: str,
+    portrait_size: int = Query(ORG_CHART_PORTRAIT_SIZE, ge=0, le=max(PORTRAIT_SIZES)),
     db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
@@ -157,7 +162,7 @@ async def get_org_chart(
                 e.first_name, e.last_name, e.bio, e.portrait_id::text,
                 e.skills, e.email, e.phone, e.is_removable,
                 b.role as blueprint_role, b.level::text as blueprint_level,
-                p.uri as portrait_uri
+                p.uri as portrait_uri, p.derivatives as portrait_derivatives
             FROM company_employees e
             LEFT JOIN blueprints b ON b.id = e.blueprint_id
             LEFT JOIN portrait_library p ON p.id = e.portrait_id
@@ -176,7 +181,7 @@ async def get_org_chart(
             last_name=row["last_name"],
             bio=normalize_localized_text(row["bio"]),
             portrait_id=row["portrait_id"],
-            portrait_uri=row["portrait_uri"],
+            portrait_uri=pick_portrait_uri(row["portrait_uri"], row["portrait_derivatives"], portrait_size),
             skills=row["skills"] or [],
             email=row["email"],
             phone=row["phone"],
@@ -197,6 +202,7 @@ async def get_available_blueprints(
     company_id: str,
     position_id: str = Query(..., description="Position to fill"),
     search: str = Query(None, description="Search by role or code"),
+    portrait_size: int = Query(ORG_CHART_PORTRAIT_SIZE, ge=0, le=max(PORTRAIT_SIZES)),
     db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
@@ -240,7 +246,7 @@ async def get_available_blueprints(
             b.id, b.code, b.role, b.level::text, 
             b.default_first_name, b.default_last_name, b.default_bio,
             b.default_portrait_id::text as portrait_id, b.skills,
-            p.uri as portrait_uri,
+            p.uri as portrait_uri, p.derivatives as portrait_derivatives,
             COALESCE(hired.cnt, 0) as already_hired_count
         FROM blueprints b
         LEFT JOIN portrait_library p ON p.id = b.default_portrait_id
@@ -301,7 +307,7 @@ async def get_available_blueprints(
             default_last_name=row["default_last_name"],
             default_bio=normalize_localized_text(row["default_bio"]),
             portrait_id=row["portrait_id"],
-            portrait_uri=row["portrait_uri"],
+            portrait_uri=pick_portrait_uri(row["portrait_uri"], row["portrait_derivatives"], portrait_size),
             skills=row["skills"] or [],
             already_hired_count=row["already_hired_count"]
         )
@@ -353,7 +359,7 @@ async def recruit_employee(
                 b.id, b.level::text, b.role,
                 b.default_first_name, b.default_last_name, b.default_bio,
                 b.default_portrait_id, b.skills,
-                p.uri as portrait_uri
+                p.uri as portrait_uri, p.derivatives as portrait_derivatives
             FROM blueprints b
             LEFT JOIN portrait_library p ON p.id = b.default_portrait_id
             WHERE b.id = :blueprint_id AND b.is_active = true
@@ -409,7 +415,9 @@ async def recruit_employee(
         last_name=last_name,
         bio=bio,
         portrait_id=str(blueprint["default_portrait_id"]) if blueprint["default_portrait_id"] else None,
-        portrait_uri=blueprint["portrait_uri"],
+        portrait_uri=pick_portrait_uri(
+            blueprint["portrait_uri"], blueprint["portrait_derivatives"], ORG_CHART_PORTRAIT_SIZE
+        ),
         skills=blueprint["skills"] or [],
         email=None,
         phone=None,
@@ -434,7 +442,7 @@ async def update_employee(
     emp_result = await db.execute(
         text("""
             SELECT e.*, b.role as blueprint_role, b.level::text as blueprint_level,
-                   p.uri as portrait_uri
+                   p.uri as portrait_uri, p.derivatives as portrait_derivatives
             FROM company_employees e
             LEFT JOIN blueprints b ON b.id = e.blueprint_id
             LEFT JOIN portrait_library p ON p.id = e.portrait_id
@@ -483,7 +491,7 @@ async def update_employee(
     result = await db.execute(
         text("""
             SELECT e.*, b.role as blueprint_role, b.level::text as blueprint_level,
-                   p.uri as portrait_uri
+                   p.uri as portrait_uri, p.derivatives as portrait_derivatives
             FROM company_employees e
             LEFT JOIN blueprints b ON b.id = e.blueprint_id
             LEFT JOIN portrait_library p ON p.id = e.portrait_id
@@ -501,7 +509,7 @@ async def update_employee(
         last_name=row["last_name"],
         bio=normalize_localized_text(row["bio"]),
         portrait_id=str(row["portrait_id"]) if row["portrait_id"] else None,
-        portrait_uri=row["portrait_uri"],
+        portrait_uri=pick_portrait_uri(row["portrait_uri"], row["portrait_derivatives"], ORG_CHART_PORTRAIT_SIZE),
         skills=row["skills"] or [],
         email=row["email"],
         phone=row["phone"],
@@ -0,0 +1,73 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Cursors are opaque url-safe tokens wrapping the `(created_at, id)` of the
+last row of a page. Queries resume with a row comparison on the same
+columns, so each page costs O(page size) whatever its depth.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Union
+from uuid import UUID
+
+from fastapi import HTTPException
+
+
+def encode_cursor(created_at: datetime, row_id: Any) -> str:
+    raw = json.dumps({"t": created_at.isoformat(), "i": str(row_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[datetime, UUID]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(data["t"]), UUID(data["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def cursor_params(cursor: Optional[str]) -> dict[str, Any]:
+    """Bind params for a keyset predicate (both None when no cursor)."""
+    if not cursor:
+        return {"cursor_created_at": None, "cursor_id": None}
+    created_at, row_id = decode_cursor(cursor)
+    return {"cursor_created_at": created_at, "cursor_id": row_id}
+
+
+def next_cursor(rows: list, limit: int) -> Optional[str]:
+    """
+    Pages are fetched with LIMIT limit+1: the extra row only tells us that a
+    next page exists and is dropped by the caller.
+    """
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(last["created_at"], last["id"])
+
+
+def encode_change_cursor(seq: int, xmin: Optional[Union[int, str]]) -> str:
+    raw = json.dumps(
+        {"s": int(seq), "n": int(xmin) if xmin is not None else None},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_change_cursor(token: str) -> tuple[int, Optional[int]]:
+    """
+    Change-feed cursor: `s` is the last change_seq returned, `n` the oldest
+    transaction still running when the page was read (pg_snapshot_xmin).
+    xmin is returned as an int: asyncpg only binds integers to xid8.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        xmin = data.get("n")
+        return int(data["s"]), (int(xmin) if xmin is not None else None)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,184 @@
+"""
+Portrait storage backends.
+
+Portraits are stored under content-addressed keys (`<sha256>.<ext>`,
+derivatives `<sha256>_<size>.<ext>`): a key never changes content, so it can
+be cached forever and the same image uploaded twice is stored once.
+
+- `fs` (default): a directory (PORTRAIT_UPLOAD_DIR), to be mounted as a shared
+  volume when several API replicas run.
+- `s3`: any S3-compatible store (minio client, S3_* settings,
+  PORTRAIT_BUCKET / PORTRAIT_PREFIX).
+
+The minio SDK is blocking: every call runs in the threadpool.
+"""
+
+from __future__ import annotations
+
+import io
+import mimetypes
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from .settings import settings
+
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+@dataclass
+class StoredObject:
+    size: int
+    content_type: str
+
+
+def content_type_for(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+class FilesystemStorage:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, os.path.basename(key))
+
+    async def put(self, key: str, data: bytes) -> None:
+        def _write() -> None:
+            # écriture atomique: un lecteur ne voit jamais un fichier partiel
+            tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+
+        await run_in_threadpool(_write)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        def _read() -> Optional[bytes]:
+            try:
+                with open(self._path(key), "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None
+
+        return await run_in_threadpool(_read)
+
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            st = await run_in_threadpool(os.stat, self._path(key))
+        except FileNotFoundError:
+            return None
+        return StoredObject(size=st.st_size, content_type=content_type_for(key))
+
+    async def stream(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        def _chunks():
+            with open(self._path(key), "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = f.read(min(STREAM_CHUNK_BYTES, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+
+        async for chunk in iterate_in_threadpool(_chunks()):
+            yield chunk
+
+    async def delete(self, key: str) -> None:
+        try:
+            await run_in_threadpool(os.remove, self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage:
+    def __init__(self, bucket: str, prefix: str = ""):
+        from minio import Minio
+
+        endpoint = settings.S3_ENDPOINT or ""
+        self.client = Minio(
+            endpoint.replace("http://", "").replace("https://", ""),
+            access_key=settings.S3_ACCESS_KEY,
+            secret_key=settings.S3_SECRET_KEY,
+            region=settings.S3_REGION,
+            secure=endpoint.startswith("https://"),
+        )
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _name(self, key: str) -> str:
+        key = os.path.basename(key)
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    async def put(self, key: str, data: bytes) -> None:
+        await run_in_threadpool(
+            self.client.put_object,
+            self.bucket,
+            self._name(key),
+            io.BytesIO(data),
+            len(data),
+            content_type=content_type_for(key),
+        )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        from minio.error import S3Error
+
+        def _read() -> Optional[bytes]:
+            try:
+                resp = self.client.get_object(self.bucket, self._name(key))
+            except S3Error as e:
+                if e.code == "NoSuchKey":
+                    return None
+                raise
+            try:
+                return resp.read()
+            finally:
+                resp.close()
+                resp.release_conn()
+
+        return await run_in_threadpool(_read)
+
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        from minio.error import S3Error
+
+        try:
+            st = await run_in_threadpool(self.client.stat_object, self.bucket, self._name(key))
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return None
+            raise
+        return StoredObject(size=st.size, content_type=st.content_type or content_type_for(key))
+
+    async def stream(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        resp = await run_in_threadpool(
+            self.client.get_object, self.bucket, self._name(key), offset=start, length=end - start + 1
+        )
+        try:
+            async for chunk in iterate_in_threadpool(resp.stream(STREAM_CHUNK_BYTES)):
+                yield chunk
+        finally:
+            resp.close()
+            resp.release_conn()
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self.client.remove_object, self.bucket, self._name(key))
+
+
+_storage = None
+
+
+def get_portrait_storage():
+    """Configured backend (PORTRAIT_STORAGE = fs | s3), built once per process."""
+    global _storage
+    if _storage is None:
+        if settings.PORTRAIT_STORAGE == "s3":
+            if not settings.PORTRAIT_BUCKET or not settings.S3_ENDPOINT:
+                raise RuntimeError("PORTRAIT_STORAGE=s3 requires PORTRAIT_BUCKET and S3_ENDPOINT")
+            _storage = S3Storage(settings.PORTRAIT_BUCKET, settings.PORTRAIT_PREFIX)
+        else:
+            _storage = FilesystemStorage(settings.PORTRAIT_UPLOAD_DIR)
+    return _storage
@@ -0,0 +1,93 @@
+"""
+Portrait file serving (replaces the StaticFiles mount on /static/portraits).
+
+Served from the configured storage backend, with:
+- ETag (content hash from the key) and If-None-Match -> 304
+- `Cache-Control: immutable` for content-addressed keys; files uploaded before
+  content addressing (random names) get a short max-age
+- single `Range: bytes=` requests -> 206
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from .portrait_storage import get_portrait_storage
+
+router = APIRouter(tags=["portraits"])
+
+_KEY = re.compile(r"^[A-Za-z0-9_\-]{1,128}\.(jpg|jpeg|png|webp|gif)$")
+_HASHED_KEY = re.compile(r"^([0-9a-f]{64})(_\d+)?\.[a-z]+$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_LEGACY = "public, max-age=3600"
+
+
+def _parse_range(range_header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Single byte range -> (start, end inclusive). None: whole file."""
+    if not range_header:
+        return None
+    m = _RANGE.match(range_header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    unsatisfiable = HTTPException(status_code=416, detail="Range Not Satisfiable",
+                                  headers={"Content-Range": f"bytes */{size}"})
+    if not m.group(1):
+        length = int(m.group(2))
+        if length == 0:
+            raise unsatisfiable
+        return max(size - length, 0), size - 1
+    start = int(m.group(1))
+    end = int(m.group(2)) if m.group(2) else size - 1
+    if start >= size or end < start:
+        raise unsatisfiable
+    return start, min(end, size - 1)
+
+
+@router.get("/static/portraits/{key}")
+async def get_portrait_file(
+    key: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+):
+    if not _KEY.match(key):
+        raise HTTPException(status_code=404, detail="Not found")
+
+    storage = get_portrait_storage()
+    obj = await storage.stat(key)
+    if obj is None:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    hashed = _HASHED_KEY.match(key)
+    # clé adressée par contenu: l'ETag est le nom (contenu figé)
+    etag = f'"{key}"' if hashed else f'"{key}-{obj.size}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": CACHE_IMMUTABLE if hashed else CACHE_LEGACY,
+    }
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    span = _parse_range(range_header, obj.size) if obj.size else None
+    start, end = span if span else (0, obj.size - 1)
+    status_code = 200
+    if span:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{obj.size}"
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+
+    if obj.size == 0:
+        return Response(b"", media_type=obj.content_type, headers=headers)
+
+    return StreamingResponse(
+        storage.stream(key, start, end),
+        status_code=status_code,
+        media_type=obj.content_type,
+        headers=headers,
+    )
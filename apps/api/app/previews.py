@@ -1,11 +1,13 @@
 import base64
+from uuid import uuid4
+
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_db
 from .settings import settings
-from .celery_client import celery_app
+from .publisher import publisher
 
 router = APIRouter()
 
@@ -38,7 +40,9 @@ async def publish_preview(
     bucket = settings.PREVIEW_BUCKET
     preview_url = f"{settings.PREVIEW_BASE_URL}/{bucket}/{prefix}/"
 
-    # Create artifact first (PENDING, without celery_task_id yet)
+    # Create artifact first (PENDING, celery_task_id generated up front), committed
+    # before the publish so the worker always finds it
+    celery_task_id = str(uuid4())
     artifact_row = (await db.execute(text("""
         INSERT INTO artifacts (company_id, type, title, uri, metadata)
         VALUES (:company_id, 'link', :title, :uri,
@@ -46,7 +50,8 @@ async def publish_preview(
                   'kind','preview',
                   'bucket', to_jsonb(CAST(:bucket AS text)),
                   'prefix', to_jsonb(CAST(:prefix AS text)),
-                  'state', 'PENDING'
+                  'state', 'PENDING',
+                  'celery_task_id', to_jsonb(CAST(:celery_task_id AS text))
                 )
         )
         RETURNING id, title, uri
@@ -56,29 +61,36 @@ async def publish_preview(
         "uri": preview_url,
         "bucket": bucket,
         "prefix": prefix,
+        "celery_task_id": celery_task_id,
     })).mappings().first()
 
     artifact_id = str(artifact_row["id"])
+    await db.commit()
 
-    # enqueue upload
+    # enqueue upload (publisher thread, the event loop is not blocked)
     data = await zip_file.read()
     zip_b64 = base64.b64encode(data).decode("utf-8")
-    r = celery_app.send_task("fm.publish_preview_zip", args=[zip_b64, bucket, prefix, artifact_id])
-
-    # store celery_task_id
-    await db.execute(text("""
-        UPDATE artifacts
-        SET metadata = COALESCE(metadata,'{}'::jsonb) || jsonb_build_object('celery_task_id', to_jsonb(CAST(:celery_task_id AS text)))
-        WHERE id = CAST(:artifact_id AS uuid)
-    """), {"celery_task_id": r.id, "artifact_id": artifact_id})
-
-    await db.commit()
+    try:
+        await publisher.send_task(
+            "fm.publish_preview_zip",
+            args=[zip_b64, bucket, prefix, artifact_id],
+            task_id=celery_task_id,
+        )
+    except Exception as e:
+        await db.execute(text("""
+            UPDATE artifacts
+            SET metadata = COALESCE(metadata,'{}'::jsonb)
+                || jsonb_build_object('state', 'FAILURE', 'error', to_jsonb(CAST(:error AS text)))
+            WHERE id = CAST(:artifact_id AS uuid)
+        """), {"error": f"enqueue failed: {e}", "artifact_id": artifact_id})
+        await db.commit()
+        raise HTTPException(status_code=503, detail=f"Celery enqueue failed: {e}")
 
     return {
         "artifact": dict(artifact_row),
         "artifact_id": artifact_id,
         "preview_url": preview_url,
-        "celery_task_id": r.id,
+        "celery_task_id": celery_task_id,
         "bucket": bucket,
         "prefix": prefix,
     }
@@ -0,0 +1,184 @@
+"""
+Non-blocking Celery publishing for the API.
+
+`celery_app.send_task` does a blocking Redis round trip; called from an async
+handler it stalls the whole event loop while the broker is slow. Here every
+publish runs on one dedicated thread that keeps a pooled producer connection,
+and handlers await a future that resolves once the broker accepted the
+message (confirm semantics: an exception means "not published").
+
+In-flight publishes are bounded by a semaphore (PUBLISH_MAX_IN_FLIGHT),
+released only once the publisher thread is done with the job: when the broker
+stalls, requests wait (then time out) instead of piling up unbounded work.
+A job still queued when its caller times out is dropped by the thread, never
+published late; one the thread already started is awaited to the end, so a
+timeout always means "not published". That wait is bounded: each publish
+retries at most PUBLISH_RETRY_POLICY times, on broker sockets with a connect
+/ read timeout (celery_client broker_transport_options).
+
+`send_many()` publishes a batch on one producer in a single thread hop. When a
+publish fails part-way, the messages before it are already on the broker:
+PublishError.published lists their task ids (in order), the rest were not sent.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from uuid import uuid4
+
+from .celery_client import celery_app
+
+PUBLISH_MAX_IN_FLIGHT = 64
+PUBLISH_TIMEOUT_SECONDS = 10.0
+# kombu retries of one publish on connection errors: 3 attempts at most, <= 1s apart
+PUBLISH_RETRY_POLICY = {"max_retries": 2, "interval_start": 0, "interval_step": 0.5, "interval_max": 1}
+
+
+class PublishError(Exception):
+    """A batch publish failed part-way; `published` are the task ids already sent."""
+
+    def __init__(self, published: list[str], error: BaseException):
+        super().__init__(f"{error} ({len(published)} message(s) published before the failure)")
+        self.published = published
+
+
+@dataclass
+class Message:
+    name: str
+    args: list = field(default_factory=list)
+    kwargs: dict = field(default_factory=dict)
+    options: dict = field(default_factory=dict)
+    task_id: str = field(default_factory=lambda: str(uuid4()))
+
+
+@dataclass
+class _Job:
+    messages: list[Message]
+    state: str = "pending"  # pending -> running | cancelled
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def _move(self, to: str) -> bool:
+        with self.lock:
+            if self.state != "pending":
+                return False
+            self.state = to
+            return True
+
+    def start(self) -> bool:
+        return self._move("running")
+
+    def cancel(self) -> bool:
+        return self._move("cancelled")
+
+
+class Publisher:
+    def __init__(self, max_in_flight: int = PUBLISH_MAX_IN_FLIGHT, timeout: float = PUBLISH_TIMEOUT_SECONDS):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._producer = None
+        self._max_in_flight = max_in_flight
+        self._timeout = timeout
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    # --- publisher thread side -------------------------------------------
+
+    def _publish(self, job: _Job) -> list[str]:
+        if not job.start():
+            return []  # l'appelant a abandonné (timeout): on ne publie pas en retard
+        published: list[str] = []
+        if self._producer is None:
+            self._producer = celery_app.producer_pool.acquire(block=True)
+        try:
+            for m in job.messages:
+                celery_app.send_task(
+                    m.name,
+                    args=m.args,
+                    kwargs=m.kwargs,
+                    task_id=m.task_id,
+                    producer=self._producer,
+                    **{"retry": True, "retry_policy": PUBLISH_RETRY_POLICY, **m.options},
+                )
+                published.append(m.task_id)
+        except Exception as e:
+            # connexion suspecte: on la rend au pool et on repart d'une neuve
+            self._release_producer()
+            if published:
+                raise PublishError(published, e) from e
+            raise
+        return published
+
+    def _release_producer(self) -> None:
+        if self._producer is not None:
+            try:
+                self._producer.release()
+            except Exception:
+                pass
+            self._producer = None
+
+    # --- event loop side -------------------------------------------------
+
+    async def send_many(self, messages: list[Message]) -> list[str]:
+        """
+        Publish in order on one connection; returns the task ids once confirmed.
+        Raises PublishError if some messages were published before a failure.
+        """
+        if not messages:
+            return []
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fm-publisher")
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self._max_in_flight)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._timeout
+        await asyncio.wait_for(self._sem.acquire(), timeout=self._timeout)
+
+        job = _Job(messages)
+        try:
+            fut = loop.run_in_executor(self._executor, self._publish, job)
+        except BaseException:
+            self._sem.release()
+            raise
+        # le slot n'est rendu qu'une fois le job terminé (ou sauté) par le thread
+        fut.add_done_callback(self._job_done)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), timeout=max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            if job.cancel():
+                raise
+            # publication déjà en cours: son résultat fait foi
+            return await fut
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+
+    def _job_done(self, fut: asyncio.Future) -> None:
+        self._sem.release()
+        if not fut.cancelled():
+            fut.exception()  # consumed even when the caller gave up
+
+    async def send_task(
+        self,
+        name: str,
+        args: Optional[list] = None,
+        kwargs: Optional[dict[str, Any]] = None,
+        task_id: Optional[str] = None,
+        **options: Any,
+    ) -> str:
+        msg = Message(name=name, args=args or [], kwargs=kwargs or {}, options=options)
+        if task_id:
+            msg.task_id = task_id
+        return (await self.send_many([msg]))[0]
+
+    async def close(self) -> None:
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(executor, self._release_producer)
+            executor.shutdown(wait=True)
+
+
+publisher = Publisher()
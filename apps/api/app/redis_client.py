@@ -0,0 +1,41 @@
+"""
+Shared asyncio Redis client (same instance as the Celery broker).
+
+Redis is an optimisation here (dedupe, buffering): callers must keep
+working when it is not configured or unreachable, hence `get_redis()`
+returning None instead of raising.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from .settings import settings
+
+_client: Optional[Redis] = None
+
+
+def get_redis() -> Optional[Redis]:
+    global _client
+    if _client is None:
+        url = settings.REDIS_URL or os.getenv("REDIS_URL")
+        if not url:
+            return None
+        _client = Redis.from_url(
+            url,
+            decode_responses=True,
+            socket_timeout=2,
+            socket_connect_timeout=2,
+            health_check_interval=30,
+        )
+    return _client
+
+
+async def close_redis() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
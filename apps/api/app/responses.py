@@ -0,0 +1,41 @@
+"""
+Fast JSON responses (orjson).
+
+Routes returning a FastJSONResponse directly skip FastAPI's jsonable_encoder
+pass: orjson serializes datetime and nested JSONB dicts natively. asyncpg's
+UUID subclass is not a uuid.UUID for orjson: it goes through `_default`.
+`raw_json()` embeds JSON already built by Postgres (json_agg) as-is.
+"""
+
+from __future__ import annotations
+
+import uuid
+from decimal import Decimal
+from typing import Any, Optional, Union
+
+import orjson
+from fastapi.responses import Response
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def raw_json(value: Optional[Union[str, bytes]], default: str = "null") -> orjson.Fragment:
+    """Pre-serialized JSON (e.g. `json_agg(...)::text`) spliced into a response."""
+    return orjson.Fragment(value if value is not None else default)
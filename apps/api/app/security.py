@@ -4,6 +4,7 @@ Handles JWT authentication for all protected endpoints.
 """
 
 from __future__ import annotations
+import re
 from datetime import datetime, timezone
 
 from starlette.responses import JSONResponse
@@ -13,6 +14,13 @@ from jose import jwt, JWTError
 from .settings import settings
 
 
+# Integration callbacks (POST, HMAC-signed): only these two routes skip the JWT
+CALLBACK_PATHS = (
+    re.compile(r"^/companies/[^/]+/tasks/[0-9a-fA-F-]{36}/callback$"),
+    re.compile(r"^/companies/[^/]+/tasks:batchCallback$"),
+)
+
+
 class JWTAuthMiddleware:
     """
     ASGI Middleware for JWT authentication.
@@ -21,6 +29,7 @@ class JWTAuthMiddleware:
     - /health
     - /auth/* (login, forgot-password, reset-password)
     - /docs, /openapi.json (Swagger UI)
+    - POST task callbacks (HMAC-signed by the integration)
     
     All other paths require a valid JWT Bearer token.
     """
@@ -64,6 +73,11 @@ class JWTAuthMiddleware:
             await self.app(scope, receive, send)
             return
 
+        # Integration callbacks: authenticated by their HMAC signature instead
+        if scope.get("method") == "POST" and any(p.match(path) for p in CALLBACK_PATHS):
+            await self.app(scope, receive, send)
+            return
+
         # 4. Validate JWT Bearer token
         headers = {k.decode().lower(): v.decode() for k, v in scope.get("headers", [])}
         auth_header = headers.get("authorization", "")
@@ -8,9 +8,27 @@ class Settings(BaseSettings):
     REDIS_URL: str | None = None
     API_ADMIN_KEY: str | None = None  # Deprecated, will be removed
 
+    # Task callbacks
+    CALLBACK_DEDUPE_TTL_SECONDS: int = 24 * 3600
+    CALLBACK_APPLY_MODE: str = "sync"  # "async": ack then apply by the worker (fm.apply_callbacks)
+    CALLBACK_RESULT_INLINE_MAX_BYTES: int = 16 * 1024  # larger results go to task_results
+
     PREVIEW_BASE_URL: str | None = None
     PREVIEW_BUCKET: str | None = None
 
+    # Portraits: "fs" (PORTRAIT_UPLOAD_DIR, shared volume between replicas) or "s3"
+    PORTRAIT_STORAGE: str = "fs"
+    PORTRAIT_UPLOAD_DIR: str = "/tmp/portraits"
+    PORTRAIT_BASE_URL: str = "/static/portraits"
+    PORTRAIT_BUCKET: str | None = None
+    PORTRAIT_PREFIX: str = "portraits"
+
+    # S3-compatible store (minio)
+    S3_ENDPOINT: str | None = None
+    S3_ACCESS_KEY: str | None = None
+    S3_SECRET_KEY: str | None = None
+    S3_REGION: str | None = None
+
     # JWT Settings
     JWT_SECRET: str = secrets.token_urlsafe(32)  # Will be overridden by env
     JWT_ALGORITHM: str = "HS256"
@@ -0,0 +1,119 @@
+"""
+Sparse fieldsets for task reads (`fields=` query parameter).
+
+`fields` is a comma separated list of task columns, `all`, or JSON sub-keys
+of the jsonb columns (`runtime_json.job_type`). Only the requested
+columns / keys are read and put into the JSON document built by Postgres.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+from fastapi import HTTPException
+
+# champ exposé -> expression SQL (alias t = tasks)
+TASK_FIELDS: dict[str, str] = {
+    "id": "t.id",
+    "title": "t.title",
+    "description": "t.description",
+    "status": "t.status",
+    "priority": "t.priority",
+    "job_type": "t.runtime_json->>'job_type'",  # tasks.job_type (schema v1) n'est jamais renseignée
+    "tags": "t.tags",
+    "needs_review": "t.needs_review",
+    "created_at": "t.created_at",
+    "updated_at": "t.updated_at",
+    "scheduled_at": "t.scheduled_at",
+    "deadline_at": "t.deadline_at",
+    "attempt_count": "t.attempt_count",
+    "max_attempts": "t.max_attempts",
+    "last_error": "t.last_error",
+    "last_heartbeat_at": "t.last_heartbeat_at",
+    "celery_task_id": "t.celery_task_id",
+    "previous_celery_task_id": "t.previous_celery_task_id",
+    "celery_task_name": "t.celery_task_name",
+    "started_at": "t.started_at",
+    "finished_at": "t.finished_at",
+    "last_retry_at": "t.last_retry_at",
+    "project_id": "t.project_id",
+    "parent_task_id": "t.parent_task_id",
+    "root_task_id": "t.root_task_id",
+    "integration_id": "t.integration_id",
+    "runtime_json": "t.runtime_json",
+    "control_json": "t.control_json",
+    "metadata": "t.metadata",
+}
+
+JSON_FIELDS = {"runtime_json", "control_json", "metadata"}
+
+# board views: no jsonb payloads
+LIST_DEFAULT_FIELDS = (
+    "id", "title", "status", "priority", "job_type",
+    "created_at", "deadline_at", "attempt_count", "max_attempts",
+)
+
+# historical get_task payload (+ lifecycle columns moved out of runtime_json)
+GET_DEFAULT_FIELDS = (
+    "id", "title", "status", "priority",
+    "created_at", "deadline_at", "attempt_count", "max_attempts",
+    "celery_task_id", "started_at", "finished_at",
+    "runtime_json", "control_json",
+)
+
+MAX_JSON_KEYS = 20
+
+_JSON_KEY = re.compile(r"^[A-Za-z0-9_\-]{1,64}$")
+
+# field -> None (whole value) or list of JSON sub-keys
+FieldSelection = dict[str, Optional[list[str]]]
+
+
+def parse_fields(fields: Optional[str], default: tuple[str, ...]) -> FieldSelection:
+    if not fields:
+        return {name: None for name in default}
+    if fields.strip() == "all":
+        return {name: None for name in TASK_FIELDS}
+
+    selection: FieldSelection = {}
+    for item in (f.strip() for f in fields.split(",")):
+        if not item:
+            continue
+        name, _, key = item.partition(".")
+        if name not in TASK_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+
+        if not key:
+            selection[name] = None
+            continue
+        if name not in JSON_FIELDS or not _JSON_KEY.match(key):
+            raise HTTPException(status_code=400, detail=f"Invalid field: {item}")
+        if name in selection and selection[name] is None:
+            continue  # whole column already requested
+        keys = selection.setdefault(name, [])
+        if key not in keys:
+            if len(keys) >= MAX_JSON_KEYS:
+                raise HTTPException(status_code=400, detail=f"Too many keys for {name}")
+            keys.append(key)
+
+    if not selection:
+        raise HTTPException(status_code=400, detail="Empty fields")
+    return selection
+
+
+def task_json_sql(selection: FieldSelection, extra: Optional[dict[str, str]] = None) -> str:
+    """
+    `json_build_object(...)` expression for one task row (alias t).
+    `extra`: additional key -> SQL expression pairs (e.g. embedded events).
+    """
+    parts = []
+    for name, keys in selection.items():
+        expr = TASK_FIELDS[name]
+        if keys is not None:
+            # keys are validated against _JSON_KEY: safe to inline
+            expr = "json_build_object(" + ", ".join(f"'{k}', {expr}->'{k}'" for k in keys) + ")"
+        parts.append(f"'{name}', {expr}")
+    for name, expr in (extra or {}).items():
+        parts.append(f"'{name}', {expr}")
+    return "json_build_object(" + ", ".join(parts) + ")"
@@ -0,0 +1,189 @@
+"""
+Live task notifications for the API process.
+
+One shared asyncpg connection LISTENs on the channels fed by the
+task_events / tasks triggers (schema v7) and fans notifications out in
+memory to per-task subscribers. A subscriber is just a bounded
+asyncio.Queue, so thousands of idle streams cost a few hundred bytes each
+and no database connection.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any, Optional
+
+import asyncpg
+from sqlalchemy import text
+
+from .db import AsyncSessionLocal
+from .settings import settings
+
+log = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "fm_task_events"
+STATUS_CHANNEL = "fm_task_status"
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+def _asyncpg_dsn() -> str:
+    return settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+
+
+class Subscription:
+    """Messages for one task. `overflowed` is set when the consumer fell behind."""
+
+    __slots__ = ("key", "queue", "overflowed")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, item: tuple[str, dict[str, Any]]) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # the consumer must resync from the DB (Last-Event-ID)
+            self.overflowed = True
+
+
+class TaskEventHub:
+    def __init__(self, dsn: str):
+        self._dsn = dsn
+        self._subs: dict[str, set[Subscription]] = {}
+        self._runner: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        # full-event fetches in flight (strong refs: the loop only keeps weak ones)
+        self._pending: set[asyncio.Task] = set()
+
+    async def ensure_started(self, timeout: float = 5.0) -> None:
+        if self._runner is None or self._runner.done():
+            self._ready.clear()
+            self._runner = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            # keep serving: the runner retries in the background
+            log.warning("task hub: LISTEN connection not ready after %ss", timeout)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        for task in list(self._pending):
+            task.cancel()
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        self._pending.clear()
+
+    def subscribe(self, task_id: str) -> Subscription:
+        sub = Subscription(task_id)
+        self._subs.setdefault(task_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subs.get(sub.key)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subs[sub.key]
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subs.values())
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            conn: Optional[asyncpg.Connection] = None
+            try:
+                conn = await asyncpg.connect(self._dsn)
+                closed = asyncio.Event()
+                conn.add_termination_listener(lambda _c: closed.set())
+                await conn.add_listener(EVENTS_CHANNEL, self._on_notify)
+                await conn.add_listener(STATUS_CHANNEL, self._on_notify)
+                self._ready.set()
+                backoff = 1.0
+
+                # asyncpg has no push notification for a dead socket while idle
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), 30)
+                    except asyncio.TimeoutError:
+                        await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                if conn is not None:
+                    await conn.close()
+                raise
+            except Exception as e:
+                log.warning("task hub: LISTEN connection lost: %s", e)
+            finally:
+                self._ready.clear()
+
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+
+            # subscribers may have missed notifications: make them resync
+            for subs in self._subs.values():
+                for sub in subs:
+                    sub.overflowed = True
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _on_notify(self, _conn, _pid: int, channel: str, payload: str) -> None:
+        try:
+            msg = json.loads(payload)
+        except ValueError:
+            return
+
+        key = str(msg.get("task_id") or "")
+        if key not in self._subs:
+            return
+
+        if channel == EVENTS_CHANNEL and msg.get("truncated"):
+            # NOTIFY payloads are capped at 8kB: fetch the row once for all subscribers
+            task = asyncio.create_task(self._dispatch_full_event(key, msg))
+            self._pending.add(task)
+            task.add_done_callback(self._full_event_done)
+            return
+
+        self._dispatch(key, "event" if channel == EVENTS_CHANNEL else "status", msg)
+
+    def _full_event_done(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("task hub: full event dispatch failed: %s", task.exception())
+
+    def _dispatch(self, key: str, kind: str, msg: dict[str, Any]) -> None:
+        for sub in list(self._subs.get(key, ())):
+            sub.push((kind, msg))
+
+    async def _dispatch_full_event(self, key: str, msg: dict[str, Any]) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                payload = (await db.execute(
+                    text("SELECT payload FROM task_events WHERE id = CAST(:id AS uuid)"),
+                    {"id": msg["id"]},
+                )).scalar_one_or_none()
+        except Exception as e:
+            log.warning("task hub: cannot load event %s: %s", msg.get("id"), e)
+            payload = None
+
+        full = {k: v for k, v in msg.items() if k != "truncated"}
+        full["payload"] = payload if payload is not None else {}
+        self._dispatch(key, "event", full)
+
+
+task_hub = TaskEventHub(_asyncpg_dsn())
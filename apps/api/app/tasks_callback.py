@@ -2,21 +2,41 @@ from __future__ import annotations
 
 import hmac
 import json
+import logging
 import time
 from hashlib import sha256
 from datetime import datetime, timezone
 from typing import Any, Optional
-from uuid import UUID
+from uuid import UUID, uuid4
 
 from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
+from redis.exceptions import RedisError
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_db
+from .redis_client import get_redis
+from .settings import settings
 
 router = APIRouter()
 
+log = logging.getLogger(__name__)
+
+# dedupe store: fm:cb:<company>:<task>:<delivery> -> PENDING | {"status_code", "body"}
+# (consulté seulement après vérification de la signature HMAC)
+CALLBACK_DEDUPE_PREFIX = "fm:cb:"
+CALLBACK_PENDING = "__PENDING__"
+CALLBACK_CLAIM_TTL_SECONDS = 60
+
+# mode async: callbacks vérifiés en attente d'application par le worker (fm.apply_callbacks)
+CALLBACK_QUEUE_KEY = "fm:callbacks:pending"
+
+# résultats > CALLBACK_RESULT_INLINE_MAX_BYTES: stockés dans task_results,
+# runtime_json.callback ne garde que result_ref + result_summary
+RESULT_SUMMARY_MAX_KEYS = 50
+
 
 def _utc_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -28,16 +48,135 @@ class CallbackIn(BaseModel):
     error: Optional[str] = None
 
 
-@router.post("/companies/{company_code}/tasks/{task_id}/callback")
-async def task_callback(
-    company_code: str,
-    task_id: UUID,
-    body: CallbackIn,
-    request: Request,
-    x_fm_timestamp: Optional[str] = Header(None),
-    x_fm_signature: Optional[str] = Header(None),
-    db: AsyncSession = Depends(get_db),
-):
+def _result_summary(result: Any) -> dict[str, Any]:
+    if isinstance(result, dict):
+        keys = list(result.keys())
+        return {
+            "type": "object",
+            "keys": keys[:RESULT_SUMMARY_MAX_KEYS],
+            "keys_truncated": len(keys) > RESULT_SUMMARY_MAX_KEYS,
+        }
+    return {"type": type(result).__name__}
+
+
+def _prepare_callbacks(items: list[dict[str, Any]], inline_max: int) -> tuple[list[str], dict[str, list[Any]]]:
+    """
+    runtime_json.callback documents + task_results rows for the results above
+    the inline threshold (only a reference and a summary stay on the task).
+    Mirrored by the worker (fm.apply_callbacks): tests/test_callback_parity.py.
+    """
+    callbacks: list[str] = []
+    offload: dict[str, list[Any]] = {"ids": [], "task_ids": [], "sizes": [], "hashes": [], "bodies": []}
+    for it in items:
+        doc: dict[str, Any] = {
+            "status": it["status"],
+            "result": it.get("result"),
+            "error": it.get("error"),
+            "ts": it["ts"],
+        }
+        if it.get("result") is not None:
+            body = json.dumps(it["result"], separators=(",", ":")).encode("utf-8")
+            if len(body) > inline_max:
+                result_id = str(uuid4())
+                digest = sha256(body).hexdigest()
+                doc["result"] = None
+                doc["result_ref"] = {
+                    "id": result_id,
+                    "size_bytes": len(body),
+                    "sha256": digest,
+                    "mime_type": "application/json",
+                }
+                doc["result_summary"] = _result_summary(it["result"])
+                offload["ids"].append(result_id)
+                offload["task_ids"].append(it["task_id"])
+                offload["sizes"].append(len(body))
+                offload["hashes"].append(digest)
+                offload["bodies"].append(body)
+        callbacks.append(json.dumps(doc))
+    return callbacks, offload
+
+
+# Same statement as the worker's fm.apply_callbacks (psycopg placeholders
+# there): tests/test_callback_parity.py keeps both copies identical.
+APPLY_CALLBACKS_SQL = """
+WITH cb AS (
+    SELECT *
+    FROM unnest(
+        CAST(:task_ids AS uuid[]),
+        CAST(:statuses AS text[]),
+        CAST(:errors AS text[]),
+        CAST(:callbacks AS text[]),
+        CAST(:finished_ats AS text[])
+    ) AS x(task_id, status, error, callback, finished_at)
+),
+upd AS (
+    UPDATE tasks t
+    SET status = CAST(cb.status AS task_status),
+        last_error = CASE WHEN cb.status = 'failed' AND cb.error IS NOT NULL
+                          THEN cb.error ELSE t.last_error END,
+        finished_at = CAST(cb.finished_at AS timestamptz),
+        runtime_json = COALESCE(t.runtime_json,'{}'::jsonb)
+            || jsonb_build_object('callback', CAST(cb.callback AS jsonb))
+    FROM cb
+    WHERE t.id = cb.task_id
+      AND t.status NOT IN ('done', 'failed', 'canceled')
+    RETURNING t.id, t.company_id, cb.status, cb.error, cb.finished_at
+),
+res AS (
+    INSERT INTO task_results (id, company_id, task_id, size_bytes, sha256, body)
+    SELECT r.id, upd.company_id, upd.id, r.size_bytes, r.sha256, r.body
+    FROM unnest(
+        CAST(:res_ids AS uuid[]),
+        CAST(:res_task_ids AS uuid[]),
+        CAST(:res_sizes AS bigint[]),
+        CAST(:res_hashes AS text[]),
+        CAST(:res_bodies AS bytea[])
+    ) AS r(id, task_id, size_bytes, sha256, body)
+    JOIN upd ON upd.id = r.task_id
+    RETURNING 1
+),
+ev AS (
+    INSERT INTO task_events (company_id, task_id, event_type, actor_type, payload)
+    SELECT company_id, id, 'callback_received', 'integration',
+           jsonb_build_object('status', status, 'ts', finished_at)
+    FROM upd
+    UNION ALL
+    SELECT company_id, id,
+           CASE WHEN status = 'done' THEN 'task_done' ELSE 'task_failed' END,
+           'system',
+           jsonb_build_object('ts', finished_at, 'error', error)
+    FROM upd
+    RETURNING 1
+)
+SELECT id::text AS task_id, status FROM upd
+"""
+
+
+async def _apply_callbacks(db: AsyncSession, items: list[dict[str, Any]]) -> dict[str, str]:
+    """
+    Apply verified callbacks in one statement (UPDATE + both events, large
+    results into task_results).
+    items: {task_id, status, result, error, ts}. Tasks already finished are
+    skipped; returns task_id -> new status for the rows actually updated.
+    """
+    callbacks, offload = _prepare_callbacks(items, settings.CALLBACK_RESULT_INLINE_MAX_BYTES)
+    rows = (await db.execute(text(APPLY_CALLBACKS_SQL), {
+        "task_ids": [it["task_id"] for it in items],
+        "statuses": [it["status"] for it in items],
+        "errors": [it.get("error") for it in items],
+        "callbacks": callbacks,
+        "finished_ats": [it["ts"] for it in items],
+        "res_ids": offload["ids"],
+        "res_task_ids": offload["task_ids"],
+        "res_sizes": offload["sizes"],
+        "res_hashes": offload["hashes"],
+        "res_bodies": offload["bodies"],
+    })).mappings().all()
+
+    return {r["task_id"]: r["status"] for r in rows}
+
+
+def _check_timestamp(x_fm_timestamp: Optional[str], x_fm_signature: Optional[str]) -> int:
     if not x_fm_timestamp or not x_fm_signature:
         raise HTTPException(status_code=401, detail="Missing X-FM-Timestamp or X-FM-Signature")
 
@@ -50,11 +189,124 @@ async def task_callback(
     now = int(time.time())
     if abs(now - ts) > 600:
         raise HTTPException(status_code=401, detail="Timestamp expired")
+    return ts
+
+
+def _verify_signature(secret_json: Optional[dict], ts: int, raw_body: bytes, signature: str) -> None:
+    secret = (secret_json or {}).get("callback_secret")
+    if not secret or not isinstance(secret, str):
+        raise HTTPException(status_code=409, detail="Missing callback_secret in integration_secrets")
 
-    raw_body = await request.body()
     msg = (str(ts) + ".").encode("utf-8") + raw_body
+    expected = hmac.new(secret.encode("utf-8"), msg, sha256).hexdigest()
+    if not hmac.compare_digest(expected, signature):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+
+async def _dedupe_claim(key: str) -> tuple[Optional[Any], Optional[JSONResponse]]:
+    """
+    Claim a delivery key. Returns (redis or None, cached response or None):
+    a finished duplicate gets its stored response, one in flight a 409.
+    """
+    redis = get_redis()
+    if redis is None:
+        return None, None
+    try:
+        claimed = await redis.set(key, CALLBACK_PENDING, nx=True, ex=CALLBACK_CLAIM_TTL_SECONDS)
+        cached = None if claimed else (await redis.get(key) or CALLBACK_PENDING)
+    except RedisError as e:
+        log.warning("callback dedupe unavailable: %s", e)
+        return None, None
+
+    if cached == CALLBACK_PENDING:
+        raise HTTPException(status_code=409, detail="Callback delivery already in progress")
+    if cached is not None:
+        stored = json.loads(cached)
+        if "status_code" not in stored:  # entrée écrite avant le stockage du status
+            stored = {"status_code": 200, "body": stored}
+        return redis, JSONResponse(
+            stored["body"],
+            status_code=stored["status_code"],
+            headers={"Idempotent-Replayed": "true"},
+        )
+    return redis, None
+
+
+async def _dedupe_release(redis: Optional[Any], key: str) -> None:
+    if redis is None:
+        return
+    try:
+        await redis.delete(key)
+    except RedisError:
+        pass
+
+
+async def _dedupe_store(redis: Optional[Any], key: str, result: dict[str, Any], status_code: int = 200) -> None:
+    if redis is None:
+        return
+    try:
+        stored = json.dumps({"status_code": status_code, "body": result})
+        await redis.set(key, stored, ex=settings.CALLBACK_DEDUPE_TTL_SECONDS)
+    except RedisError as e:
+        log.warning("callback dedupe store failed: %s", e)
+
+
+async def _queue_callbacks(items: list[dict[str, Any]]) -> bool:
+    """Mode async: hand verified callbacks to the worker. False -> apply inline."""
+    redis = get_redis()
+    if settings.CALLBACK_APPLY_MODE != "async" or redis is None:
+        return False
+    try:
+        await redis.lpush(CALLBACK_QUEUE_KEY, *[json.dumps(it) for it in items])
+        return True
+    except RedisError as e:
+        log.warning("callback queue unavailable, applying inline: %s", e)
+        return False
+
+
+@router.post("/companies/{company_code}/tasks/{task_id}/callback")
+async def task_callback(
+    company_code: str,
+    task_id: UUID,
+    body: CallbackIn,
+    request: Request,
+    x_fm_timestamp: Optional[str] = Header(None),
+    x_fm_signature: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+    x_fm_delivery_id: Optional[str] = Header(None, max_length=200),
+    db: AsyncSession = Depends(get_db),
+):
+    ts = _check_timestamp(x_fm_timestamp, x_fm_signature)
+    row = await _load_callback_task(company_code, task_id, request, ts, x_fm_signature, db)
+
+    # Dedupe (signature déjà vérifiée): Idempotency-Key, sinon X-FM-Delivery-Id,
+    # sinon la signature (rejeu exact du même envoi)
+    delivery = idempotency_key or x_fm_delivery_id or x_fm_signature
+    dedupe_key = f"{CALLBACK_DEDUPE_PREFIX}{company_code}:{task_id}:{delivery}"
+    redis, cached = await _dedupe_claim(dedupe_key)
+    if cached is not None:
+        return cached
 
-    # load task + integration secret
+    try:
+        result = await _handle_callback(task_id, body, row, db)
+    except BaseException:
+        await _dedupe_release(redis, dedupe_key)
+        raise
+
+    status_code = 202 if result.get("queued") else 200
+    await _dedupe_store(redis, dedupe_key, result, status_code)
+    return JSONResponse(result, status_code=status_code)
+
+
+async def _load_callback_task(
+    company_code: str,
+    task_id: UUID,
+    request: Request,
+    ts: int,
+    signature: str,
+    db: AsyncSession,
+) -> dict[str, Any]:
+    """Task + integration secret; raises unless the HMAC signature is valid."""
     row = (await db.execute(text("""
         SELECT
             t.id,
@@ -78,72 +330,185 @@ async def task_callback(
     if not row["integration_id"]:
         raise HTTPException(status_code=409, detail="Task has no integration_id")
 
-    secret = (row["secret_json"] or {}).get("callback_secret")
-    if not secret or not isinstance(secret, str):
-        raise HTTPException(status_code=409, detail="Missing callback_secret in integration_secrets")
+    _verify_signature(row["secret_json"], ts, await request.body(), signature)
+    return dict(row)
 
-    expected = hmac.new(secret.encode("utf-8"), msg, sha256).hexdigest()
-    if not hmac.compare_digest(expected, x_fm_signature):
-        raise HTTPException(status_code=401, detail="Invalid signature")
 
+async def _handle_callback(
+    task_id: UUID,
+    body: CallbackIn,
+    row: dict[str, Any],
+    db: AsyncSession,
+) -> dict[str, Any]:
     # Transition rules
     if row["status"] in ("done", "failed", "canceled"):
         raise HTTPException(status_code=409, detail=f"Task already finished: {row['status']}")
 
-    finished_at = _utc_iso()
     new_status = "done" if body.status == "done" else "failed"
-    last_error = body.error if new_status == "failed" else None
-
-    # CORRECTION ICI : CAST(:last_error AS text) pour éviter l'AmbiguousParameterError
-    await db.execute(text("""
-        UPDATE tasks
-        SET status=:status,
-            last_error = CASE WHEN CAST(:last_error AS text) IS NULL THEN last_error ELSE CAST(:last_error AS text) END,
-            runtime_json = COALESCE(runtime_json,'{}'::jsonb)
-                || jsonb_build_object(
-                    'finished_at', to_jsonb(CAST(:finished_at AS text)),
-                    'callback', CAST(:callback_json AS jsonb)
-                )
-        WHERE id=:task_id
-    """), {
+    item = {
+        "task_id": str(task_id),
         "status": new_status,
-        "last_error": last_error,
-        "finished_at": finished_at,
-        "callback_json": json.dumps({
-            "status": body.status,
-            "result": body.result,
-            "error": body.error,
-            "ts": finished_at,
-        }),
-        "task_id": task_id,
-    })
-
-    # events
-    await db.execute(text("""
-        INSERT INTO task_events (company_id, task_id, event_type, actor_type, payload)
-        VALUES (:company_id, :task_id, 'callback_received', 'integration', CAST(:payload AS jsonb))
-    """), {
-        "company_id": row["company_id"],
-        "task_id": task_id,
-        "payload": json.dumps({
-            "status": body.status,
-            "ts": finished_at,
-        }),
-    })
-
-    await db.execute(text("""
-        INSERT INTO task_events (company_id, task_id, event_type, actor_type, payload)
-        VALUES (:company_id, :task_id, :event_type, 'system', CAST(:payload AS jsonb))
-    """), {
-        "company_id": row["company_id"],
-        "task_id": task_id,
-        "event_type": "task_done" if new_status == "done" else "task_failed",
-        "payload": json.dumps({
-            "ts": finished_at,
-            "error": body.error,
-        }),
-    })
-
-    await db.commit()
-
-    return {"ok": True, "task_id": str(task_id), "status": new_status}
\ No newline at end of file
+        "result": body.result,
+        "error": body.error,
+        "ts": _utc_iso(),
+    }
+
+    # Mode async: on acquitte tout de suite, le worker applique par lots
+    if await _queue_callbacks([item]):
+        return {"ok": True, "task_id": str(task_id), "status": new_status, "queued": True}
+
+    try:
+        applied = await _apply_callbacks(db, [item])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    if str(task_id) not in applied:
+        # terminé entre la lecture et l'UPDATE
+        raise HTTPException(status_code=409, detail="Task already finished")
+
+    return {"ok": True, "task_id": str(task_id), "status": new_status}
+
+
+BATCH_CALLBACK_MAX = 1000
+
+
+class BatchCallbackItem(CallbackIn):
+    task_id: UUID
+
+
+class BatchCallbackIn(BaseModel):
+    integration_id: UUID
+    items: list[BatchCallbackItem] = Field(..., min_length=1, max_length=BATCH_CALLBACK_MAX)
+
+
+@router.post("/companies/{company_code}/tasks:batchCallback")
+async def task_callback_batch(
+    company_code: str,
+    body: BatchCallbackIn,
+    request: Request,
+    x_fm_timestamp: Optional[str] = Header(None),
+    x_fm_signature: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+    x_fm_delivery_id: Optional[str] = Header(None, max_length=200),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    One signed envelope finishing many tasks of the same integration.
+    Signature: same scheme as the unit callback, checked once with the
+    integration secret. Per-item outcome: applied | queued | not_found |
+    wrong_integration | already_finished | duplicate.
+    """
+    ts = _check_timestamp(x_fm_timestamp, x_fm_signature)
+    integ = await _load_callback_integration(company_code, body.integration_id, request, ts, x_fm_signature, db)
+
+    delivery = idempotency_key or x_fm_delivery_id or x_fm_signature
+    dedupe_key = f"{CALLBACK_DEDUPE_PREFIX}{company_code}:batch:{body.integration_id}:{delivery}"
+    redis, cached = await _dedupe_claim(dedupe_key)
+    if cached is not None:
+        return cached
+
+    try:
+        result = await _handle_callback_batch(body, integ, db)
+    except BaseException:
+        await _dedupe_release(redis, dedupe_key)
+        raise
+
+    await _dedupe_store(redis, dedupe_key, result)
+    return result
+
+
+async def _load_callback_integration(
+    company_code: str,
+    integration_id: UUID,
+    request: Request,
+    ts: int,
+    signature: str,
+    db: AsyncSession,
+) -> dict[str, Any]:
+    """Integration + secret; raises unless the HMAC signature is valid."""
+    integ = (await db.execute(text("""
+        SELECT
+            i.id,
+            i.company_id,
+            COALESCE(s.secret_json,'{}'::jsonb) AS secret_json
+        FROM integrations i
+        JOIN companies c ON c.id = i.company_id
+        LEFT JOIN integration_secrets s ON s.id::text = i.secrets_ref
+        WHERE c.code = :company_code
+          AND i.id = :integration_id
+        LIMIT 1
+    """), {"company_code": company_code, "integration_id": integration_id})).mappings().first()
+
+    if not integ:
+        raise HTTPException(status_code=404, detail="Integration not found")
+
+    _verify_signature(integ["secret_json"], ts, await request.body(), signature)
+    return dict(integ)
+
+
+async def _handle_callback_batch(
+    body: BatchCallbackIn,
+    integ: dict[str, Any],
+    db: AsyncSession,
+) -> dict[str, Any]:
+    task_ids = list(dict.fromkeys(it.task_id for it in body.items))
+    rows = (await db.execute(text("""
+        SELECT t.id::text AS id, t.status, t.integration_id
+        FROM tasks t
+        WHERE t.company_id = :company_id
+          AND t.id = ANY(CAST(:task_ids AS uuid[]))
+    """), {"company_id": integ["company_id"], "task_ids": task_ids})).mappings().all()
+    tasks = {r["id"]: r for r in rows}
+
+    finished_at = _utc_iso()
+    outcomes: list[dict[str, Any]] = []
+    to_apply: list[dict[str, Any]] = []
+    seen: set[str] = set()
+    for it in body.items:
+        tid = str(it.task_id)
+        new_status = "done" if it.status == "done" else "failed"
+        t = tasks.get(tid)
+        if tid in seen:
+            outcome = "duplicate"
+        elif not t:
+            outcome = "not_found"
+        elif str(t["integration_id"]) != str(body.integration_id):
+            outcome = "wrong_integration"
+        elif t["status"] in ("done", "failed", "canceled"):
+            outcome = "already_finished"
+        else:
+            outcome = "pending"
+            to_apply.append({
+                "task_id": tid,
+                "status": new_status,
+                "result": it.result,
+                "error": it.error,
+                "ts": finished_at,
+            })
+        seen.add(tid)
+        outcomes.append({"task_id": tid, "status": new_status, "outcome": outcome})
+
+    if to_apply and await _queue_callbacks(to_apply):
+        for o in outcomes:
+            if o["outcome"] == "pending":
+                o["outcome"] = "queued"
+    elif to_apply:
+        try:
+            applied = await _apply_callbacks(db, to_apply)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        for o in outcomes:
+            if o["outcome"] == "pending":
+                # terminé entre la lecture et l'UPDATE
+                o["outcome"] = "applied" if o["task_id"] in applied else "already_finished"
+
+    return {
+        "ok": True,
+        "integration_id": str(body.integration_id),
+        "applied": sum(1 for o in outcomes if o["outcome"] in ("applied", "queued")),
+        "items": outcomes,
+    }
@@ -1,15 +1,30 @@
 from uuid import UUID
 import json
 from datetime import datetime, timezone
+from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_db
+from .responses import FastJSONResponse, raw_json
+from .task_fields import GET_DEFAULT_FIELDS, parse_fields, task_json_sql
 
 router = APIRouter()
 
+# action -> patch control_json (mêmes sémantiques que les endpoints unitaires)
+CONTROL_ACTIONS: dict[str, dict[str, bool]] = {
+    "reset": {"pause": False, "cancel": False},
+    "pause": {"pause": True},
+    "resume": {"pause": False, "cancel": False},
+    "cancel": {"cancel": True, "pause": False},
+}
+
+BULK_CONTROL_MAX = 5000
+BATCH_GET_MAX = 500
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -37,30 +52,95 @@ async def _insert_task_event(
 
 
 @router.get("/companies/{company_code}/tasks/{task_id}")
-async def get_task(company_code: str, task_id: UUID, db: AsyncSession = Depends(get_db)):
-    row = (await db.execute(text("""
-        SELECT
-            t.id,
-            t.title,
-            t.status,
-            t.priority,
-            t.created_at,
-            t.deadline_at,
-            t.attempt_count,
-            t.max_attempts,
-            t.runtime_json,
-            t.control_json
+async def get_task(
+    company_code: str,
+    task_id: UUID,
+    fields: Optional[str] = Query(
+        None,
+        description="Comma separated task fields or JSON keys (runtime_json.job_type), or 'all'",
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    task_json = task_json_sql(parse_fields(fields, GET_DEFAULT_FIELDS))
+
+    doc = (await db.execute(text(f"""
+        SELECT {task_json}::text
         FROM tasks t
         JOIN companies c ON c.id = t.company_id
         WHERE c.code = :company_code
           AND t.id = :task_id
         LIMIT 1
-    """), {"company_code": company_code, "task_id": task_id})).mappings().first()
+    """), {"company_code": company_code, "task_id": task_id})).scalar_one_or_none()
 
-    if not row:
+    if doc is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    return dict(row)
+    return FastJSONResponse(raw_json(doc))
+
+
+class BatchGetIn(BaseModel):
+    task_ids: list[UUID] = Field(..., min_length=1, max_length=BATCH_GET_MAX)
+    fields: Optional[str] = Field(None, description="Same syntax as get_task ?fields=")
+    events: int = Field(0, ge=0, le=50, description="Embed the last N events of each task")
+
+
+@router.post("/companies/{company_code}/tasks:batchGet")
+async def batch_get_tasks(company_code: str, body: BatchGetIn, db: AsyncSession = Depends(get_db)):
+    """
+    Up to 500 tasks in one query, in request order, optionally with their
+    last N events (newest first) through a lateral join.
+    """
+    extra = {"events": "ev.events"} if body.events else None
+    # id toujours présent: les items se rapprochent des ids demandés par id,
+    # pas par position (les ids introuvables sont omis)
+    selection = {"id": None, **parse_fields(body.fields, GET_DEFAULT_FIELDS)}
+    task_json = task_json_sql(selection, extra)
+
+    lateral = ""
+    if body.events:
+        lateral = """
+            LEFT JOIN LATERAL (
+                SELECT COALESCE(json_agg(json_build_object(
+                    'id', e.id,
+                    'created_at', e.created_at,
+                    'event_type', e.event_type,
+                    'actor_type', e.actor_type,
+                    'payload', e.payload
+                ) ORDER BY e.created_at DESC, e.id DESC), '[]') AS events
+                FROM (
+                    SELECT te.id, te.created_at, te.event_type, te.actor_type, te.payload
+                    FROM task_events te
+                    WHERE te.task_id = t.id
+                    ORDER BY te.created_at DESC, te.id DESC
+                    LIMIT :events
+                ) e
+            ) ev ON true
+        """
+
+    page = (await db.execute(text(f"""
+        SELECT
+            COALESCE(
+                json_agg({task_json} ORDER BY array_position(CAST(:task_ids AS uuid[]), t.id)),
+                '[]'
+            )::text AS items,
+            COALESCE(array_agg(t.id::text), '{{}}') AS found
+        FROM tasks t
+        JOIN companies c ON c.id = t.company_id
+        {lateral}
+        WHERE c.code = :company_code
+          AND t.id = ANY(CAST(:task_ids AS uuid[]))
+    """), {
+        "company_code": company_code,
+        "task_ids": list(dict.fromkeys(body.task_ids)),
+        "events": body.events,
+    })).mappings().one()
+
+    found = set(page["found"])
+    return FastJSONResponse({
+        "company_code": company_code,
+        "items": raw_json(page["items"], "[]"),
+        "not_found": [str(t) for t in dict.fromkeys(body.task_ids) if str(t) not in found],
+    })
 
 
 @router.post("/companies/{company_code}/tasks/{task_id}/reset")
@@ -205,3 +285,125 @@ async def cancel_task(company_code: str, task_id: UUID, db: AsyncSession = Depen
     except Exception:
         await db.rollback()
         raise
+
+
+
+# valeurs de l'enum task_status: une faute de frappe -> 422, pas une erreur asyncpg
+TaskStatus = Literal[
+    "draft", "queued", "running", "paused", "blocked",
+    "needs_approval", "failed", "canceled", "done",
+]
+
+
+class BulkControlFilter(BaseModel):
+    project_code: Optional[str] = None
+    status: Optional[list[TaskStatus]] = None
+    tag: Optional[str] = None
+
+
+class BulkControlIn(BaseModel):
+    action: Literal["pause", "resume", "cancel", "reset"]
+    task_ids: Optional[list[UUID]] = Field(None, min_length=1, max_length=BULK_CONTROL_MAX)
+    filter: Optional[BulkControlFilter] = None
+
+
+@router.post("/companies/{company_code}/tasks:batchControl")
+async def bulk_control_tasks(company_code: str, body: BulkControlIn, db: AsyncSession = Depends(get_db)):
+    """
+    Apply pause/resume/cancel/reset to a list of task ids or to a filter
+    (project, status, tag). One statement: set-based UPDATE ... RETURNING
+    chained to the bulk task_events INSERT.
+    """
+    if (body.task_ids is None) == (body.filter is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of task_ids or filter")
+
+    f = body.filter
+    if f is not None and not (f.project_code or f.status or f.tag):
+        raise HTTPException(status_code=422, detail="filter needs at least one of project_code, status, tag")
+
+    company = (await db.execute(
+        text("SELECT id FROM companies WHERE code=:company_code LIMIT 1"),
+        {"company_code": company_code},
+    )).mappings().first()
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+
+    patch = CONTROL_ACTIONS[body.action]
+    conditions = ["t.company_id = :company_id"]
+    params = {
+        "company_id": company["id"],
+        "max": BULK_CONTROL_MAX,
+        "patch": json.dumps(patch),
+        "event_type": body.action,
+        "payload": json.dumps({**patch, "ts": _now_iso(), "bulk": True}),
+    }
+
+    if body.task_ids is not None:
+        conditions.append("t.id = ANY(CAST(:task_ids AS uuid[]))")
+        params["task_ids"] = body.task_ids
+    else:
+        if f.project_code:
+            conditions.append("""t.project_id = (
+                SELECT p.id FROM projects p
+                WHERE p.company_id = :company_id AND p.code = :project_code
+            )""")
+            params["project_code"] = f.project_code
+        if f.status:
+            conditions.append("t.status = ANY(CAST(:statuses AS task_status[]))")
+            params["statuses"] = f.status
+        if f.tag:
+            conditions.append(":tag = ANY(t.tags)")
+            params["tag"] = f.tag
+        # déjà dans l'état cible: ignoré, pour qu'une relance (has_more) progresse
+        conditions.append("NOT (COALESCE(t.control_json,'{}'::jsonb) @> CAST(:patch AS jsonb))")
+
+    try:
+        rows = (await db.execute(text(f"""
+            WITH target AS (
+                SELECT t.id
+                FROM tasks t
+                WHERE {" AND ".join(conditions)}
+                ORDER BY t.created_at, t.id
+                LIMIT :max
+                FOR UPDATE
+            ),
+            updated AS (
+                UPDATE tasks t
+                SET control_json = COALESCE(t.control_json,'{{}}'::jsonb) || CAST(:patch AS jsonb)
+                FROM target
+                WHERE t.id = target.id
+                RETURNING t.id, t.company_id, t.control_json
+            ),
+            events AS (
+                INSERT INTO task_events (company_id, task_id, event_type, actor_type, payload)
+                SELECT u.company_id, u.id, :event_type, 'system', CAST(:payload AS jsonb)
+                FROM updated u
+            )
+            SELECT id, control_json FROM updated
+        """), params)).mappings().all()
+
+        await db.commit()
+
+    except Exception:
+        await db.rollback()
+        raise
+
+    updated = {str(r["id"]): r["control_json"] for r in rows}
+
+    if body.task_ids is not None:
+        items = [
+            {"id": str(tid), "outcome": "updated", "control_json": updated[str(tid)]}
+            if str(tid) in updated else
+            {"id": str(tid), "outcome": "not_found"}
+            for tid in dict.fromkeys(body.task_ids)
+        ]
+    else:
+        items = [{"id": k, "outcome": "updated", "control_json": v} for k, v in updated.items()]
+
+    return {
+        "action": body.action,
+        "updated": len(updated),
+        # filtre plus large que BULK_CONTROL_MAX: relancer la même requête
+        "has_more": body.filter is not None and len(updated) >= BULK_CONTROL_MAX,
+        "items": items,
+    }
@@ -3,8 +3,8 @@ from __future__ import annotations
 import json
 from datetime import datetime
 from enum import Enum
-from typing import Any, Optional
-from uuid import UUID
+from typing import Any, Literal, Optional
+from uuid import UUID, uuid4
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
@@ -16,6 +16,7 @@ from .db import get_db
 router = APIRouter()
 
 WEBHOOK_JOB_TYPES = {"webhook", "n8n_webhook", "langflow_webhook"}
+TERMINAL_STATUSES = {"done", "failed", "canceled"}
 
 
 class TaskPriority(str, Enum):
@@ -37,6 +38,9 @@ class CreateTaskIn(BaseModel):
     # Si job_type nécessite un connecteur (webhook...), on veut un integration_id.
     integration_id: Optional[UUID] = None
 
+    # si une dépendance échoue: ignore (on continue), block (reste bloquée), fail (échoue aussi)
+    on_dependency_failure: Literal["ignore", "block", "fail"] = "ignore"
+
 
 class CreateTaskOut(BaseModel):
     company_code: str
@@ -44,6 +48,61 @@ class CreateTaskOut(BaseModel):
     task: dict[str, Any]
 
 
+class BatchTaskIn(CreateTaskIn):
+    # clé côté client, référencée par depends_on des autres tâches du batch
+    ref: Optional[str] = Field(None, min_length=1, max_length=100)
+    # refs du batch ou UUID de tâches existantes de la company
+    depends_on: list[str] = Field(default_factory=list)
+
+
+class CreateTasksBatchIn(BaseModel):
+    tasks: list[BatchTaskIn] = Field(..., min_length=1, max_length=5000)
+
+
+class CreateTasksBatchOut(BaseModel):
+    company_code: str
+    project_code: str
+    items: list[dict[str, Any]]
+    dependencies_added: int
+
+
+def _validate_integration(integ: Optional[dict], job_type: Optional[str]) -> None:
+    if not integ:
+        raise HTTPException(status_code=404, detail="Integration not found")
+
+    if not integ["is_active"]:
+        raise HTTPException(status_code=409, detail="Integration is disabled")
+
+    # cohérence job_type vs provider (recommandé, mais tu peux enlever si tu veux plus permissif)
+    if job_type == "n8n_webhook" and integ["provider_code"] != "n8n":
+        raise HTTPException(status_code=409, detail="Integration provider must be n8n")
+    if job_type == "langflow_webhook" and integ["provider_code"] != "langflow":
+        raise HTTPException(status_code=409, detail="Integration provider must be langflow")
+
+
+def _batch_dependency_order(refs: dict[str, int], edges: list[tuple[int, int]], size: int) -> None:
+    """Kahn's algorithm over in-batch edges (waiter, dependee): 422 on a cycle."""
+    indegree = [0] * size
+    dependents: list[list[int]] = [[] for _ in range(size)]
+    for waiter, dependee in edges:
+        indegree[waiter] += 1
+        dependents[dependee].append(waiter)
+
+    ready = [i for i in range(size) if indegree[i] == 0]
+    seen = 0
+    while ready:
+        i = ready.pop()
+        seen += 1
+        for w in dependents[i]:
+            indegree[w] -= 1
+            if indegree[w] == 0:
+                ready.append(w)
+
+    if seen != size:
+        cyclic = sorted(r for r, i in refs.items() if indegree[i] > 0)
+        raise HTTPException(status_code=422, detail=f"Dependency cycle between refs: {', '.join(cyclic)}")
+
+
 @router.post(
     "/companies/{company_code}/projects/{project_code}/tasks",
     response_model=CreateTaskOut,
@@ -99,17 +158,7 @@ async def create_task(
                 )
             ).mappings().first()
 
-            if not integ:
-                raise HTTPException(status_code=404, detail="Integration not found")
-
-            if not integ["is_active"]:
-                raise HTTPException(status_code=409, detail="Integration is disabled")
-
-            # cohérence job_type vs provider (recommandé, mais tu peux enlever si tu veux plus permissif)
-            if body.job_type == "n8n_webhook" and integ["provider_code"] != "n8n":
-                raise HTTPException(status_code=409, detail="Integration provider must be n8n")
-            if body.job_type == "langflow_webhook" and integ["provider_code"] != "langflow":
-                raise HTTPException(status_code=409, detail="Integration provider must be langflow")
+            _validate_integration(integ, body.job_type)
 
             integration_id = UUID(str(integ["id"]))
 
@@ -160,7 +209,11 @@ async def create_task(
                         :max_attempts,
                         CAST(:priority AS task_priority),
                         :deadline_at,
-                        jsonb_build_object('pause', false, 'cancel', false),
+                        jsonb_build_object(
+                            'pause', false,
+                            'cancel', false,
+                            'on_dependency_failure', CAST(:on_dependency_failure AS text)
+                        ),
                         CAST(:runtime_json AS jsonb)
                     )
                     RETURNING
@@ -186,6 +239,7 @@ async def create_task(
                     "max_attempts": int(body.max_attempts),
                     "priority": body.priority.value,
                     "deadline_at": body.deadline_at,
+                    "on_dependency_failure": body.on_dependency_failure,
                     "runtime_json": json.dumps(runtime_patch),
                 },
             )
@@ -224,3 +278,288 @@ async def create_task(
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"create_task failed: {e}")
+
+
+
+@router.post(
+    "/companies/{company_code}/projects/{project_code}/tasks:batch",
+    response_model=CreateTasksBatchOut,
+)
+async def create_tasks_batch(
+    company_code: str,
+    project_code: str,
+    body: CreateTasksBatchIn,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Create many tasks in one transaction: lookups are done once, tasks,
+    task_created events and dependencies are each written with a single
+    multi-row INSERT ... SELECT FROM unnest(...).
+    """
+    items = body.tasks
+
+    # 0) validation hors DB
+    refs: dict[str, int] = {}
+    for i, t in enumerate(items):
+        if t.job_type in WEBHOOK_JOB_TYPES and not t.integration_id:
+            raise HTTPException(status_code=422, detail=f"tasks[{i}]: integration_id is required for webhook job_type")
+        if t.ref is not None:
+            if t.ref in refs:
+                raise HTTPException(status_code=422, detail=f"tasks[{i}]: duplicate ref {t.ref!r}")
+            refs[t.ref] = i
+
+    new_ids = [uuid4() for _ in items]
+
+    internal_edges: list[tuple[int, int]] = []
+    external_edges: list[tuple[int, UUID]] = []
+    for i, t in enumerate(items):
+        for dep in t.depends_on:
+            if dep in refs:
+                if refs[dep] == i:
+                    raise HTTPException(status_code=422, detail=f"tasks[{i}]: a task cannot depend on itself")
+                internal_edges.append((i, refs[dep]))
+                continue
+            try:
+                external_edges.append((i, UUID(dep)))
+            except ValueError:
+                raise HTTPException(status_code=422, detail=f"tasks[{i}]: unknown dependency {dep!r}")
+
+    # depends_on: ["a", "a"] -> une seule arête (dependencies_added reste exact)
+    internal_edges = list(dict.fromkeys(internal_edges))
+    external_edges = list(dict.fromkeys(external_edges))
+
+    # les tâches existantes ne peuvent pas dépendre des nouvelles: seul le batch peut boucler
+    _batch_dependency_order(refs, internal_edges, len(items))
+
+    try:
+        # 1) company
+        company = (
+            await db.execute(
+                text("SELECT id FROM companies WHERE code = :company_code LIMIT 1"),
+                {"company_code": company_code},
+            )
+        ).mappings().first()
+
+        if not company:
+            raise HTTPException(status_code=404, detail="Company not found")
+
+        # 1bis) integrations: une seule requête pour tout le batch
+        integration_ids = {t.integration_id for t in items if t.integration_id}
+        integrations: dict[UUID, dict] = {}
+        if integration_ids:
+            rows = (
+                await db.execute(
+                    text("""
+                        SELECT
+                            i.id,
+                            i.is_active,
+                            p.code AS provider_code
+                        FROM integrations i
+                        JOIN integration_providers p ON p.id = i.provider_id
+                        WHERE i.company_id = :company_id
+                          AND i.id = ANY(CAST(:integration_ids AS uuid[]))
+                    """),
+                    {"company_id": company["id"], "integration_ids": list(integration_ids)},
+                )
+            ).mappings().all()
+            integrations = {UUID(str(r["id"])): dict(r) for r in rows}
+
+        # 2) project (optional, comme create_task)
+        project = (
+            await db.execute(
+                text("""
+                    SELECT p.id
+                    FROM projects p
+                    WHERE p.code = :project_code
+                      AND p.company_id = :company_id
+                    LIMIT 1
+                """),
+                {"project_code": project_code, "company_id": company["id"]},
+            )
+        ).mappings().first()
+
+        project_id = project["id"] if project else None
+
+        # 2bis) dépendances vers des tâches existantes
+        external_ids = {dep for _, dep in external_edges}
+        external_status: dict[UUID, str] = {}
+        if external_ids:
+            # FOR SHARE: a dependee finishing now waits for our commit, so the
+            # release trigger then sees the new waiters
+            found = (
+                await db.execute(
+                    text("""
+                        SELECT t.id, t.status
+                        FROM tasks t
+                        WHERE t.company_id = :company_id
+                          AND t.id = ANY(CAST(:ids AS uuid[]))
+                        FOR SHARE
+                    """),
+                    {"company_id": company["id"], "ids": list(external_ids)},
+                )
+            ).mappings().all()
+            external_status = {UUID(str(r["id"])): r["status"] for r in found}
+            missing = external_ids - set(external_status)
+            if missing:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Some dependee tasks do not exist in this company: {', '.join(sorted(map(str, missing)))}",
+                )
+
+        # 3) colonnes du batch
+        # une tâche qui attend une dépendance non terminée naît "blocked":
+        # le trigger de release (schema v10) la repasse en queued; les dépendances
+        # déjà failed / canceled sont traitées en 6bis (on_dependency_failure)
+        waiting = {w for w, _ in internal_edges}
+        waiting |= {w for w, dep in external_edges if external_status[dep] not in TERMINAL_STATUSES}
+
+        statuses: list[str] = []
+        runtime_jsons: list[str] = []
+        event_payloads: list[str] = []
+        for i, t in enumerate(items):
+            runtime_patch: dict[str, Any] = {}
+            if t.job_type:
+                runtime_patch = {"job_type": t.job_type, "job_payload": t.payload}
+            if i in waiting:
+                runtime_patch["blocked_reason"] = "waiting_dependencies"
+            statuses.append("blocked" if i in waiting else "queued")
+            if t.integration_id:
+                integ = integrations.get(t.integration_id)
+                try:
+                    _validate_integration(integ, t.job_type)
+                except HTTPException as e:
+                    raise HTTPException(status_code=e.status_code, detail=f"tasks[{i}]: {e.detail}")
+                runtime_patch["integration_id"] = str(t.integration_id)
+                runtime_patch["integration_provider"] = integ["provider_code"]
+            runtime_jsons.append(json.dumps(runtime_patch))
+            event_payloads.append(json.dumps({
+                "title": t.title,
+                "project_code": project_code if project_id else None,
+                "integration_id": str(t.integration_id) if t.integration_id else None,
+                "batch": True,
+            }))
+
+        # 4) insert tasks (un seul statement)
+        await db.execute(
+            text("""
+                INSERT INTO tasks (
+                    id,
+                    company_id,
+                    project_id,
+                    integration_id,
+                    title,
+                    status,
+                    attempt_count,
+                    max_attempts,
+                    priority,
+                    deadline_at,
+                    control_json,
+                    runtime_json
+                )
+                SELECT
+                    x.id,
+                    :company_id,
+                    :project_id,
+                    x.integration_id,
+                    x.title,
+                    CAST(x.status AS task_status),
+                    0,
+                    x.max_attempts,
+                    CAST(x.priority AS task_priority),
+                    x.deadline_at,
+                    jsonb_build_object(
+                        'pause', false,
+                        'cancel', false,
+                        'on_dependency_failure', x.on_dependency_failure
+                    ),
+                    CAST(x.runtime_json AS jsonb)
+                FROM unnest(
+                    CAST(:ids AS uuid[]),
+                    CAST(:integration_ids AS uuid[]),
+                    CAST(:titles AS text[]),
+                    CAST(:statuses AS text[]),
+                    CAST(:max_attempts AS int[]),
+                    CAST(:priorities AS text[]),
+                    CAST(:deadlines AS timestamptz[]),
+                    CAST(:on_dependency_failure AS text[]),
+                    CAST(:runtime_jsons AS text[])
+                ) AS x(
+                    id, integration_id, title, status, max_attempts, priority,
+                    deadline_at, on_dependency_failure, runtime_json
+                )
+            """),
+            {
+                "company_id": company["id"],
+                "project_id": project_id,
+                "ids": new_ids,
+                "integration_ids": [t.integration_id for t in items],
+                "titles": [t.title for t in items],
+                "statuses": statuses,
+                "max_attempts": [int(t.max_attempts) for t in items],
+                "priorities": [t.priority.value for t in items],
+                "deadlines": [t.deadline_at for t in items],
+                "on_dependency_failure": [t.on_dependency_failure for t in items],
+                "runtime_jsons": runtime_jsons,
+            },
+        )
+
+        # 5) events task_created
+        await db.execute(
+            text("""
+                INSERT INTO task_events (company_id, task_id, event_type, actor_type, payload)
+                SELECT :company_id, x.task_id, 'task_created', 'system', CAST(x.payload AS jsonb)
+                FROM unnest(CAST(:ids AS uuid[]), CAST(:payloads AS text[])) AS x(task_id, payload)
+            """),
+            {"company_id": company["id"], "ids": new_ids, "payloads": event_payloads},
+        )
+
+        # 6) dépendances (optionnel)
+        waiters = [new_ids[w] for w, _ in internal_edges] + [new_ids[w] for w, _ in external_edges]
+        dependees = [new_ids[d] for _, d in internal_edges] + [d for _, d in external_edges]
+        if waiters:
+            await db.execute(
+                text("""
+                    INSERT INTO task_dependencies (
+                        company_id, task_id, depends_on_task_id, waiter_task_id, dependee_task_id
+                    )
+                    SELECT :company_id, x.waiter, x.dependee, x.waiter, x.dependee
+                    FROM unnest(CAST(:waiters AS uuid[]), CAST(:dependees AS uuid[])) AS x(waiter, dependee)
+                    ON CONFLICT DO NOTHING
+                """),
+                {"company_id": company["id"], "waiters": waiters, "dependees": dependees},
+            )
+
+            # 6bis) on_dependency_failure vs dépendances déjà failed / canceled:
+            # même règle que le trigger de release (schema v16)
+            await db.execute(
+                text("SELECT count(*) FROM tasks_settle_waiters(CAST(:ids AS uuid[]))"),
+                {"ids": list(dict.fromkeys(waiters))},
+            )
+            # un échec se propage aux waiters du batch (trigger): on relit les statuts
+            rows = (
+                await db.execute(
+                    text("SELECT id, status::text AS status FROM tasks WHERE id = ANY(CAST(:ids AS uuid[]))"),
+                    {"ids": new_ids},
+                )
+            ).mappings().all()
+            current = {UUID(str(r["id"])): r["status"] for r in rows}
+            statuses = [current.get(new_ids[i], statuses[i]) for i in range(len(items))]
+
+        await db.commit()
+
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"create_tasks_batch failed: {e}")
+
+    return {
+        "company_code": company_code,
+        "project_code": project_code,
+        "items": [
+            {"id": str(new_ids[i]), "ref": t.ref, "title": t.title, "status": statuses[i]}
+            for i, t in enumerate(items)
+        ],
+        "dependencies_added": len(waiters),
+    }
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import json
+from collections import deque
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Literal
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query
@@ -14,6 +15,9 @@ from .db import get_db
 
 router = APIRouter()
 
+GRAPH_MAX_DEPTH = 50
+GRAPH_MAX_NODES = 5000
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -40,6 +44,59 @@ async def _insert_task_event(
     )
 
 
+async def _lock_company_graph(db: AsyncSession, company_id: UUID) -> None:
+    """Serialise dependency writes of one company (concurrent A->B / B->A inserts)."""
+    await db.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext('task_deps:' || CAST(:company_id AS text)))"),
+        {"company_id": company_id},
+    )
+
+
+async def _creates_cycle(db: AsyncSession, waiter_id: UUID, dep_ids: list[UUID]) -> bool:
+    """
+    waiter -> dependees closes a cycle iff the waiter is reachable from one of
+    the dependees following existing "depends on" edges.
+    """
+    if waiter_id in dep_ids:
+        return True
+    hit = (await db.execute(text("""
+        WITH RECURSIVE reach(id) AS (
+            SELECT unnest(CAST(:dep_ids AS uuid[]))
+            UNION
+            SELECT d.dependee_task_id
+            FROM task_dependencies d
+            JOIN reach r ON d.waiter_task_id = r.id
+        )
+        SELECT 1 FROM reach WHERE id = :waiter_id LIMIT 1
+    """), {"dep_ids": dep_ids, "waiter_id": waiter_id})).scalar_one_or_none()
+    return hit is not None
+
+
+def _topological_order(node_ids: list[str], edges: list[tuple[str, str]]) -> tuple[list[str], bool]:
+    """Kahn over (waiter, dependee) edges: dependees first. Returns (order, has_cycle)."""
+    indegree = {n: 0 for n in node_ids}
+    dependents: dict[str, list[str]] = {n: [] for n in node_ids}
+    for waiter, dependee in edges:
+        indegree[waiter] += 1
+        dependents[dependee].append(waiter)
+
+    ready = deque(n for n in node_ids if indegree[n] == 0)
+    order: list[str] = []
+    while ready:
+        n = ready.popleft()
+        order.append(n)
+        for w in dependents[n]:
+            indegree[w] -= 1
+            if indegree[w] == 0:
+                ready.append(w)
+
+    if len(order) != len(node_ids):
+        # données héritées: on rend quand même tous les noeuds
+        done = set(order)
+        return order + [n for n in node_ids if n not in done], True
+    return order, False
+
+
 class AddDependenciesIn(BaseModel):
     dependee_task_ids: list[str] = Field(..., min_length=1)
 
@@ -75,32 +132,56 @@ async def add_dependencies(
                 raise HTTPException(status_code=404, detail="Waiter task not found")
 
             # 2) validate dependees exist in same company
+            # FOR SHARE: a dependee finishing now waits for our commit, so the
+            # release trigger (schema v10) then sees the new edges
             rows = (await db.execute(text("""
                 SELECT t.id
                 FROM tasks t
                 WHERE t.company_id=:company_id AND t.id = ANY(:ids)
+                FOR SHARE
             """), {"company_id": waiter["company_id"], "ids": dep_ids})).mappings().all()
 
-            if len(rows) != len(dep_ids):
+            if len(rows) != len(set(dep_ids)):
                 raise HTTPException(status_code=409, detail="Some dependee tasks do not exist in this company")
 
-            # 3) insert deps
+            # 3) refuse cycles (reachability check under a per-company lock)
+            await _lock_company_graph(db, waiter["company_id"])
+            if await _creates_cycle(db, waiter_task_id, dep_ids):
+                raise HTTPException(status_code=409, detail="Dependency cycle: the waiter is upstream of a dependee")
+
+            # 4) insert deps
             await db.execute(text("""
-                INSERT INTO task_dependencies (waiter_task_id, dependee_task_id)
-                SELECT :waiter_id, x::uuid
-                FROM unnest(:dep_ids::uuid[]) AS x
-                ON CONFLICT (waiter_task_id, dependee_task_id) DO NOTHING
-            """), {"waiter_id": waiter_task_id, "dep_ids": dep_ids})
+                INSERT INTO task_dependencies
+                    (company_id, task_id, depends_on_task_id, waiter_task_id, dependee_task_id)
+                SELECT :company_id, :waiter_id, x, :waiter_id, x
+                FROM unnest(CAST(:dep_ids AS uuid[])) AS x
+                ON CONFLICT DO NOTHING
+            """), {"company_id": waiter["company_id"], "waiter_id": waiter_task_id, "dep_ids": dep_ids})
+
+            # 5) same rule as the release trigger (schema v16): a waiter not yet
+            # dispatched waits for pending dependees; a failed / canceled one
+            # applies on_dependency_failure (fail -> failed, block -> blocked)
+            settled = (await db.execute(
+                text("SELECT outcome FROM tasks_settle_waiters(CAST(:ids AS uuid[]))"),
+                {"ids": [waiter_task_id]},
+            )).scalar_one_or_none()
+            blocked = settled in ("wait", "hold")
 
             await _insert_task_event(
                 db,
                 waiter["company_id"],
                 waiter_task_id,
                 "dependencies_added",
-                {"dependee_task_ids": [str(x) for x in dep_ids], "ts": now_iso},
+                {"dependee_task_ids": [str(x) for x in dep_ids], "blocked": blocked, "settled": settled, "ts": now_iso},
             )
 
-        return {"ok": True, "waiter_task_id": str(waiter_task_id), "dependee_task_ids": [str(x) for x in dep_ids]}
+        return {
+            "ok": True,
+            "waiter_task_id": str(waiter_task_id),
+            "dependee_task_ids": [str(x) for x in dep_ids],
+            "blocked": blocked,
+            "failed": settled == "fail",
+        }
 
     except HTTPException:
         raise
@@ -159,3 +240,102 @@ async def list_dependents(
     """), {"company_code": company_code, "task_id": task_id})).mappings().all()
 
     return {"items": [{**dict(r), "waiter_task_id": str(r["waiter_task_id"])} for r in rows]}
+
+
+@router.get("/companies/{company_code}/tasks/{task_id}/graph")
+async def task_graph(
+    company_code: str,
+    task_id: UUID,
+    direction: Literal["upstream", "downstream", "both"] = Query("both"),
+    max_depth: int = Query(10, ge=1, le=GRAPH_MAX_DEPTH),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Transitive dependency DAG around a task: upstream = what it waits for,
+    downstream = what waits for it. `order` is topological (dependees first).
+    """
+    task = (await db.execute(text("""
+        SELECT t.id, t.company_id
+        FROM tasks t
+        JOIN companies c ON c.id = t.company_id
+        WHERE c.code = :company_code AND t.id = :task_id
+        LIMIT 1
+    """), {"company_code": company_code, "task_id": task_id})).mappings().first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    sides = []
+    walks = []
+    if direction in ("upstream", "both"):
+        sides.append("up")
+        walks.append("""
+            up(id, depth) AS (
+                SELECT CAST(:task_id AS uuid), 0
+                UNION
+                SELECT d.dependee_task_id, up.depth + 1
+                FROM task_dependencies d
+                JOIN up ON d.waiter_task_id = up.id
+                WHERE up.depth < :max_depth
+            )
+        """)
+    if direction in ("downstream", "both"):
+        sides.append("down")
+        walks.append("""
+            down(id, depth) AS (
+                SELECT CAST(:task_id AS uuid), 0
+                UNION
+                SELECT d.waiter_task_id, down.depth + 1
+                FROM task_dependencies d
+                JOIN down ON d.dependee_task_id = down.id
+                WHERE down.depth < :max_depth
+            )
+        """)
+    reached = " UNION ALL ".join(f"SELECT id, depth, '{side}' AS side FROM {side}" for side in sides)
+
+    nodes = (await db.execute(text(f"""
+        WITH RECURSIVE {", ".join(walks)},
+        reached AS (
+            SELECT id, min(depth) AS depth,
+                   CASE WHEN min(depth) = 0 THEN 'root'
+                        WHEN count(DISTINCT side) > 1 THEN 'both'
+                        ELSE min(side) END AS side
+            FROM ({reached}) r
+            GROUP BY id
+        )
+        SELECT t.id::text AS id, t.title, t.status, t.priority, t.runtime_json->>'job_type' AS job_type, r.depth, r.side
+        FROM reached r
+        JOIN tasks t ON t.id = r.id AND t.company_id = :company_id
+        ORDER BY r.depth, t.created_at
+        LIMIT :max_nodes
+    """), {
+        "task_id": task_id,
+        "company_id": task["company_id"],
+        "max_depth": max_depth,
+        "max_nodes": GRAPH_MAX_NODES + 1,
+    })).mappings().all()
+
+    truncated = len(nodes) > GRAPH_MAX_NODES
+    nodes = nodes[:GRAPH_MAX_NODES]
+    node_ids = [n["id"] for n in nodes]
+
+    edges = (await db.execute(text("""
+        SELECT d.waiter_task_id::text AS waiter_task_id, d.dependee_task_id::text AS dependee_task_id
+        FROM task_dependencies d
+        WHERE d.waiter_task_id = ANY(CAST(:ids AS uuid[]))
+          AND d.dependee_task_id = ANY(CAST(:ids AS uuid[]))
+    """), {"ids": node_ids})).mappings().all()
+
+    order, has_cycle = _topological_order(
+        node_ids, [(e["waiter_task_id"], e["dependee_task_id"]) for e in edges]
+    )
+
+    return {
+        "task_id": str(task_id),
+        "direction": direction,
+        "max_depth": max_depth,
+        "nodes": [dict(n) for n in nodes],
+        "edges": [dict(e) for e in edges],
+        "order": order,
+        "has_cycle": has_cycle,
+        "truncated": truncated,
+    }
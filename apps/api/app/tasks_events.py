@@ -1,39 +1,94 @@
 from __future__ import annotations
 
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_db
+from .pagination import cursor_params, encode_cursor
+from .responses import FastJSONResponse, raw_json
+from .task_stream import task_hub
 
 router = APIRouter()
 
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_REPLAY_LIMIT = 1000
+
+
+def _sse(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    out = f"id: {event_id}\n" if event_id else ""
+    out += f"event: {event}\n"
+    out += "data: " + json.dumps(jsonable_encoder(data), separators=(",", ":")) + "\n\n"
+    return out
+
 @router.get("/companies/{company_code}/tasks/{task_id}/events")
 async def list_task_events(
     company_code: str,
     task_id: UUID,
     limit: int = Query(200, ge=1, le=500),
+    cursor: str | None = Query(None, description="Opaque next_cursor from a previous page"),
     db: AsyncSession = Depends(get_db),
 ):
-    rows = (await db.execute(text("""
+    keyset = ""
+    if cursor:
+        keyset = """
+          AND (te.created_at, te.id) > (
+              CAST(:cursor_created_at AS timestamptz),
+              CAST(:cursor_id AS uuid)
+          )
+        """
+
+    # page JSON built by Postgres (json_agg), spliced into the response as-is
+    page = (await db.execute(text(f"""
+        WITH page AS (
+            SELECT
+                te.id,
+                te.created_at,
+                te.event_type,
+                te.actor_type,
+                te.payload,
+                row_number() OVER (ORDER BY te.created_at ASC, te.id ASC) AS rn
+            FROM task_events te
+            JOIN tasks t ON t.id = te.task_id
+            JOIN companies c ON c.id = t.company_id
+            WHERE c.code = :company_code
+              AND t.id = :task_id
+              {keyset}
+            ORDER BY te.created_at ASC, te.id ASC
+            LIMIT :limit
+        )
         SELECT
-            te.id,
-            te.created_at,
-            te.event_type,
-            te.actor_type,
-            te.payload
-        FROM task_events te
-        JOIN tasks t ON t.id = te.task_id
-        JOIN companies c ON c.id = t.company_id
-        WHERE c.code = :company_code
-          AND t.id = :task_id
-        ORDER BY te.created_at ASC
-        LIMIT :limit
-    """), {"company_code": company_code, "task_id": task_id, "limit": limit})).mappings().all()
+            COALESCE(
+                json_agg(json_build_object(
+                    'id', p.id,
+                    'created_at', p.created_at,
+                    'event_type', p.event_type,
+                    'actor_type', p.actor_type,
+                    'payload', p.payload
+                ) ORDER BY p.rn) FILTER (WHERE p.rn <= :page_size),
+                '[]'
+            )::text AS items,
+            count(*) AS fetched,
+            max(p.created_at) FILTER (WHERE p.rn = :page_size) AS last_created_at,
+            max(p.id::text) FILTER (WHERE p.rn = :page_size) AS last_id
+        FROM page p
+    """), {
+        "company_code": company_code,
+        "task_id": task_id,
+        "limit": limit + 1,
+        "page_size": limit,
+        **cursor_params(cursor),
+    })).mappings().one()
 
     # si aucun event, on veut savoir si la task existe vraiment
-    if not rows:
+    if not page["fetched"] and not cursor:
         exists = (await db.execute(text("""
             SELECT 1
             FROM tasks t
@@ -44,10 +99,108 @@ async def list_task_events(
         if not exists:
             raise HTTPException(status_code=404, detail="Task not found")
 
-    items = []
-    for r in rows:
-        d = dict(r)
-        d["id"] = str(d["id"])
-        items.append(d)
+    cursor_out = None
+    if page["fetched"] > limit:
+        cursor_out = encode_cursor(page["last_created_at"], page["last_id"])
+
+    return FastJSONResponse({"items": raw_json(page["items"], "[]"), "next_cursor": cursor_out})
+
+
+@router.get("/companies/{company_code}/tasks/{task_id}/events/stream")
+async def stream_task_events(
+    company_code: str,
+    task_id: UUID,
+    request: Request,
+    cursor: str | None = Query(None, description="Replay events after this cursor before going live"),
+    last_event_id: str | None = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Server-Sent Events stream of a task: `status` on connect and on every
+    transition, then one `event` per new task_events row. Event ids are
+    pagination cursors, so a reconnecting client (Last-Event-ID) gets the
+    rows it missed replayed from the DB first.
+    """
+    await task_hub.ensure_started()
+
+    # subscribe before reading the snapshot so nothing falls in between
+    sub = task_hub.subscribe(str(task_id))
+    try:
+        task = (await db.execute(text("""
+            SELECT t.id, t.status
+            FROM tasks t
+            JOIN companies c ON c.id=t.company_id
+            WHERE c.code=:company_code AND t.id=:task_id
+            LIMIT 1
+        """), {"company_code": company_code, "task_id": task_id})).mappings().first()
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+
+        backlog = []
+        resume = last_event_id or cursor
+        if resume:
+            backlog = (await db.execute(text("""
+                SELECT te.id, te.created_at, te.event_type, te.actor_type, te.payload
+                FROM task_events te
+                WHERE te.task_id = :task_id
+                  AND (te.created_at, te.id) > (
+                      CAST(:cursor_created_at AS timestamptz),
+                      CAST(:cursor_id AS uuid)
+                  )
+                ORDER BY te.created_at ASC, te.id ASC
+                LIMIT :limit
+            """), {"task_id": task_id, "limit": STREAM_REPLAY_LIMIT, **cursor_params(resume)})).mappings().all()
+    except BaseException:
+        task_hub.unsubscribe(sub)
+        raise
+
+    status = task["status"]
+    # the stream may live for hours: hand the pooled connection back now
+    await db.close()
+
+    async def stream():
+        replayed = {str(r["id"]) for r in backlog}
+        try:
+            yield _sse("status", {"task_id": str(task_id), "status": status})
+            for r in backlog:
+                yield _sse("event", {**dict(r), "id": str(r["id"])}, encode_cursor(r["created_at"], r["id"]))
+
+            while True:
+                if sub.overflowed:
+                    # client reconnects with Last-Event-ID and catches up from the DB
+                    yield _sse("resync", {"task_id": str(task_id)})
+                    return
+
+                try:
+                    kind, msg = await asyncio.wait_for(sub.queue.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+
+                if kind == "status":
+                    yield _sse("status", {"task_id": str(task_id), "status": msg.get("status")})
+                    continue
+
+                if msg["id"] in replayed:
+                    continue
+                yield _sse(
+                    "event",
+                    {
+                        "id": msg["id"],
+                        "created_at": msg["created_at"],
+                        "event_type": msg["event_type"],
+                        "actor_type": msg["actor_type"],
+                        "payload": msg.get("payload") or {},
+                    },
+                    encode_cursor(datetime.fromisoformat(msg["created_at"]), msg["id"]),
+                )
+        finally:
+            task_hub.unsubscribe(sub)
 
-    return {"items": items}
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
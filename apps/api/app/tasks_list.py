@@ -5,9 +5,15 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .db import get_db
+from .pagination import cursor_params, decode_change_cursor, encode_change_cursor, encode_cursor
+from .responses import FastJSONResponse, raw_json
+from .task_fields import LIST_DEFAULT_FIELDS, parse_fields, task_json_sql
 
 router = APIRouter()
 
+# change_seq <= cursor rows written by transactions still open at the last read
+CHANGES_RECHECK_MAX = 1000
+
 
 @router.get("/companies/{company_code}/projects/{project_code}/tasks")
 async def list_tasks(
@@ -15,8 +21,15 @@ async def list_tasks(
     project_code: str,
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0, le=100000),
+    cursor: str | None = Query(None, description="Opaque next_cursor from a previous page"),
+    fields: str | None = Query(
+        None,
+        description="Comma separated task fields or JSON keys (runtime_json.job_type), or 'all'",
+    ),
     db: AsyncSession = Depends(get_db),
 ):
+    task_json = task_json_sql(parse_fields(fields, LIST_DEFAULT_FIELDS))
+
     # company
     company = (
         await db.execute(
@@ -43,34 +56,168 @@ async def list_tasks(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    rows = (
+    # keyset pagination: cursor wins over offset (kept for older clients)
+    params = {
+        "company_id": company["id"],
+        "project_id": project["id"],
+        "limit": limit + 1,
+        "offset": 0 if cursor else offset,
+        **cursor_params(cursor),
+    }
+    keyset = ""
+    if cursor:
+        keyset = """
+                  AND (t.created_at, t.id) < (
+                      CAST(:cursor_created_at AS timestamptz),
+                      CAST(:cursor_id AS uuid)
+                  )
+        """
+
+    # Postgres builds the page JSON itself (json_agg): the bytes go straight
+    # to the response, no per-row decode / re-encode in Python
+    page = (
         await db.execute(
-            text("""
+            text(f"""
+                WITH page AS (
+                    -- numérotation après LIMIT/OFFSET: rn commence à 1 sur chaque page
+                    SELECT
+                        s.id, s.created_at, s.doc,
+                        row_number() OVER (ORDER BY s.created_at DESC, s.id DESC) AS rn
+                    FROM (
+                        SELECT t.id, t.created_at, {task_json} AS doc
+                        FROM tasks t
+                        WHERE t.company_id=:company_id
+                          AND t.project_id=:project_id
+                          {keyset}
+                        ORDER BY t.created_at DESC, t.id DESC
+                        LIMIT :limit
+                        OFFSET :offset
+                    ) s
+                )
                 SELECT
-                    t.id, t.title, t.status, t.priority,
-                    t.created_at, t.deadline_at,
-                    t.attempt_count, t.max_attempts,
-                    t.runtime_json, t.control_json
-                FROM tasks t
-                WHERE t.company_id=:company_id
-                  AND t.project_id=:project_id
-                ORDER BY t.created_at DESC, t.id DESC
-                LIMIT :limit
-                OFFSET :offset
+                    COALESCE(
+                        json_agg(p.doc ORDER BY p.rn) FILTER (WHERE p.rn <= :page_size),
+                        '[]'
+                    )::text AS items,
+                    count(*) AS fetched,
+                    max(p.created_at) FILTER (WHERE p.rn = :page_size) AS last_created_at,
+                    max(p.id::text) FILTER (WHERE p.rn = :page_size) AS last_id
+                FROM page p
             """),
-            {
-                "company_id": company["id"],
-                "project_id": project["id"],
-                "limit": limit,
-                "offset": offset,
-            },
+            {**params, "page_size": limit},
+        )
+    ).mappings().one()
+
+    cursor_out = None
+    if page["fetched"] > limit:
+        cursor_out = encode_cursor(page["last_created_at"], page["last_id"])
+
+    return FastJSONResponse({
+        "items": raw_json(page["items"], "[]"),
+        "limit": limit,
+        "offset": offset,
+        "next_cursor": cursor_out,
+    })
+
+
+@router.get("/companies/{company_code}/projects/{project_code}/tasks/changes")
+async def list_task_changes(
+    company_code: str,
+    project_code: str,
+    since: str | None = Query(None, description="next_cursor of the previous call; omit for a full sync"),
+    limit: int = Query(200, ge=1, le=1000),
+    fields: str | None = Query(
+        None,
+        description="Comma separated task fields or JSON keys (runtime_json.job_type), or 'all'",
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Tasks of a project created, modified or deleted since `since` (task_changes
+    feed, schema v9). Deleted tasks come back as tombstones (`deleted: true`,
+    `task: null`). Items may repeat across calls: clients upsert by id.
+
+    Sequence numbers are taken before commit, so a slow transaction can commit
+    a change_seq lower than one already returned. The cursor therefore also
+    carries the snapshot xmin of the read, and rows written by transactions
+    that were still open at that point are sent again on the next call.
+    """
+    task_json = task_json_sql(parse_fields(fields, LIST_DEFAULT_FIELDS))
+    seq, xmin = decode_change_cursor(since) if since else (0, None)
+
+    project = (await db.execute(text("""
+        SELECT p.id AS project_id, c.id AS company_id
+        FROM projects p
+        JOIN companies c ON c.id = p.company_id
+        WHERE c.code = :company_code AND p.code = :project_code
+        LIMIT 1
+    """), {"company_code": company_code, "project_code": project_code})).mappings().first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    recheck = ""
+    if xmin is not None:
+        recheck = """
+            UNION
+            SELECT tc.task_id, tc.change_seq, tc.deleted, NULL::bigint AS rn
+            FROM (
+                SELECT * FROM task_changes
+                WHERE company_id = :company_id
+                  AND project_id = :project_id
+                  AND change_seq <= :seq
+                  AND change_xid >= CAST(:xmin AS xid8)
+                LIMIT :recheck_max
+            ) tc
+        """
+
+    # une seule requête: snapshot xmin, page et JSON sont cohérents entre eux
+    page = (await db.execute(text(f"""
+        WITH fresh AS (
+            SELECT tc.task_id, tc.change_seq, tc.deleted,
+                   row_number() OVER (ORDER BY tc.change_seq) AS rn
+            FROM task_changes tc
+            WHERE tc.company_id = :company_id
+              AND tc.project_id = :project_id
+              AND tc.change_seq > :seq
+            ORDER BY tc.change_seq
+            LIMIT :limit
+        ),
+        ch AS (
+            SELECT * FROM fresh WHERE rn <= :page_size
+            {recheck}
         )
-    ).mappings().all()
+        SELECT
+            pg_snapshot_xmin(pg_current_snapshot())::text AS xmin,
+            (SELECT count(*) FROM fresh) AS fetched,
+            (SELECT max(change_seq) FROM fresh WHERE rn <= :page_size) AS last_seq,
+            COALESCE(
+                json_agg(json_build_object(
+                    'id', ch.task_id,
+                    'change_seq', ch.change_seq,
+                    'deleted', ch.deleted OR t.id IS NULL,
+                    'task', CASE WHEN t.id IS NOT NULL AND NOT ch.deleted THEN {task_json} END
+                ) ORDER BY ch.change_seq) FILTER (WHERE ch.task_id IS NOT NULL),
+                '[]'
+            )::text AS items
+        FROM ch
+        LEFT JOIN tasks t ON t.id = ch.task_id
+    """), {
+        "company_id": project["company_id"],
+        "project_id": project["project_id"],
+        "seq": seq,
+        "xmin": xmin,
+        "limit": limit + 1,
+        "page_size": limit,
+        "recheck_max": CHANGES_RECHECK_MAX,
+    })).mappings().one()
 
-    items = []
-    for r in rows:
-        d = dict(r)
-        d["id"] = str(d["id"])
-        items.append(d)
+    has_more = page["fetched"] > limit
+    last_seq = page["last_seq"] if page["last_seq"] is not None else seq
+    # tant qu'il reste des pages, on garde l'ancien xmin (recheck conservé)
+    next_xmin = (xmin if xmin is not None else page["xmin"]) if has_more else page["xmin"]
 
-    return {"items": items, "limit": limit, "offset": offset}
+    return FastJSONResponse({
+        "items": raw_json(page["items"], "[]"),
+        "has_more": has_more,
+        "next_cursor": encode_change_cursor(last_seq, next_xmin),
+    })
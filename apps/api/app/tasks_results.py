@@ -0,0 +1,142 @@
+"""
+Task result download.
+
+Callback results above CALLBACK_RESULT_INLINE_MAX_BYTES live in task_results
+(runtime_json.callback only keeps result_ref + result_summary); smaller ones
+stay inline. Both are served here with ETag (sha256), If-None-Match and a
+single `Range: bytes=` span. Offloaded bodies are streamed in chunks read
+with substring() (EXTERNAL storage: only the needed TOAST chunks are read).
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from hashlib import sha256
+from typing import AsyncIterator, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import AsyncSessionLocal, get_db
+
+router = APIRouter()
+
+RESULT_CHUNK_BYTES = 256 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(range_header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Single byte range -> (start, end inclusive). None: whole body."""
+    if not range_header:
+        return None
+    m = _RANGE.match(range_header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        # multi-range / autre unité: on sert le corps entier (RFC 9110)
+        return None
+
+    if not m.group(1):
+        # suffixe: les N derniers octets
+        length = int(m.group(2))
+        if length == 0:
+            raise HTTPException(status_code=416, detail="Range Not Satisfiable",
+                                headers={"Content-Range": f"bytes */{size}"})
+        return max(size - length, 0), size - 1
+
+    start = int(m.group(1))
+    end = int(m.group(2)) if m.group(2) else size - 1
+    if start >= size or end < start:
+        raise HTTPException(status_code=416, detail="Range Not Satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+async def _stream_body(result_id: str, start: int, end: int) -> AsyncIterator[bytes]:
+    # session propre: celle de la requête est fermée avant la fin du streaming
+    async with AsyncSessionLocal() as db:
+        offset = start
+        while offset <= end:
+            length = min(RESULT_CHUNK_BYTES, end - offset + 1)
+            chunk = (await db.execute(text("""
+                SELECT substring(body FROM :pos FOR :len) AS chunk
+                FROM task_results
+                WHERE id = :id
+            """), {"id": result_id, "pos": offset + 1, "len": length})).scalar()
+            if not chunk:
+                break
+            yield bytes(chunk)
+            offset += len(chunk)
+
+
+@router.get("/companies/{company_code}/tasks/{task_id}/result")
+async def get_task_result(
+    company_code: str,
+    task_id: UUID,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    row = (await db.execute(text("""
+        SELECT t.runtime_json->'callback' AS callback
+        FROM tasks t
+        JOIN companies c ON c.id = t.company_id
+        WHERE c.code = :company_code
+          AND t.id = :task_id
+        LIMIT 1
+    """), {"company_code": company_code, "task_id": task_id})).mappings().first()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    callback = row["callback"] or {}
+    ref = callback.get("result_ref")
+
+    if ref:
+        res = (await db.execute(text("""
+            SELECT id::text AS id, size_bytes, sha256, mime_type
+            FROM task_results
+            WHERE id = :id AND task_id = :task_id
+        """), {"id": ref.get("id"), "task_id": task_id})).mappings().first()
+        if not res:
+            raise HTTPException(status_code=404, detail="Result not found")
+        size, digest, mime_type = int(res["size_bytes"]), res["sha256"], res["mime_type"]
+        body = None
+    else:
+        if callback.get("result") is None:
+            raise HTTPException(status_code=404, detail="Result not found")
+        body = json.dumps(callback["result"], separators=(",", ":")).encode("utf-8")
+        size, digest, mime_type = len(body), sha256(body).hexdigest(), "application/json"
+
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, max-age=0"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    span = _parse_range(range_header, size) if size else None
+    start, end = span if span else (0, size - 1)
+    status_code = 200
+    if span:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+
+    if body is not None:
+        return Response(body[start:end + 1], status_code=status_code, media_type=mime_type, headers=headers)
+
+    return StreamingResponse(
+        _stream_body(res["id"], start, end),
+        status_code=status_code,
+        media_type=mime_type,
+        headers=headers,
+    )
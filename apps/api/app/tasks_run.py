@@ -1,18 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import json
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional
-from uuid import UUID
+from uuid import UUID, uuid4
 
-from celery.result import AsyncResult
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .celery_client import celery_app
+from .celery_client import fetch_job_state, run_options
 from .db import get_db
+from .responses import FastJSONResponse
+from .task_stream import task_hub
 
 router = APIRouter()
 
@@ -57,9 +59,15 @@ async def _load_task(
             t.id,
             t.company_id,
             t.status,
+            t.priority,
             (SELECT p.code FROM projects p WHERE p.id = t.project_id) AS project_code,
             t.attempt_count,
             t.max_attempts,
+            t.celery_task_id,
+            t.previous_celery_task_id,
+            t.started_at,
+            t.finished_at,
+            t.last_retry_at,
             t.runtime_json,
             t.control_json
         FROM tasks t
@@ -74,6 +82,32 @@ async def _load_task(
     return dict(row) if row else None
 
 
+async def _insert_outbox(
+    db: AsyncSession,
+    company_id: UUID,
+    task_id: UUID,
+    celery_task_id: str,
+    task_name: str,
+    args: list,
+    options: Optional[dict] = None,
+) -> None:
+    """Enqueue intent, published by the worker's outbox relay after commit."""
+    await db.execute(
+        text("""
+            INSERT INTO task_outbox (company_id, task_id, celery_task_id, task_name, args, options)
+            VALUES (:company_id, :task_id, :celery_task_id, :task_name, CAST(:args AS jsonb), CAST(:options AS jsonb))
+        """),
+        {
+            "company_id": company_id,
+            "task_id": task_id,
+            "celery_task_id": celery_task_id,
+            "task_name": task_name,
+            "args": json.dumps(args),
+            "options": json.dumps(options or {}),
+        },
+    )
+
+
 # ----------------------------
 # Models (React-friendly)
 # ----------------------------
@@ -121,8 +155,9 @@ async def run_task(
     db: AsyncSession = Depends(get_db),
 ):
     now_iso = _now_iso()
+    celery_id = str(uuid4())
 
-    # Phase A: DB prepare (lock + validate + store job spec, queued, attempt_count++)
+    # One transaction: lock + validate + job spec + enqueue intent (outbox)
     async with db.begin():
         row = await _load_task(db, company_code, task_id, lock=True)
         if not row:
@@ -146,15 +181,17 @@ async def run_task(
                 last_error = NULL,
                 status = 'queued',
                 attempt_count = t.attempt_count + 1,
+                previous_celery_task_id = t.celery_task_id,
+                celery_task_id = :celery_id,
+                celery_task_name = :celery_task_name,
+                started_at = NULL,
+                finished_at = NULL,
+                last_retry_at = NULL,
                 runtime_json = (
                     COALESCE(t.runtime_json,'{}'::jsonb)
-                    - 'celery_task_id'
-                    - 'previous_celery_task_id'
-                    - 'last_retry_at'
                     || jsonb_build_object(
                         'job_type', to_jsonb(CAST(:job_type AS text)),
                         'job_payload', CAST(:job_payload AS jsonb),
-                        'celery_task_name', to_jsonb(CAST(:celery_task_name AS text)),
                         'celery_args', jsonb_build_array(
                             to_jsonb(CAST(:company_code AS text)),
                             to_jsonb(CAST(:task_id AS text))
@@ -171,6 +208,7 @@ async def run_task(
         """), {
             "company_code": company_code,
             "task_id": task_id,
+            "celery_id": celery_id,
             "job_type": body.job_type,
             "job_payload": json.dumps(body.payload),
             "celery_task_name": "fm.run_task",
@@ -179,62 +217,17 @@ async def run_task(
         if not updated:
             raise HTTPException(status_code=409, detail="Run refused (max_attempts reached)")
 
-        await _insert_task_event(
-            db,
-            row["company_id"],
-            task_id,
-            "run_requested",
-            {"job_type": body.job_type, "job_payload": body.payload, "ts": now_iso},
+        await _insert_outbox(
+            db, row["company_id"], task_id, celery_id, "fm.run_task", [company_code, str(task_id)],
+            run_options(body.job_type, row["priority"]),
         )
 
-    # Phase B: enqueue (outside transaction)
-    try:
-        async_result = celery_app.send_task("fm.run_task", args=[company_code, str(task_id)], kwargs={})
-    except Exception as e:
-        # reflect enqueue failure
-        async with db.begin():
-            row2 = await _load_task(db, company_code, task_id, lock=True)
-            if row2:
-                await db.execute(text("""
-                    UPDATE tasks t
-                    SET status='failed',
-                        last_error=:err
-                    FROM companies c
-                    WHERE c.id=t.company_id AND c.code=:company_code AND t.id=:task_id
-                """), {"company_code": company_code, "task_id": task_id, "err": str(e)})
-
-                await _insert_task_event(
-                    db,
-                    row2["company_id"],
-                    task_id,
-                    "run_enqueue_failed",
-                    {"error": str(e), "ts": _now_iso()},
-                )
-        raise HTTPException(status_code=500, detail=f"Celery enqueue failed: {e}")
-
-    # Phase C: store celery_task_id
-    async with db.begin():
-        row3 = await _load_task(db, company_code, task_id, lock=True)
-        if not row3:
-            raise HTTPException(status_code=404, detail="Task not found (after enqueue)")
-
-        await db.execute(text("""
-            UPDATE tasks t
-            SET runtime_json = COALESCE(t.runtime_json,'{}'::jsonb)
-                || jsonb_build_object(
-                    'previous_celery_task_id', runtime_json->>'celery_task_id',
-                    'celery_task_id', to_jsonb(CAST(:celery_id AS text))
-                )
-            FROM companies c
-            WHERE c.id=t.company_id AND c.code=:company_code AND t.id=:task_id
-        """), {"company_code": company_code, "task_id": task_id, "celery_id": async_result.id})
-
         await _insert_task_event(
             db,
-            row3["company_id"],
+            row["company_id"],
             task_id,
-            "run_enqueued",
-            {"celery_task_id": async_result.id, "ts": _now_iso()},
+            "run_requested",
+            {"job_type": body.job_type, "job_payload": body.payload, "celery_task_id": celery_id, "ts": now_iso},
         )
 
     return RunOut(
@@ -248,7 +241,7 @@ async def run_task(
             project_code=row["project_code"],
         ),
         job=JobSnapshot(
-            celery_task_id=async_result.id,
+            celery_task_id=celery_id,
             celery_task_name="fm.run_task",
         ),
     )
@@ -262,8 +255,9 @@ async def retry_task(
     db: AsyncSession = Depends(get_db),
 ):
     now_iso = _now_iso()
+    celery_id = str(uuid4())
 
-    # Phase A: lock + validate + mark queued + attempt_count++
+    # One transaction: lock + validate + queued + attempt_count++ + enqueue intent (outbox)
     async with db.begin():
         row = await _load_task(db, company_code, task_id, lock=True)
         if not row:
@@ -280,17 +274,11 @@ async def retry_task(
 
         runtime = row["runtime_json"] or {}
         job_type = runtime.get("job_type")
-        job_payload = runtime.get("job_payload") or {}
-        if isinstance(job_payload, str):
-            try:
-                job_payload = json.loads(job_payload)
-            except Exception:
-                job_payload = {}
 
         if not job_type:
             raise HTTPException(status_code=409, detail="Missing job spec in runtime_json (expected job_type)")
 
-        previous_celery_id = runtime.get("celery_task_id")
+        previous_celery_id = row["celery_task_id"]
 
         updated = (await db.execute(text("""
             UPDATE tasks t
@@ -300,11 +288,11 @@ async def retry_task(
                 last_error = NULL,
                 status = 'queued',
                 attempt_count = t.attempt_count + 1,
-                runtime_json = COALESCE(t.runtime_json,'{}'::jsonb)
-                  || jsonb_build_object(
-                        'previous_celery_task_id', to_jsonb(CAST(:prev_celery_id AS text)),
-                        'last_retry_at', to_jsonb(CAST(:now_iso AS text))
-                     )
+                previous_celery_task_id = t.celery_task_id,
+                celery_task_id = :celery_id,
+                started_at = NULL,
+                finished_at = NULL,
+                last_retry_at = CAST(:now_iso AS timestamptz)
             FROM companies c
             WHERE c.id=t.company_id
               AND c.code=:company_code
@@ -314,65 +302,29 @@ async def retry_task(
         """), {
             "company_code": company_code,
             "task_id": task_id,
-            "prev_celery_id": previous_celery_id or "",
+            "celery_id": celery_id,
             "now_iso": now_iso,
         })).mappings().first()
 
         if not updated:
             raise HTTPException(status_code=409, detail="Retry refused (max_attempts reached)")
 
-        await _insert_task_event(
-            db,
-            row["company_id"],
-            task_id,
-            "retry_requested",
-            {"previous_celery_task_id": previous_celery_id, "job_type": job_type, "ts": now_iso},
+        await _insert_outbox(
+            db, row["company_id"], task_id, celery_id, "fm.run_task", [company_code, str(task_id)],
+            run_options(job_type, row["priority"]),
         )
 
-    # Phase B: enqueue
-    try:
-        async_result = celery_app.send_task("fm.run_task", args=[company_code, str(task_id)], kwargs={})
-    except Exception as e:
-        async with db.begin():
-            row2 = await _load_task(db, company_code, task_id, lock=True)
-            if row2:
-                await db.execute(text("""
-                    UPDATE tasks t
-                    SET status='failed',
-                        last_error=:err
-                    FROM companies c
-                    WHERE c.id=t.company_id AND c.code=:company_code AND t.id=:task_id
-                """), {"company_code": company_code, "task_id": task_id, "err": str(e)})
-
-                await _insert_task_event(
-                    db,
-                    row2["company_id"],
-                    task_id,
-                    "retry_enqueue_failed",
-                    {"error": str(e), "ts": _now_iso()},
-                )
-        raise HTTPException(status_code=500, detail=f"Celery enqueue failed: {e}")
-
-    # Phase C: store new celery_task_id
-    async with db.begin():
-        row3 = await _load_task(db, company_code, task_id, lock=True)
-        if not row3:
-            raise HTTPException(status_code=404, detail="Task not found (after enqueue)")
-
-        await db.execute(text("""
-            UPDATE tasks t
-            SET runtime_json = COALESCE(t.runtime_json,'{}'::jsonb)
-                || jsonb_build_object('celery_task_id', to_jsonb(CAST(:celery_id AS text)))
-            FROM companies c
-            WHERE c.id=t.company_id AND c.code=:company_code AND t.id=:task_id
-        """), {"company_code": company_code, "task_id": task_id, "celery_id": async_result.id})
-
         await _insert_task_event(
             db,
-            row3["company_id"],
+            row["company_id"],
             task_id,
-            "retry_enqueued",
-            {"celery_task_id": async_result.id, "ts": _now_iso()},
+            "retry_requested",
+            {
+                "previous_celery_task_id": previous_celery_id,
+                "celery_task_id": celery_id,
+                "job_type": job_type,
+                "ts": now_iso,
+            },
         )
 
     return RunOut(
@@ -388,31 +340,109 @@ async def retry_task(
             last_retry_at=now_iso,
         ),
         job=JobSnapshot(
-            celery_task_id=async_result.id,
+            celery_task_id=celery_id,
             celery_task_name="fm.run_task",
         ),
     )
 
 
+TERMINAL_STATUSES = ("done", "failed", "canceled")
+# tasks.status -> Celery-like job state (status endpoints, Postgres first)
+JOB_STATES = {
+    "queued": "PENDING",
+    "running": "STARTED",
+    "paused": "STARTED",
+    "blocked": "PENDING",
+    "done": "SUCCESS",
+    "failed": "FAILURE",
+    "canceled": "REVOKED",
+}
+STATUS_WAIT_MAX = 60
+# a waiter re-checks its subscription at least this often (LISTEN reconnects)
+STATUS_WAIT_SLICE = 5.0
+
+
+def _job_state(row: dict) -> Optional[str]:
+    # une tâche en pause qui n'a jamais démarré n'a pas de job en cours
+    if row["status"] == "paused" and not row.get("started_at"):
+        return "PENDING"
+    return JOB_STATES.get(row["status"])
+
+
+async def _wait_terminal(db: AsyncSession, company_code: str, task_id: UUID, wait: int) -> Optional[dict]:
+    """
+    Long-poll: returns the task row once it is terminal or after `wait` seconds.
+    Woken by the shared LISTEN hub (fm_task_status); a waiter holds no DB
+    connection, only a small in-memory queue.
+    """
+    await task_hub.ensure_started()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+
+    # subscribe before reading so a transition in between is not lost
+    sub = task_hub.subscribe(str(task_id))
+    try:
+        row = await _load_task(db, company_code, task_id, lock=False)
+        await db.close()
+
+        while row and row["status"] not in TERMINAL_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            if sub.overflowed:
+                # notifications may have been missed: resubscribe and re-read
+                task_hub.unsubscribe(sub)
+                sub = task_hub.subscribe(str(task_id))
+                row = await _load_task(db, company_code, task_id, lock=False)
+                await db.close()
+                continue
+
+            try:
+                kind, msg = await asyncio.wait_for(sub.queue.get(), min(remaining, STATUS_WAIT_SLICE))
+            except asyncio.TimeoutError:
+                continue
+
+            if kind == "status" and msg.get("status") in TERMINAL_STATUSES:
+                row = await _load_task(db, company_code, task_id, lock=False)
+                await db.close()
+
+        return row
+    finally:
+        task_hub.unsubscribe(sub)
+
+
 @router.get("/companies/{company_code}/tasks/{task_id}/status")
-async def task_status(company_code: str, task_id: UUID, db: AsyncSession = Depends(get_db)):
-    row = await _load_task(db, company_code, task_id, lock=False)
+async def task_status(
+    company_code: str,
+    task_id: UUID,
+    include_job: bool = Query(False, description="Also read the job result from the Celery backend (terminal tasks)"),
+    wait: int = Query(0, ge=0, le=STATUS_WAIT_MAX, description="Hold up to N seconds until the task is terminal"),
+    db: AsyncSession = Depends(get_db),
+):
+    # la source de vérité est tasks.status (écrit par le worker / callback)
+    if wait:
+        row = await _wait_terminal(db, company_code, task_id, wait)
+    else:
+        row = await _load_task(db, company_code, task_id, lock=False)
     if not row:
         raise HTTPException(status_code=404, detail="Task not found")
 
     runtime = row.get("runtime_json") or {}
-    celery_task_id = runtime.get("celery_task_id")
-
-    job: dict[str, Any] = {"celery_task_id": celery_task_id, "celery_state": None}
-    if celery_task_id:
-        r = AsyncResult(str(celery_task_id), app=celery_app)
-        job["celery_state"] = r.state
-        if r.successful():
-            job["result"] = r.result
-        elif r.failed():
-            job["error"] = str(r.result)
-
-    return {
+    celery_task_id = row.get("celery_task_id")
+
+    # état du job déduit de Postgres; le result backend (TTL court, pas de
+    # STARTED) n'est lu que pour le résultat d'un job terminé
+    job: dict[str, Any] = {
+        "celery_task_id": celery_task_id,
+        "celery_state": _job_state(row) if celery_task_id else None,
+    }
+    if include_job and celery_task_id and row["status"] in TERMINAL_STATUSES:
+        state = await fetch_job_state(str(celery_task_id))
+        job["backend_state"] = state.pop("state")
+        job.update(state)
+
+    return FastJSONResponse({
         "company_code": company_code,
         "task_id": str(task_id),
         "task": {
@@ -422,8 +452,50 @@ async def task_status(company_code: str, task_id: UUID, db: AsyncSession = Depen
             "project_code": row["project_code"],
             "attempt_count": int(row["attempt_count"]),
             "max_attempts": int(row["max_attempts"]),
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "last_retry_at": row["last_retry_at"],
             "runtime_json": runtime,
             "control_json": row.get("control_json") or {},
         },
+        "terminal": row["status"] in TERMINAL_STATUSES,
         "job": job,
-    }
+    })
+
+
+class BatchStatusIn(BaseModel):
+    task_ids: list[UUID] = Field(..., min_length=1, max_length=500)
+
+
+@router.post("/companies/{company_code}/tasks:batchStatus")
+async def batch_task_status(company_code: str, body: BatchStatusIn, db: AsyncSession = Depends(get_db)):
+    """Status of up to 500 tasks in one query (board views). DB only."""
+    rows = (await db.execute(text("""
+        SELECT
+            t.id,
+            t.status,
+            p.code AS project_code,
+            t.attempt_count,
+            t.max_attempts,
+            t.last_error,
+            t.last_heartbeat_at,
+            t.updated_at,
+            t.celery_task_id,
+            t.started_at,
+            t.finished_at,
+            t.control_json
+        FROM tasks t
+        JOIN companies c ON c.id = t.company_id
+        LEFT JOIN projects p ON p.id = t.project_id
+        WHERE c.code = :company_code
+          AND t.id = ANY(CAST(:task_ids AS uuid[]))
+    """), {"company_code": company_code, "task_ids": body.task_ids})).mappings().all()
+
+    items = [{**dict(r), "id": str(r["id"])} for r in rows]
+    found = {it["id"] for it in items}
+
+    return FastJSONResponse({
+        "company_code": company_code,
+        "items": items,
+        "not_found": [str(t) for t in dict.fromkeys(body.task_ids) if str(t) not in found],
+    })
@@ -0,0 +1,100 @@
+"""
+Admin list endpoints must cost a fixed number of queries per page, whatever
+the page size (batch loaders, no per-row relation query).
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+
+from app.admin_blueprints import list_blueprints
+from app.admin_companies import list_companies
+from app.admin_users import list_admin_users
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def company_row(total: int) -> dict:
+    return {
+        "id": uuid4(), "code": "acme", "name": "Acme", "legal_name": None, "tagline": None,
+        "description_short": None, "website_url": None, "country_code": "FR", "siret": None,
+        "locale": "fr-FR", "timezone": "Europe/Paris", "currency": "EUR", "is_active": True,
+        "created_at": NOW, "updated_at": NOW, "_total": total,
+    }
+
+
+def user_row(total: int) -> dict:
+    return {
+        "id": uuid4(), "email": "a@example.com", "first_name": "A", "last_name": "B",
+        "role": "admin", "organization": None, "valid_until": None, "is_active": True,
+        "created_at": NOW, "updated_at": NOW, "_total": total,
+    }
+
+
+def blueprint_row(total: int) -> dict:
+    return {
+        "id": uuid4(), "code": "ceo", "role": {"fr": "PDG"}, "level": "N",
+        "default_first_name": "A", "default_last_name": "B", "default_bio": {},
+        "default_portrait_id": None, "portrait_uri": None, "portrait_derivatives": None,
+        "skills": [], "system_prompt": {}, "webhooks": {}, "is_active": True,
+        "created_at": NOW, "updated_at": NOW, "_total": total,
+    }
+
+
+def page_handler(make_row, n: int):
+    page = [make_row(n) for _ in range(n)]
+
+    def handler(sql: str, params: dict) -> list[dict]:
+        if "ANY(CAST(:ids AS uuid[]))" in sql:
+            # one related row per id of the page
+            return [{"_key": k, "id": str(uuid4()), "code": "rel"} for k in params["ids"]]
+        return page
+
+    return handler
+
+
+LIST_CASES = [
+    # endpoint, row factory, expected queries (page + one per relation)
+    pytest.param(list_companies, company_row, 2, {"search": None}, id="companies"),
+    pytest.param(list_admin_users, user_row, 2, {"search": None}, id="admin_users"),
+    pytest.param(
+        list_blueprints, blueprint_row, 3,
+        {"search": None, "level": None, "is_active": None, "_user": {}},
+        id="blueprints",
+    ),
+]
+
+
+@pytest.mark.parametrize("endpoint, make_row, expected, extra", LIST_CASES)
+@pytest.mark.parametrize("rows", [1, 100])
+def test_list_query_count_is_constant(fake_db, endpoint, make_row, expected, extra, rows):
+    db = fake_db(page_handler(make_row, rows))
+    kwargs = {"page": 1, "page_size": 100, "count": "exact", "db": db, **extra}
+    if "_user" not in extra:
+        kwargs["_"] = {}
+
+    result = asyncio.run(endpoint(**kwargs))
+
+    assert len(result.items) == rows
+    assert result.total == rows
+    assert len(db.statements) == expected
+
+
+def test_blueprint_list_keeps_original_portrait(fake_db):
+    row = blueprint_row(1)
+    row.update(
+        portrait_uri="portraits/ceo.png",
+        portrait_derivatives={"128": {"webp": "portraits/ceo-128.webp"}},
+    )
+    db = fake_db(lambda sql, params: [] if "ANY(CAST(:ids AS uuid[]))" in sql else [row])
+
+    result = asyncio.run(list_blueprints(
+        page=1, page_size=100, count="exact", db=db,
+        search=None, level=None, is_active=None, _user={},
+    ))
+
+    item = result.items[0]
+    assert item.default_portrait_uri == "portraits/ceo.png"
+    assert item.default_portrait_thumbnail_uri == "portraits/ceo-128.webp"
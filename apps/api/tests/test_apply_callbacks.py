@@ -0,0 +1,68 @@
+import sys
+
+import psycopg
+import pytest
+
+from conftest import WORKER_DIR
+
+sys.path.insert(0, WORKER_DIR)
+
+from worker import tasks as worker_tasks  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.conn.statements += 1
+        if self.conn.down:
+            raise psycopg.OperationalError("server closed the connection")
+        if "bad" in params["task_ids"]:
+            raise psycopg.errors.InvalidTextRepresentation("invalid input syntax for type uuid")
+        self.rows = [(t, s) for t, s in zip(params["task_ids"], params["statuses"])]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConn:
+    def __init__(self, down=False):
+        self.down = down
+        self.statements = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def item(task_id):
+    return {"task_id": task_id, "status": "done", "result": None, "error": None, "ts": "2026-01-01T00:00:00+00:00"}
+
+
+def test_bad_item_is_dead_lettered_others_applied():
+    dead = []
+    applied = worker_tasks._apply_or_split(
+        FakeConn(), [item("a"), item("bad"), item("b")], lambda it, err: dead.append((it["task_id"], err)),
+    )
+    assert applied == 2
+    assert [t for t, _ in dead] == ["bad"]
+
+
+def test_connection_error_is_not_dead_lettered():
+    dead = []
+    with pytest.raises(psycopg.OperationalError):
+        worker_tasks._apply_or_split(FakeConn(down=True), [item("a"), item("b")], lambda it, err: dead.append(it))
+    assert dead == []
@@ -0,0 +1,85 @@
+import hmac
+import json
+import time
+from hashlib import sha256
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import tasks_callback
+from app.db import get_db
+from app.main import app
+
+SECRET = "s3cret"
+TASK_ID = str(uuid4())
+URL = f"/companies/acme/tasks/{TASK_ID}/callback"
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data: dict[str, str] = {}
+        self.queue: list[str] = []
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def lpush(self, key, *values):
+        self.queue.extend(values)
+
+
+def task_row(sql: str, params: dict) -> list[dict]:
+    return [{
+        "id": TASK_ID, "company_id": uuid4(), "status": "running", "integration_id": uuid4(),
+        "secrets_ref": "ref", "secret_json": {"callback_secret": SECRET},
+    }]
+
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(tasks_callback, "get_redis", lambda: redis)
+    # mode async: la réponse d'origine est un 202
+    monkeypatch.setattr(tasks_callback.settings, "CALLBACK_APPLY_MODE", "async")
+    app.dependency_overrides[get_db] = lambda: fake_db(task_row)
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+
+
+def post(client, secret: str = SECRET, key: str = "delivery-1"):
+    raw = json.dumps({"status": "done", "result": {"ok": True}}).encode()
+    ts = str(int(time.time()))
+    signature = hmac.new(secret.encode(), f"{ts}.".encode() + raw, sha256).hexdigest()
+    return client.post(URL, content=raw, headers={
+        "Content-Type": "application/json",
+        "X-FM-Timestamp": ts,
+        "X-FM-Signature": signature,
+        "Idempotency-Key": key,
+    })
+
+
+def test_replay_keeps_original_status(client):
+    first = post(client)
+    assert first.status_code == 202
+
+    replay = post(client)
+    assert replay.status_code == 202
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first.json()
+
+
+def test_replay_requires_valid_signature(client):
+    assert post(client).status_code == 202
+
+    forged = post(client, secret="wrong")
+    assert forged.status_code == 401
+    assert "Idempotent-Replayed" not in forged.headers
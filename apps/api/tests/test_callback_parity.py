@@ -0,0 +1,47 @@
+"""
+The worker (fm.apply_callbacks) applies buffered callbacks with its own copy
+of the API statement and document builder (separate images, no shared
+package): both copies must stay identical.
+"""
+
+import re
+import sys
+
+from conftest import WORKER_DIR
+
+sys.path.insert(0, WORKER_DIR)
+
+from app import tasks_callback  # noqa: E402
+from worker import tasks as worker_tasks  # noqa: E402
+
+
+def _normalize(sql: str) -> str:
+    # :name (SQLAlchemy) and %(name)s (psycopg) are the same placeholder
+    sql = re.sub(r"%\((\w+)\)s", r":\1", sql)
+    return " ".join(sql.split())
+
+
+def test_apply_statement_is_identical():
+    assert _normalize(worker_tasks.APPLY_CALLBACKS_SQL) == _normalize(tasks_callback.APPLY_CALLBACKS_SQL)
+
+
+def _strip_ids(prepared):
+    callbacks, offload = prepared
+    docs = []
+    for doc in map(__import__("json").loads, callbacks):
+        if "result_ref" in doc:
+            doc["result_ref"].pop("id")
+        docs.append(doc)
+    return docs, {k: v for k, v in offload.items() if k != "ids"}
+
+
+def test_prepare_callbacks_is_identical():
+    items = [
+        {"task_id": "t1", "status": "done", "result": {"a": 1}, "error": None, "ts": "2026-01-01T00:00:00+00:00"},
+        {"task_id": "t2", "status": "done", "result": {"blob": "x" * 200}, "error": None, "ts": "2026-01-01T00:00:00+00:00"},
+        {"task_id": "t3", "status": "failed", "result": None, "error": "boom", "ts": "2026-01-01T00:00:00+00:00"},
+    ]
+    api = _strip_ids(tasks_callback._prepare_callbacks(items, 64))
+    worker = _strip_ids(worker_tasks._prepare_callbacks(items, 64))
+    assert api == worker
+    assert api[1]["task_ids"] == ["t2"]
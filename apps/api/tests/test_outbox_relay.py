@@ -0,0 +1,105 @@
+import contextlib
+import sys
+from types import SimpleNamespace
+
+from conftest import WORKER_DIR
+
+sys.path.insert(0, WORKER_DIR)
+
+from worker import outbox_relay  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.conn.statements.append((" ".join(sql.split()), params))
+
+    def fetchall(self):
+        return self.conn.rows
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def transaction(self):
+        return contextlib.nullcontext()
+
+    def cursor(self, row_factory=None):
+        return FakeCursor(self)
+
+
+class FakeCelery:
+    """The broker goes down on the `fail_at`-th publish."""
+
+    def __init__(self, fail_at):
+        self.fail_at = fail_at
+        self.calls = []
+        self.producer = SimpleNamespace(connection=SimpleNamespace(connection_errors=(ConnectionError,)))
+
+    @contextlib.contextmanager
+    def producer_or_acquire(self):
+        yield self.producer
+
+    def send_task(self, name, **kwargs):
+        self.calls.append(kwargs)
+        if len(self.calls) == self.fail_at:
+            raise ConnectionError("Connection refused")
+
+
+def outbox_rows(n):
+    return [
+        {"id": i, "celery_task_id": f"c{i}", "task_name": "fm.run_task",
+         "args": [], "kwargs": {}, "options": {"queue": "fm.default"}}
+        for i in range(1, n + 1)
+    ]
+
+
+def test_connection_error_stops_batch_and_backs_off_the_rest(monkeypatch):
+    celery = FakeCelery(fail_at=2)
+    monkeypatch.setattr(outbox_relay, "celery_app", celery)
+    conn = FakeConn(outbox_rows(5))
+
+    assert outbox_relay.relay_once(conn) == 5
+
+    # no publish attempted after the broker error, no retry inside kombu
+    assert len(celery.calls) == 2
+    assert all(c["retry"] is False for c in celery.calls)
+
+    deleted, backoff = conn.statements[1:]
+    assert deleted[0].startswith("DELETE FROM task_outbox") and deleted[1] == ([1],)
+    assert backoff[0].startswith("UPDATE task_outbox")
+    _, failed_ids, errors = backoff[1]
+    assert failed_ids == [2, 3, 4, 5]
+    assert all("Connection refused" in e for e in errors)
+
+
+def test_dispatch_routes_with_celery_app_mapping():
+    from worker import tasks as worker_tasks
+    from worker.celery_app import broker_priority, queue_for
+
+    picked = [
+        {"id": "t1", "company_id": "c", "company_code": "acme", "celery_task_id": "x1",
+         "job_type": "n8n_webhook", "priority": "urgent"},
+        {"id": "t2", "company_id": "c", "company_code": "acme", "celery_task_id": "x2",
+         "job_type": "unknown", "priority": "low"},
+    ]
+    conn = FakeConn(picked)
+    conn.commit = lambda: None
+
+    assert worker_tasks.dispatch_queued(conn, 10) == 2
+
+    insert_sql, params = conn.statements[1]
+    assert insert_sql.startswith("INSERT INTO task_outbox")
+    assert [o.obj for o in params[4]] == [
+        {"queue": queue_for(p["job_type"]), "priority": broker_priority(p["priority"])} for p in picked
+    ]
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+import pytest
+
+from app import publisher as publisher_module
+from app.publisher import Message, Publisher, PublishError
+
+
+class FakeCelery:
+    """send_task blocks until `release` is set; records what was published."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.sent: list[str] = []
+        self.options: list[dict] = []
+        self.fail_on: str | None = None
+        self.producer_pool = self
+
+    def acquire(self, block=True):
+        return self
+
+    def send_task(self, name, **kwargs):
+        self.started.set()
+        self.release.wait(5)
+        if name == self.fail_on:
+            raise ConnectionError("broker gone")
+        self.options.append(kwargs)
+        self.sent.append(name)
+
+
+@pytest.fixture
+def celery(monkeypatch):
+    fake = FakeCelery()
+    monkeypatch.setattr(publisher_module, "celery_app", fake)
+    return fake
+
+
+async def _wait_started(celery: FakeCelery) -> None:
+    while not celery.started.is_set():
+        await asyncio.sleep(0.01)
+
+
+def test_timed_out_job_is_never_published_late(celery):
+    async def scenario():
+        p = Publisher(max_in_flight=2, timeout=0.2)
+        first = asyncio.create_task(p.send_task("fm.a"))
+        await _wait_started(celery)
+
+        # queued behind the stuck publish: times out and must be dropped
+        with pytest.raises(asyncio.TimeoutError):
+            await p.send_task("fm.b")
+
+        celery.release.set()
+        # already running when its timeout hit: awaited to the end
+        assert await first
+        await p.close()
+
+    asyncio.run(scenario())
+    assert celery.sent == ["fm.a"]
+
+
+def test_in_flight_slot_held_until_thread_finishes(celery):
+    async def scenario():
+        p = Publisher(max_in_flight=1, timeout=0.2)
+        first = asyncio.create_task(p.send_task("fm.a"))
+        await _wait_started(celery)
+
+        # the only slot is still used by the thread: no second job is submitted
+        with pytest.raises(asyncio.TimeoutError):
+            await p.send_task("fm.b")
+
+        celery.release.set()
+        await first
+        await p.send_task("fm.c")
+        await p.close()
+
+    asyncio.run(scenario())
+    assert celery.sent == ["fm.a", "fm.c"]
+
+
+def test_partial_batch_reports_published_ids(celery):
+    celery.release.set()
+    celery.fail_on = "fm.c"
+    messages = [Message("fm.a"), Message("fm.b"), Message("fm.c"), Message("fm.d")]
+
+    async def scenario():
+        p = Publisher()
+        with pytest.raises(PublishError) as exc:
+            await p.send_many(messages)
+        await p.close()
+        return exc.value
+
+    err = asyncio.run(scenario())
+    assert err.published == [messages[0].task_id, messages[1].task_id]
+    assert celery.sent == ["fm.a", "fm.b"]
+    # bounded kombu retries on every publish
+    assert all(o["retry"] and o["retry_policy"]["max_retries"] == 2 for o in celery.options)
@@ -0,0 +1,15 @@
+import uuid
+from decimal import Decimal
+
+from asyncpg.pgproto import pgproto
+
+from app.responses import dumps
+
+
+def test_dumps_asyncpg_uuid():
+    value = str(uuid.uuid4())
+    assert dumps({"id": pgproto.UUID(value)}) == f'{{"id":"{value}"}}'.encode()
+
+
+def test_dumps_decimal():
+    assert dumps({"cost": Decimal("1.5")}) == b'{"cost":1.5}'
@@ -0,0 +1,23 @@
+import pytest
+
+from app.security import CALLBACK_PATHS
+
+TASK_ID = "0b5e3c1e-6a8f-4c4e-9a51-2f1d8f0e7c3a"
+
+
+@pytest.mark.parametrize("path", [
+    f"/companies/acme/tasks/{TASK_ID}/callback",
+    "/companies/acme/tasks:batchCallback",
+])
+def test_callback_routes_skip_jwt(path):
+    assert any(p.match(path) for p in CALLBACK_PATHS)
+
+
+@pytest.mark.parametrize("path", [
+    "/admin/webhooks/callback",
+    f"/companies/acme/projects/p/tasks/{TASK_ID}/callback",
+    f"/companies/acme/tasks/{TASK_ID}/callback/extra",
+    "/companies/acme/x/tasks:batchCallback",
+])
+def test_other_callback_like_paths_need_jwt(path):
+    assert not any(p.match(path) for p in CALLBACK_PATHS)
@@ -0,0 +1,53 @@
+import asyncio
+from uuid import uuid4
+
+import orjson
+
+from app.tasks_list import list_task_changes
+
+PROJECT = {"project_id": uuid4(), "company_id": uuid4()}
+
+
+def changes_handler(pages: list[dict]):
+    pages = iter(pages)
+
+    def handler(sql: str, params: dict) -> list[dict]:
+        if "FROM projects p" in sql:
+            return [PROJECT]
+        return [next(pages)]
+
+    return handler
+
+
+def call(db, since=None):
+    resp = asyncio.run(list_task_changes(
+        company_code="acme", project_code="board", since=since, limit=200, fields=None, db=db,
+    ))
+    return orjson.loads(resp.body)
+
+
+def test_consecutive_calls_resume_from_cursor(fake_db):
+    task_id = str(uuid4())
+    db = fake_db(changes_handler([
+        # full sync
+        {"xmin": "7001", "fetched": 1, "last_seq": 42,
+         "items": f'[{{"id":"{task_id}","change_seq":42,"deleted":false,"task":{{}}}}]'},
+        # follow-up: nothing new
+        {"xmin": "7005", "fetched": 0, "last_seq": None, "items": "[]"},
+    ]))
+
+    first = call(db)
+    assert [i["id"] for i in first["items"]] == [task_id]
+
+    second = call(db, since=first["next_cursor"])
+    assert second["items"] == []
+
+    params = db.statements[-1][1]
+    assert params["seq"] == 42
+    # asyncpg encodes xid8 from integers only
+    assert params["xmin"] == 7001 and isinstance(params["xmin"], int)
+
+    # the third call starts from the newer snapshot
+    db.handler = changes_handler([{"xmin": "7005", "fetched": 0, "last_seq": None, "items": "[]"}])
+    call(db, since=second["next_cursor"])
+    assert db.statements[-1][1]["xmin"] == 7005
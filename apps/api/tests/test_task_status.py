@@ -0,0 +1,13 @@
+from datetime import datetime, timezone
+
+from app.tasks_run import _job_state
+
+
+def test_job_not_started_is_pending():
+    assert _job_state({"status": "blocked", "started_at": None}) == "PENDING"
+    assert _job_state({"status": "paused", "started_at": None}) == "PENDING"
+
+
+def test_paused_after_start_is_started():
+    started = datetime.now(timezone.utc)
+    assert _job_state({"status": "paused", "started_at": started}) == "STARTED"
@@ -303,7 +303,7 @@ export default function BlueprintsPage() {
                                         <TableCell>
                                             {bp.default_portrait_uri ? (
                                                 <img
-                                                    src={getPortraitUrl(bp.default_portrait_uri)!}
+                                                    src={getPortraitUrl(bp.default_portrait_thumbnail_uri ?? bp.default_portrait_uri)!}
                                                     alt=""
                                                     className="w-10 h-10 rounded-full object-cover"
                                                 />
@@ -304,6 +304,9 @@ export interface Task {
     max_attempts: number;
     created_at: string;
     updated_at: string;
+    celery_task_id?: string | null;
+    started_at?: string | null;
+    finished_at?: string | null;
     runtime_json?: Record<string, unknown>;
     metadata?: Record<string, unknown>;
 }
@@ -413,6 +416,7 @@ export interface Blueprint {
     default_bio: LocalizedText;
     default_portrait_id: string | null;
     default_portrait_uri: string | null;
+    default_portrait_thumbnail_uri: string | null;
     skills: string[];
     system_prompt: LocalizedText;
     webhooks: Webhooks;
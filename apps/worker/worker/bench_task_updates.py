@@ -0,0 +1,170 @@
+"""
+Lifecycle UPDATE benchmark: runtime_json patch vs typed columns (schema v12).
+
+Builds two scratch copies of public.tasks (LIKE ... INCLUDING ALL: same
+columns, indexes and constraints, plus the same row and statement triggers:
+status NOTIFY, updated_at touch, task_changes feed, dependency release),
+runs the same stream of "set celery_task_id / started_at / finished_at"
+updates on both and reports throughput, HOT ratio and table / TOAST size.
+The two copies only differ by where the lifecycle fields are written and
+by fillfactor.
+
+    python -m worker.bench_task_updates --rows 20000 --updates 50000
+
+Scratch tables (_bench_tasks_jsonb, _bench_tasks_cols) are dropped and
+their task_changes rows deleted at the end. Do not run against a loaded
+production primary.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import time
+import uuid
+
+import psycopg
+
+from .db import _sync_dsn
+
+# avant: champs de cycle de vie dans runtime_json, fillfactor 100
+# après: colonnes typées (schema v12), fillfactor 90
+FILLFACTOR = {"jsonb": 100, "cols": 90}
+
+UPDATES = {
+    "jsonb": """
+        UPDATE _bench_tasks_jsonb t
+        SET runtime_json = COALESCE(t.runtime_json,'{}'::jsonb)
+            || jsonb_build_object(
+                'previous_celery_task_id', t.runtime_json->>'celery_task_id',
+                'celery_task_id', to_jsonb(CAST(%(celery_id)s AS text)),
+                'started_at', to_jsonb(CAST(%(ts)s AS text)),
+                'finished_at', to_jsonb(CAST(%(ts)s AS text))
+            )
+        WHERE t.id = %(id)s
+    """,
+    "cols": """
+        UPDATE _bench_tasks_cols t
+        SET previous_celery_task_id = t.celery_task_id,
+            celery_task_id = %(celery_id)s,
+            started_at = %(ts)s,
+            finished_at = %(ts)s
+        WHERE t.id = %(id)s
+    """,
+}
+
+
+def _copy_triggers(cur: psycopg.Cursor, table: str) -> list[str]:
+    """Attach the public.tasks triggers to the scratch table; returns their names."""
+    cur.execute(
+        """
+        SELECT t.tgname, pg_get_triggerdef(t.oid)
+        FROM pg_trigger t
+        WHERE t.tgrelid = 'public.tasks'::regclass
+          AND NOT t.tgisinternal
+        ORDER BY t.tgname
+        """
+    )
+    names = []
+    for name, ddl in cur.fetchall():
+        cur.execute(re.sub(r" ON (public\.)?tasks ", f" ON {table} ", ddl, count=1))
+        names.append(name)
+    return names
+
+
+def _populate(cur: psycopg.Cursor, name: str, ids: list[str], payload_bytes: int) -> list[str]:
+    table = f"_bench_tasks_{name}"
+    cur.execute(f"DROP TABLE IF EXISTS {table}")
+    cur.execute(
+        f"CREATE TABLE {table} (LIKE public.tasks INCLUDING ALL) WITH (fillfactor = {FILLFACTOR[name]})"
+    )
+    triggers = _copy_triggers(cur, table)
+    cur.execute(
+        f"""
+        INSERT INTO {table} (id, company_id, title, status, runtime_json)
+        SELECT x, %s, 'bench', 'queued',
+               jsonb_build_object(
+                   'job_type', 'n8n_webhook',
+                   'job_payload', jsonb_build_object('text', repeat('x', %s))
+               )
+        FROM unnest(%s::uuid[]) AS x
+        """,
+        (str(uuid.uuid4()), payload_bytes, ids),
+    )
+    cur.execute(f"VACUUM ANALYZE {table}")
+    return triggers
+
+
+def _stats(cur: psycopg.Cursor, name: str) -> dict:
+    try:
+        cur.execute("SELECT pg_stat_force_next_flush()")  # PG 15+
+    except psycopg.Error:
+        time.sleep(1)
+    cur.execute(
+        """
+        SELECT s.n_tup_upd, s.n_tup_hot_upd,
+               pg_relation_size(c.oid) AS heap_bytes,
+               COALESCE(pg_relation_size(NULLIF(c.reltoastrelid, 0)), 0) AS toast_bytes,
+               pg_indexes_size(c.oid) AS index_bytes
+        FROM pg_class c
+        JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE c.relname = %s
+        """,
+        (f"_bench_tasks_{name}",),
+    )
+    upd, hot, heap, toast, idx = cur.fetchone()
+    return {"updates": upd, "hot": hot, "heap": heap, "toast": toast, "index": idx}
+
+
+def run(rows: int, updates: int, payload_bytes: int, batch: int) -> None:
+    ids = [str(uuid.uuid4()) for _ in range(rows)]
+    stream = [random.choice(ids) for _ in range(updates)]
+
+    with psycopg.connect(_sync_dsn(), autocommit=True) as conn:
+        with conn.cursor() as cur:
+            try:
+                for name in FILLFACTOR:
+                    triggers = _populate(cur, name, ids, payload_bytes)
+                    print(f"{name:>6}: triggers {', '.join(triggers) or '(none)'}")
+                    before = _stats(cur, name)
+
+                    started = time.perf_counter()
+                    for i in range(0, len(stream), batch):
+                        ts = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+                        with conn.transaction():
+                            cur.executemany(UPDATES[name], [
+                                {"id": tid, "celery_id": str(uuid.uuid4()), "ts": ts}
+                                for tid in stream[i:i + batch]
+                            ])
+                    elapsed = time.perf_counter() - started
+
+                    after = _stats(cur, name)
+                    n_upd = after["updates"] - before["updates"]
+                    n_hot = after["hot"] - before["hot"]
+                    print(
+                        f"{name:>6}: {updates / elapsed:9.0f} upd/s"
+                        f" | HOT {n_hot}/{n_upd} ({100.0 * n_hot / max(n_upd, 1):5.1f}%)"
+                        f" | heap {before['heap'] // 1024} -> {after['heap'] // 1024} KiB"
+                        f" | toast {before['toast'] // 1024} -> {after['toast'] // 1024} KiB"
+                        f" | index {before['index'] // 1024} -> {after['index'] // 1024} KiB"
+                    )
+            finally:
+                for name in FILLFACTOR:
+                    cur.execute(f"DROP TABLE IF EXISTS _bench_tasks_{name}")
+                # rows written by the copied task_changes trigger
+                cur.execute("DELETE FROM task_changes WHERE task_id = ANY(%s::uuid[])", (ids,))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--updates", type=int, default=50_000)
+    parser.add_argument("--payload-bytes", type=int, default=1_500, help="size of runtime_json.job_payload")
+    parser.add_argument("--batch", type=int, default=100, help="updates per transaction")
+    args = parser.parse_args()
+    run(args.rows, args.updates, args.payload_bytes, args.batch)
+
+
+if __name__ == "__main__":
+    main()
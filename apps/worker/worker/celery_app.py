@@ -1,8 +1,43 @@
 from celery import Celery
+from kombu import Queue
+import json
 import os
 
 REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379/0")
 
+# ----------------------------
+# Queue topology
+# ----------------------------
+# fm.scheduler: voie réservée (scheduler_tick, apply_callbacks), jamais
+# derrière un flood de runs ou de previews.
+QUEUE_DEFAULT = "fm.default"
+QUEUE_SCHEDULER = "fm.scheduler"
+QUEUE_PREVIEWS = "fm.previews"
+QUEUE_LONG = "fm.long"
+QUEUE_WEBHOOKS = "fm.webhooks"
+
+# job_type -> queue for fm.run_task; FM_JOB_TYPE_QUEUES (JSON) overrides/extends
+JOB_TYPE_QUEUES = {
+    "long_demo": QUEUE_LONG,
+    "webhook": QUEUE_WEBHOOKS,
+    "n8n_webhook": QUEUE_WEBHOOKS,
+    "langflow_webhook": QUEUE_WEBHOOKS,
+}
+JOB_TYPE_QUEUES.update(json.loads(os.environ.get("FM_JOB_TYPE_QUEUES") or "{}"))
+
+# tasks.priority -> broker priority (Redis transport: 0 = highest)
+PRIORITY_LEVELS = {"urgent": 0, "high": 3, "normal": 5, "low": 8}
+DEFAULT_PRIORITY = PRIORITY_LEVELS["normal"]
+
+
+def queue_for(job_type: str | None) -> str:
+    return JOB_TYPE_QUEUES.get(job_type or "", QUEUE_DEFAULT)
+
+
+def broker_priority(priority: str | None) -> int:
+    return PRIORITY_LEVELS.get(priority or "normal", DEFAULT_PRIORITY)
+
+
 celery_app = Celery(
     "fluidmanager_worker",
     broker=REDIS_URL,
@@ -14,7 +49,16 @@ celery_app.conf.beat_schedule = {
         "task": "fm.scheduler_tick",
         "schedule": 3.0,
         "args": (25,),
-    }
+        # a tick older than the next one is useless
+        "options": {"queue": QUEUE_SCHEDULER, "expires": 3.0},
+    },
+    # callbacks acquittés par l'API en mode CALLBACK_APPLY_MODE=async
+    "apply-callbacks-every-1s": {
+        "task": "fm.apply_callbacks",
+        "schedule": 1.0,
+        "args": (500,),
+        "options": {"queue": QUEUE_SCHEDULER, "expires": 5.0},
+    },
 }
 
 celery_app.conf.update(
@@ -23,8 +67,40 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="Europe/Paris",
     enable_utc=True,
-    task_track_started=True,
+    # Result backend: la vérité est dans Postgres (tasks.status, artifacts.metadata).
+    # Pas d'état STARTED, résultats gardés 1 h; les tâches périodiques /
+    # fire-and-forget n'écrivent rien (ignore_result, voir worker.tasks).
+    task_track_started=False,
+    result_expires=3600,
     broker_connection_retry_on_startup=True,
+    # routing (fm.run_task is routed per message: queue + priority from the outbox row)
+    task_queues=[
+        Queue(QUEUE_DEFAULT),
+        Queue(QUEUE_SCHEDULER),
+        Queue(QUEUE_PREVIEWS),
+        Queue(QUEUE_LONG),
+        Queue(QUEUE_WEBHOOKS),
+    ],
+    task_default_queue=QUEUE_DEFAULT,
+    task_routes={
+        "fm.scheduler_tick": {"queue": QUEUE_SCHEDULER},
+        "fm.apply_callbacks": {"queue": QUEUE_SCHEDULER},
+        "fm.publish_preview_zip": {"queue": QUEUE_PREVIEWS},
+        "fm.echo": {"queue": QUEUE_DEFAULT},
+    },
+    task_default_priority=DEFAULT_PRIORITY,
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+        # > plus long job acks_late (long_demo, webhooks): sinon redélivré
+        "visibility_timeout": 3600,
+    },
+    # acks_late is per task (idempotent ones only, see worker.tasks); prefetch
+    # is set per pool (--prefetch-multiplier in docker-compose)
+    task_acks_late=False,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
 )
 
 # IMPORTANT: register tasks
@@ -0,0 +1,162 @@
+"""
+Outbox relay: publishes task_outbox rows to the Celery broker.
+
+    python -m worker.outbox_relay
+
+Pending rows are claimed in batches with FOR UPDATE SKIP LOCKED (several
+relays can run side by side), published with their pre-generated task id,
+then deleted in the same transaction. A crash between publish and commit
+re-publishes the same ids; fm.run_task drops the duplicate.
+Publishes do not retry inside kombu (retry=False): the outbox backoff is the
+retry policy. A broker connection error stops the batch; the rows not
+published yet get the same backoff.
+Woken by NOTIFY fm_outbox, with a polling fallback.
+
+The relay also LISTENs on fm_task_dispatch (schema v10: waiters released when
+their dependencies finish) and enqueues those tasks right away through
+dispatch_queued(), instead of waiting for the next scheduler tick.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+
+import psycopg
+from kombu.exceptions import OperationalError as BrokerOperationalError
+from psycopg.rows import dict_row
+
+from .celery_app import celery_app
+from .db import _sync_dsn
+from .tasks import dispatch_queued
+
+OUTBOX_BATCH = 200
+OUTBOX_POLL_SECONDS = 2.0
+OUTBOX_MAX_BACKOFF_SECONDS = 300
+
+OUTBOX_CHANNEL = "fm_outbox"
+DISPATCH_CHANNEL = "fm_task_dispatch"
+
+
+def _as_obj(value, default):
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def relay_once(conn: psycopg.Connection, batch: int = OUTBOX_BATCH) -> int:
+    """Publish one batch. Returns the number of rows claimed."""
+    with conn.transaction():
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT id, celery_task_id, task_name, args, kwargs, options
+                FROM task_outbox
+                WHERE available_at <= now()
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (batch,),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                return 0
+
+            sent: list[int] = []
+            failed_ids: list[int] = []
+            failed_errors: list[str] = []
+            with celery_app.producer_or_acquire() as producer:
+                connection_errors = (BrokerOperationalError,) + producer.connection.connection_errors
+                for i, r in enumerate(rows):
+                    try:
+                        celery_app.send_task(
+                            r["task_name"],
+                            args=_as_obj(r["args"], []),
+                            kwargs=_as_obj(r["kwargs"], {}),
+                            task_id=r["celery_task_id"],
+                            producer=producer,
+                            **{**_as_obj(r["options"], {}), "retry": False},
+                        )
+                        sent.append(r["id"])
+                    except connection_errors as e:
+                        # broker down: the rest of the batch would fail the same way
+                        rest = rows[i:]
+                        failed_ids.extend(x["id"] for x in rest)
+                        failed_errors.extend([f"broker unavailable: {e}"] * len(rest))
+                        break
+                    except Exception as e:
+                        failed_ids.append(r["id"])
+                        failed_errors.append(str(e))
+
+            if sent:
+                cur.execute("DELETE FROM task_outbox WHERE id = ANY(%s)", (sent,))
+            if failed_ids:
+                # backoff exponentiel, le message reste dans l'outbox
+                cur.execute(
+                    """
+                    UPDATE task_outbox o
+                    SET attempts = o.attempts + 1,
+                        last_error = x.error,
+                        available_at = now() + make_interval(
+                            secs => LEAST(power(2, o.attempts + 1), %s)
+                        )
+                    FROM unnest(%s::bigint[], %s::text[]) AS x(id, error)
+                    WHERE o.id = x.id
+                    """,
+                    (OUTBOX_MAX_BACKOFF_SECONDS, failed_ids, failed_errors),
+                )
+                print(f"--- [Relay] {len(failed_ids)} publish failure(s): {failed_errors[0]} ---")
+
+    return len(rows)
+
+
+def wait_notifies(listen_conn: psycopg.Connection, poll: float) -> list[str]:
+    """Block until a NOTIFY (or poll); returns the released task ids received."""
+    released: list[str] = []
+    notifies = list(listen_conn.notifies(timeout=poll, stop_after=1))
+    if notifies:
+        # une rafale de releases: on vide la file sans attendre
+        notifies += list(listen_conn.notifies(timeout=0))
+    for n in notifies:
+        if n.channel == DISPATCH_CHANNEL:
+            try:
+                released.append(json.loads(n.payload)["task_id"])
+            except (ValueError, KeyError):
+                pass
+    return released
+
+
+def run_forever(batch: int = OUTBOX_BATCH, poll: float = OUTBOX_POLL_SECONDS) -> None:
+    dsn = _sync_dsn()
+    while True:
+        try:
+            with psycopg.connect(dsn) as conn, psycopg.connect(dsn, autocommit=True) as listen_conn:
+                listen_conn.execute(f"LISTEN {OUTBOX_CHANNEL}")
+                listen_conn.execute(f"LISTEN {DISPATCH_CHANNEL}")
+                print(f"--- [Relay] listening on {OUTBOX_CHANNEL}, {DISPATCH_CHANNEL} ---")
+                while True:
+                    try:
+                        if relay_once(conn, batch) >= batch:
+                            continue  # backlog: next batch right away
+                        # attente d'un NOTIFY (ou du prochain poll pour les retries différés)
+                        released = wait_notifies(listen_conn, poll)
+                        if released:
+                            # outbox rows written here are relayed on the next loop
+                            dispatch_queued(conn, len(released), task_ids=released)
+                    except psycopg.OperationalError:
+                        raise
+                    except psycopg.Error as e:
+                        # erreur SQL (pas de connexion): on annule et on continue
+                        conn.rollback()
+                        print(f"--- [Relay] database error: {e} ---")
+                        time.sleep(poll)
+        except psycopg.OperationalError as e:
+            print(f"--- [Relay] DB connection lost: {e}, reconnecting ---")
+            time.sleep(poll)
+
+
+if __name__ == "__main__":
+    run_forever()
@@ -6,4 +6,6 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     REDIS_URL: str
 
+    CALLBACK_RESULT_INLINE_MAX_BYTES: int = 16 * 1024  # same threshold as the API
+
 settings = Settings()
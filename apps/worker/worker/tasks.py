@@ -18,12 +18,12 @@ def _utc_iso() -> str:
 WEBHOOK_JOB_TYPES = {"webhook", "n8n_webhook", "langflow_webhook"}
 
 
-@celery_app.task(name="fm.echo")
+@celery_app.task(name="fm.echo", acks_late=True)
 def echo(message: str) -> dict:
     return {"echo": message}
 
 
-@celery_app.task(name="fm.publish_preview_zip", bind=True)
+@celery_app.task(name="fm.publish_preview_zip", bind=True, acks_late=True, ignore_result=True)
 def publish_preview_zip(self, zip_b64: str, bucket: str, prefix: str, artifact_id: str) -> dict:
     import base64
 
@@ -66,7 +66,8 @@ def publish_preview_zip(self, zip_b64: str, bucket: str, prefix: str, artifact_i
 # Generic runner
 # ----------------------------
 
-@celery_app.task(name="fm.run_task", bind=True)
+# early ack: a redelivered run message would be dropped by the claim anyway
+@celery_app.task(name="fm.run_task", bind=True, acks_late=False)
 def run_task(self, company_code: str, task_id: str) -> dict:
     """
     Generic runner:
@@ -94,6 +95,8 @@ def run_task(self, company_code: str, task_id: str) -> dict:
                         c.code AS company_code,
                         t.company_id::text,
                         t.integration_id::text AS integration_id,
+                        t.status,
+                        t.celery_task_id,
                         COALESCE(t.runtime_json,'{}'::jsonb) AS runtime_json
                     FROM tasks t
                     JOIN companies c ON c.id=t.company_id
@@ -105,6 +108,27 @@ def run_task(self, company_code: str, task_id: str) -> dict:
                 row = cur.fetchone()
                 return dict(row) if row else {}
 
+    def claim(started_at: str) -> bool:
+        """queued -> running, only for the message the task is waiting for."""
+        with psycopg.connect(dsn) as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE tasks t
+                    SET status = 'running',
+                        last_heartbeat_at = now(),
+                        started_at = %s::timestamptz
+                    WHERE t.id = %s::uuid
+                      AND t.celery_task_id = %s
+                      AND t.status = 'queued'
+                    RETURNING 1
+                    """,
+                    (started_at, task_id, self.request.id),
+                )
+                ok = cur.fetchone() is not None
+            conn.commit()
+        return ok
+
     def insert_event(company_id: str, event_type: str, payload: dict) -> None:
         try:
             with psycopg.connect(dsn) as conn:
@@ -126,7 +150,11 @@ def run_task(self, company_code: str, task_id: str) -> dict:
         last_error: Optional[str] = None,
     ) -> None:
         print(f"--- [Worker] Set status to {new_status} (error={last_error}) ---") # DEBUG
-        patch_runtime = patch_runtime or {}
+        patch_runtime = dict(patch_runtime or {})
+        # lifecycle fields are typed columns (schema v12); runtime_json is only
+        # rewritten when there is an actual payload patch
+        started_at = patch_runtime.pop("started_at", None)
+        finished_at = patch_runtime.pop("finished_at", None)
         with psycopg.connect(dsn) as conn:
             with conn.cursor() as cur:
                 cur.execute(
@@ -135,17 +163,22 @@ def run_task(self, company_code: str, task_id: str) -> dict:
                     SET status=%s,
                         last_heartbeat_at = now(),
                         last_error = COALESCE(%s, t.last_error),
-                        runtime_json = COALESCE(t.runtime_json,'{}'::jsonb)
-                          || %s::jsonb
-                          || jsonb_build_object('celery_task_id', to_jsonb(CAST(%s AS text)))
+                        celery_task_id = %s,
+                        started_at = COALESCE(%s::timestamptz, t.started_at),
+                        finished_at = COALESCE(%s::timestamptz, t.finished_at),
+                        runtime_json = CASE WHEN %s::jsonb = '{}'::jsonb THEN t.runtime_json
+                                            ELSE COALESCE(t.runtime_json,'{}'::jsonb) || %s::jsonb END
                     FROM companies c
                     WHERE c.id=t.company_id AND c.code=%s AND t.id=%s::uuid
                     """,
                     (
                         new_status,
                         last_error,
-                        psycopg.types.json.Json(patch_runtime),
                         self.request.id,
+                        started_at,
+                        finished_at,
+                        psycopg.types.json.Json(patch_runtime),
+                        psycopg.types.json.Json(patch_runtime),
                         company_code,
                         task_id,
                     ),
@@ -164,10 +197,18 @@ def run_task(self, company_code: str, task_id: str) -> dict:
 
         print(f"--- [Worker] Job Type: {job_type} ---") # DEBUG
 
+        # outbox delivery is at-least-once: a message whose id is no longer the
+        # task's celery_task_id (re-run since) or already claimed is dropped
+        if task.get("celery_task_id") != self.request.id:
+            print(f"--- [Worker] Stale message {self.request.id} for task {task_id}, skipped ---")
+            return {"ok": False, "state": "SKIPPED", "reason": "stale"}
+
         started_at = _utc_iso()
 
         # start
-        set_status("running", patch_runtime={"started_at": started_at, "job_type": job_type})
+        if not claim(started_at):
+            print(f"--- [Worker] Task {task_id} already claimed (status={task.get('status')}), skipped ---")
+            return {"ok": False, "state": "SKIPPED", "reason": "duplicate"}
         insert_event(task["company_id"], "task_started", {"ts": started_at, "job_type": job_type})
 
         if job_type == "long_demo":
@@ -383,119 +424,326 @@ def _handle_webhook_trigger(
 # Scheduler tick (Celery Beat)
 # ----------------------------
 
-@celery_app.task(name="fm.scheduler_tick")
-def scheduler_tick(limit: int = 10) -> dict:
+def dispatch_queued(conn, limit: int, task_ids: Optional[list[str]] = None) -> int:
     """
     Pick tasks that are eligible for automatic run:
       - status='queued'
       - runtime_json.job_type exists
-      - runtime_json.celery_task_id missing/empty  (avoid double enqueue)
+      - celery_task_id missing/empty  (avoid double enqueue)
       - not paused/canceled
-    Reserve rows using FOR UPDATE SKIP LOCKED.
+      - among task_ids when given (waiters released by schema v10)
+    Reserve rows using FOR UPDATE SKIP LOCKED, then write the enqueue intent
+to task_outbox in the same transaction (published by worker.outbox_relay),
+routed with celery_app.queue_for / broker_priority.
+    Commits; returns the number of tasks enqueued.
     """
-    import psycopg
     from psycopg.rows import dict_row
+    from psycopg.types.json import Jsonb
 
-    from .db import _sync_dsn
-
-    dsn = _sync_dsn()
-    picked: list[dict] = []
-    enqueued = 0
+    from .celery_app import broker_priority, queue_for
 
-    # Phase A: reserve tasks (set a temporary celery_task_id marker to avoid duplicates)
-    with psycopg.connect(dsn, row_factory=dict_row) as conn:
-        with conn.cursor() as cur:
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(
+            """
+            WITH candidates AS (
+                SELECT
+                    t.id,
+                    c.code AS company_code,
+                    gen_random_uuid()::text AS celery_task_id
+                FROM tasks t
+                JOIN companies c ON c.id = t.company_id
+                WHERE t.status = 'queued'
+                  AND COALESCE(t.runtime_json,'{}'::jsonb) ? 'job_type'
+                  AND COALESCE(t.celery_task_id,'') = ''
+                  AND COALESCE((t.control_json->>'pause')::boolean, false) = false
+                  AND COALESCE((t.control_json->>'cancel')::boolean, false) = false
+                  AND (%(task_ids)s::uuid[] IS NULL OR t.id = ANY(%(task_ids)s::uuid[]))
+                ORDER BY t.created_at ASC
+                LIMIT %(limit)s
+                FOR UPDATE OF t SKIP LOCKED
+            )
+            UPDATE tasks t
+            SET attempt_count = t.attempt_count + 1,
+                last_error = NULL,
+                celery_task_id = candidates.celery_task_id,
+                previous_celery_task_id = NULL,
+                celery_task_name = 'fm.run_task',
+                started_at = NULL,
+                finished_at = NULL,
+                last_retry_at = NULL,
+                runtime_json = COALESCE(t.runtime_json,'{}'::jsonb)
+                  || jsonb_build_object(
+                      'celery_args', jsonb_build_array(
+                          to_jsonb(CAST(candidates.company_code AS text)),
+                          to_jsonb(CAST(candidates.id::text AS text))
+                      ),
+                      'celery_kwargs', '{}'::jsonb
+                  )
+            FROM candidates
+            WHERE t.id = candidates.id
+            RETURNING t.id, t.company_id, candidates.company_code, candidates.celery_task_id,
+                      t.runtime_json->>'job_type' AS job_type, t.priority::text AS priority
+            """,
+            {"limit": limit, "task_ids": task_ids},
+        )
+        picked = cur.fetchall()
+        if picked:
             cur.execute(
                 """
-                WITH candidates AS (
-                    SELECT
-                        t.id,
-                        c.code AS company_code
-                    FROM tasks t
-                    JOIN companies c ON c.id = t.company_id
-                    WHERE t.status = 'queued'
-                      AND COALESCE(t.runtime_json,'{}'::jsonb) ? 'job_type'
-                      AND COALESCE(t.runtime_json->>'celery_task_id','') = ''
-                      AND COALESCE((t.control_json->>'pause')::boolean, false) = false
-                      AND COALESCE((t.control_json->>'cancel')::boolean, false) = false
-                    ORDER BY t.created_at ASC
-                    LIMIT %s
-                    FOR UPDATE SKIP LOCKED
-                )
-                UPDATE tasks t
-                SET attempt_count = t.attempt_count + 1,
-                    last_error = NULL,
-                    runtime_json = COALESCE(t.runtime_json,'{}'::jsonb)
-                      - 'celery_task_id'
-                      - 'previous_celery_task_id'
-                      - 'last_retry_at'
-                      || jsonb_build_object(
-                          'celery_task_id', to_jsonb(CAST('__PENDING__' AS text)),
-                          'celery_task_name', to_jsonb(CAST('fm.run_task' AS text)),
-                          'celery_args', jsonb_build_array(
-                              to_jsonb(CAST(candidates.company_code AS text)),
-                              to_jsonb(CAST(candidates.id::text AS text))
-                          ),
-                          'celery_kwargs', '{}'::jsonb
-                      )
-                FROM candidates
-                WHERE t.id = candidates.id
-                RETURNING t.id::text AS task_id, candidates.company_code
+                INSERT INTO task_outbox (company_id, task_id, celery_task_id, task_name, args, options)
+                SELECT x.company_id, x.task_id, x.celery_task_id, 'fm.run_task',
+                       jsonb_build_array(x.company_code, x.task_id::text), x.options
+                FROM unnest(%s::uuid[], %s::uuid[], %s::text[], %s::text[], %s::jsonb[])
+                     AS x(company_id, task_id, celery_task_id, company_code, options)
                 """,
-                (limit,),
+                (
+                    [p["company_id"] for p in picked],
+                    [p["id"] for p in picked],
+                    [p["celery_task_id"] for p in picked],
+                    [p["company_code"] for p in picked],
+                    [
+                        Jsonb({"queue": queue_for(p["job_type"]), "priority": broker_priority(p["priority"])})
+                        for p in picked
+                    ],
+                ),
             )
-            picked = [dict(r) for r in cur.fetchall()]
-        conn.commit()
+    conn.commit()
+    return len(picked)
 
-    # Phase B: enqueue + write real celery_task_id
-    if not picked:
-        return {"picked": 0, "enqueued": 0}
 
-    for it in picked:
-        company_code = it["company_code"]
-        task_id = it["task_id"]
-        try:
-            async_res = celery_app.send_task("fm.run_task", args=[company_code, task_id], kwargs={})
+@celery_app.task(name="fm.scheduler_tick", ignore_result=True)
+def scheduler_tick(limit: int = 10) -> dict:
+    """Polling fallback of the dispatcher: see dispatch_queued()."""
+    import psycopg
 
-            with psycopg.connect(dsn) as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
-                        UPDATE tasks t
-                        SET runtime_json = COALESCE(t.runtime_json,'{}'::jsonb)
-                            || jsonb_build_object(
-                                'previous_celery_task_id', runtime_json->>'celery_task_id',
-                                'celery_task_id', to_jsonb(CAST(%s AS text))
-                            )
-                        FROM companies c
-                        WHERE c.id=t.company_id
-                          AND c.code=%s
-                          AND t.id=%s::uuid
-                        """,
-                        (async_res.id, company_code, task_id),
-                    )
-                conn.commit()
+    from .db import _sync_dsn
 
-            enqueued += 1
+    with psycopg.connect(_sync_dsn()) as conn:
+        enqueued = dispatch_queued(conn, limit)
+
+    return {"picked": enqueued, "enqueued": enqueued}
+
+
+# ----------------------------
+# Buffered callbacks (API CALLBACK_APPLY_MODE=async)
+# ----------------------------
+
+CALLBACK_QUEUE_KEY = "fm:callbacks:pending"
+# callbacks that keep failing on their own (bad data): kept with the error
+CALLBACK_DEAD_KEY = "fm:callbacks:dead"
+CALLBACK_MAX_BATCHES_PER_RUN = 20
+RESULT_SUMMARY_MAX_KEYS = 50
+
+
+def _prepare_callbacks(items: list[dict], inline_max: int) -> tuple[list[str], dict[str, list]]:
+    """Same split as the API (tasks_callback._prepare_callbacks): results above inline_max go to task_results."""
+    import hashlib
+    import uuid
+
+    callbacks: list[str] = []
+    offload: dict[str, list] = {"ids": [], "task_ids": [], "sizes": [], "hashes": [], "bodies": []}
+    for it in items:
+        doc: dict[str, Any] = {
+            "status": it["status"],
+            "result": it.get("result"),
+            "error": it.get("error"),
+            "ts": it["ts"],
+        }
+        result = it.get("result")
+        if result is not None:
+            body = json.dumps(result, separators=(",", ":")).encode("utf-8")
+            if len(body) > inline_max:
+                result_id = str(uuid.uuid4())
+                digest = hashlib.sha256(body).hexdigest()
+                if isinstance(result, dict):
+                    keys = list(result.keys())
+                    summary = {
+                        "type": "object",
+                        "keys": keys[:RESULT_SUMMARY_MAX_KEYS],
+                        "keys_truncated": len(keys) > RESULT_SUMMARY_MAX_KEYS,
+                    }
+                else:
+                    summary = {"type": type(result).__name__}
+                doc["result"] = None
+                doc["result_ref"] = {
+                    "id": result_id,
+                    "size_bytes": len(body),
+                    "sha256": digest,
+                    "mime_type": "application/json",
+                }
+                doc["result_summary"] = summary
+                offload["ids"].append(result_id)
+                offload["task_ids"].append(it["task_id"])
+                offload["sizes"].append(len(body))
+                offload["hashes"].append(digest)
+                offload["bodies"].append(body)
+        callbacks.append(json.dumps(doc))
+    return callbacks, offload
+
+
+# Same statement as the API's tasks_callback.APPLY_CALLBACKS_SQL (psycopg
+# placeholders here): apps/api/tests/test_callback_parity.py keeps them identical.
+APPLY_CALLBACKS_SQL = """
+WITH cb AS (
+    SELECT *
+    FROM unnest(
+        CAST(%(task_ids)s AS uuid[]),
+        CAST(%(statuses)s AS text[]),
+        CAST(%(errors)s AS text[]),
+        CAST(%(callbacks)s AS text[]),
+        CAST(%(finished_ats)s AS text[])
+    ) AS x(task_id, status, error, callback, finished_at)
+),
+upd AS (
+    UPDATE tasks t
+    SET status = CAST(cb.status AS task_status),
+        last_error = CASE WHEN cb.status = 'failed' AND cb.error IS NOT NULL
+                          THEN cb.error ELSE t.last_error END,
+        finished_at = CAST(cb.finished_at AS timestamptz),
+        runtime_json = COALESCE(t.runtime_json,'{}'::jsonb)
+            || jsonb_build_object('callback', CAST(cb.callback AS jsonb))
+    FROM cb
+    WHERE t.id = cb.task_id
+      AND t.status NOT IN ('done', 'failed', 'canceled')
+    RETURNING t.id, t.company_id, cb.status, cb.error, cb.finished_at
+),
+res AS (
+    INSERT INTO task_results (id, company_id, task_id, size_bytes, sha256, body)
+    SELECT r.id, upd.company_id, upd.id, r.size_bytes, r.sha256, r.body
+    FROM unnest(
+        CAST(%(res_ids)s AS uuid[]),
+        CAST(%(res_task_ids)s AS uuid[]),
+        CAST(%(res_sizes)s AS bigint[]),
+        CAST(%(res_hashes)s AS text[]),
+        CAST(%(res_bodies)s AS bytea[])
+    ) AS r(id, task_id, size_bytes, sha256, body)
+    JOIN upd ON upd.id = r.task_id
+    RETURNING 1
+),
+ev AS (
+    INSERT INTO task_events (company_id, task_id, event_type, actor_type, payload)
+    SELECT company_id, id, 'callback_received', 'integration',
+           jsonb_build_object('status', status, 'ts', finished_at)
+    FROM upd
+    UNION ALL
+    SELECT company_id, id,
+           CASE WHEN status = 'done' THEN 'task_done' ELSE 'task_failed' END,
+           'system',
+           jsonb_build_object('ts', finished_at, 'error', error)
+    FROM upd
+    RETURNING 1
+)
+SELECT id::text AS task_id, status FROM upd
+"""
+
+
+def _apply_callback_batch(conn, items: list[dict]) -> int:
+    """UPDATE + events, set-based, in one transaction. Returns the tasks updated."""
+    from .settings import settings
+
+    callbacks, offload = _prepare_callbacks(items, settings.CALLBACK_RESULT_INLINE_MAX_BYTES)
+    with conn.cursor() as cur:
+        cur.execute(
+            APPLY_CALLBACKS_SQL,
+            {
+                "task_ids": [it["task_id"] for it in items],
+                "statuses": [it["status"] for it in items],
+                "errors": [it.get("error") for it in items],
+                "callbacks": callbacks,
+                "finished_ats": [it["ts"] for it in items],
+                "res_ids": offload["ids"],
+                "res_task_ids": offload["task_ids"],
+                "res_sizes": offload["sizes"],
+                "res_hashes": offload["hashes"],
+                "res_bodies": offload["bodies"],
+            },
+        )
+        applied = len(cur.fetchall())
+    conn.commit()
+    return applied
+
+
+def _apply_or_split(conn, items: list[dict], dead_letter: Callable[[dict, str], None]) -> int:
+    """
+    Whole batch first; if it fails on the data (not the connection), item by
+    item so one bad callback cannot hold back the others: those still failing
+    go to the dead-letter list. The API already answered, nobody will resend.
+    """
+    import psycopg
+
+    try:
+        return _apply_callback_batch(conn, items)
+    except psycopg.OperationalError:
+        raise
+    except Exception:
+        conn.rollback()
+        if len(items) == 1:
+            raise
 
+    applied = 0
+    for it in items:
+        try:
+            applied += _apply_callback_batch(conn, [it])
+        except psycopg.OperationalError:
+            raise
         except Exception as e:
-            # reflect enqueue failure: reset celery_task_id so it can be retried later
-            with psycopg.connect(dsn) as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
-                        UPDATE tasks t
-                        SET status='failed',
-                            last_error=%s,
-                            runtime_json = COALESCE(t.runtime_json,'{}'::jsonb)
-                              - 'celery_task_id'
-                        FROM companies c
-                        WHERE c.id=t.company_id
-                          AND c.code=%s
-                          AND t.id=%s::uuid
-                        """,
-                        (str(e), company_code, task_id),
-                    )
-                conn.commit()
+            conn.rollback()
+            dead_letter(it, str(e))
+    return applied
+
+
+@celery_app.task(name="fm.apply_callbacks", ignore_result=True)
+def apply_callbacks(batch_size: int = 500) -> dict:
+    """
+    Drain the callback buffer filled by the API: up to `batch_size` verified
+    callbacks per statement. A batch lost to a connection error is pushed
+    back; callbacks that fail on their data go to CALLBACK_DEAD_KEY.
+    """
+    import psycopg
+    import redis
 
-    return {"picked": len(picked), "enqueued": enqueued}
+    from .db import _sync_dsn
+    from .settings import settings
+
+    r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    received = 0
+    applied = 0
+    dead = 0
+
+    def dead_letter(item: dict, error: str) -> None:
+        nonlocal dead
+        dead += 1
+        r.rpush(CALLBACK_DEAD_KEY, json.dumps({"item": item, "error": error, "ts": _utc_iso()}))
+        print(f"--- [Callbacks] dead-lettered task {item.get('task_id')}: {error} ---")
+
+    with psycopg.connect(_sync_dsn()) as conn:
+        for _ in range(CALLBACK_MAX_BATCHES_PER_RUN):
+            # LPUSH côté API: les plus anciens sont en queue de liste
+            with r.pipeline(transaction=True) as pipe:
+                pipe.lrange(CALLBACK_QUEUE_KEY, -batch_size, -1)
+                pipe.ltrim(CALLBACK_QUEUE_KEY, 0, -batch_size - 1)
+                raw, _ = pipe.execute()
+            if not raw:
+                break
+
+            # oldest first; one callback per task (the first one wins, like inline)
+            items: dict[str, dict] = {}
+            for entry in reversed(raw):
+                it = json.loads(entry)
+                items.setdefault(it["task_id"], it)
+
+            try:
+                applied += _apply_or_split(conn, list(items.values()), dead_letter)
+            except psycopg.OperationalError:
+                r.rpush(CALLBACK_QUEUE_KEY, *raw)
+                raise
+            except Exception as e:
+                # lot d'un seul callback en échec
+                for it in items.values():
+                    dead_letter(it, str(e))
+            received += len(raw)
+
+            if len(raw) < batch_size:
+                break
+
+    return {"received": received, "applied": applied, "dead_lettered": dead}
@@ -0,0 +1,151 @@
+-- =============================================================================
+-- FluidManager Schema Migration v10: Set-based dependency release
+-- =============================================================================
+-- Replaces the row-by-row tasks_status_unblock / try_unblock_waiters pair.
+-- One statement-level trigger (transition tables) reacts to every UPDATE on
+-- tasks that moves rows to done / failed / canceled:
+--   - waiters (status blocked, blocked_reason waiting_dependencies or
+--     dependency_failed) whose dependees are all terminal go back to queued
+--     and are announced on fm_task_dispatch;
+--   - when a dependee failed or was canceled, the waiter policy
+--     control_json.on_dependency_failure applies:
+--       ignore (default) : treated like done, the waiter is released
+--       block            : the waiter stays blocked (dependency_failed)
+--       fail             : the waiter fails, which cascades to its own waiters
+-- Tasks blocked for another reason (waiting_callback) are never touched.
+-- Finishing a task with 1,000 waiters costs a few statements, whatever the
+-- fan-out.
+-- =============================================================================
+
+DROP TRIGGER IF EXISTS tasks_status_unblock ON public.tasks;
+DROP FUNCTION IF EXISTS public.trg_tasks_status_unblock();
+DROP FUNCTION IF EXISTS public.try_unblock_waiters(uuid);
+
+CREATE OR REPLACE FUNCTION public.tasks_release_waiters()
+RETURNS TRIGGER AS $$
+DECLARE
+    waiter_ids uuid[];
+    released_msgs jsonb;
+BEGIN
+    -- 1) waiters of the rows that just became terminal
+    SELECT array_agg(DISTINCT d.waiter_task_id)
+      INTO waiter_ids
+    FROM new_rows n
+    JOIN old_rows o ON o.id = n.id
+    JOIN public.task_dependencies d ON d.dependee_task_id = n.id
+    WHERE n.status IN ('done', 'failed', 'canceled')
+      AND o.status IS DISTINCT FROM n.status;
+
+    IF waiter_ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    -- 2) lock them: a concurrent transaction finishing another dependee of
+    --    the same waiter waits here, then sees our commit in step 3
+    PERFORM 1
+    FROM public.tasks w
+    WHERE w.id = ANY(waiter_ids)
+      AND w.status = 'blocked'
+    ORDER BY w.id
+    FOR UPDATE;
+
+    -- 3) decide and apply, set-based
+    WITH waiters AS (
+        SELECT w.id, w.company_id,
+               COALESCE(w.control_json->>'on_dependency_failure', 'ignore') AS policy
+        FROM public.tasks w
+        WHERE w.id = ANY(waiter_ids)
+          AND w.status = 'blocked'
+          AND COALESCE(w.runtime_json->>'blocked_reason', '')
+              IN ('', 'waiting_dependencies', 'dependency_failed')
+    ),
+    state AS (
+        SELECT wt.id, wt.company_id, wt.policy,
+               count(*) FILTER (WHERE t.status NOT IN ('done', 'failed', 'canceled')) AS pending,
+               array_agg(t.id) FILTER (WHERE t.status IN ('failed', 'canceled')) AS failed_deps
+        FROM waiters wt
+        JOIN public.task_dependencies d ON d.waiter_task_id = wt.id
+        JOIN public.tasks t ON t.id = d.dependee_task_id
+        GROUP BY wt.id, wt.company_id, wt.policy
+    ),
+    decided AS (
+        SELECT id, company_id, failed_deps,
+               CASE
+                   WHEN failed_deps IS NOT NULL AND policy = 'fail' THEN 'fail'
+                   WHEN failed_deps IS NOT NULL AND policy = 'block' THEN 'hold'
+                   WHEN pending = 0 THEN 'release'
+               END AS action
+        FROM state
+    ),
+    released AS (
+        UPDATE public.tasks t
+        SET status = 'queued',
+            runtime_json = COALESCE(t.runtime_json, '{}'::jsonb)
+                - 'blocked_reason' - 'failed_dependencies'
+        FROM decided x
+        WHERE x.id = t.id AND x.action = 'release'
+        RETURNING t.id, t.company_id
+    ),
+    failed AS (
+        UPDATE public.tasks t
+        SET status = 'failed',
+            last_error = 'Dependency failed: ' || x.failed_deps[1]::text,
+            runtime_json = (COALESCE(t.runtime_json, '{}'::jsonb) - 'blocked_reason')
+                || jsonb_build_object('failed_dependencies', to_jsonb(x.failed_deps))
+        FROM decided x
+        WHERE x.id = t.id AND x.action = 'fail'
+        RETURNING t.id, t.company_id, x.failed_deps
+    ),
+    held AS (
+        UPDATE public.tasks t
+        SET runtime_json = COALESCE(t.runtime_json, '{}'::jsonb)
+                || jsonb_build_object(
+                    'blocked_reason', 'dependency_failed',
+                    'failed_dependencies', to_jsonb(x.failed_deps)
+                )
+        FROM decided x
+        WHERE x.id = t.id AND x.action = 'hold'
+          AND t.runtime_json->'failed_dependencies' IS DISTINCT FROM to_jsonb(x.failed_deps)
+        RETURNING t.id, t.company_id, x.failed_deps
+    ),
+    events AS (
+        INSERT INTO public.task_events (company_id, task_id, event_type, actor_type, payload)
+        SELECT company_id, id, 'dependencies_released', 'system',
+               jsonb_build_object('ts', now())
+        FROM released
+        UNION ALL
+        SELECT company_id, id, 'dependency_failed', 'system',
+               jsonb_build_object('ts', now(), 'policy', 'fail', 'failed_dependencies', to_jsonb(failed_deps))
+        FROM failed
+        UNION ALL
+        SELECT company_id, id, 'dependency_failed', 'system',
+               jsonb_build_object('ts', now(), 'policy', 'block', 'failed_dependencies', to_jsonb(failed_deps))
+        FROM held
+        RETURNING 1
+    )
+    SELECT jsonb_agg(jsonb_build_object(
+               'task_id', r.id,
+               'company_id', r.company_id,
+               'reason', 'dependencies_released'
+           ))
+      INTO released_msgs
+    FROM released r;
+
+    -- 4) dispatcher wake-up (the scheduler tick still picks queued tasks on its own)
+    IF released_msgs IS NOT NULL THEN
+        PERFORM pg_notify('fm_task_dispatch', m::text)
+        FROM jsonb_array_elements(released_msgs) AS m;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_tasks_release_waiters ON public.tasks;
+CREATE TRIGGER trg_tasks_release_waiters
+    AFTER UPDATE ON public.tasks
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION public.tasks_release_waiters();
+
+GRANT EXECUTE ON FUNCTION public.tasks_release_waiters() TO fluidmanager;
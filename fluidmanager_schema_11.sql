@@ -0,0 +1,28 @@
+-- =============================================================================
+-- FluidManager Schema Migration v11: Offloaded task results
+-- =============================================================================
+-- Callback results above CALLBACK_RESULT_INLINE_MAX_BYTES are stored here
+-- instead of tasks.runtime_json.callback.result; the task only keeps a
+-- reference + a small summary. Read back by GET .../tasks/{id}/result.
+-- body uses EXTERNAL storage (no compression) so that substring() range
+-- reads only fetch the TOAST chunks they need.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS public.task_results (
+    id uuid PRIMARY KEY,
+    company_id uuid NOT NULL REFERENCES public.companies(id) ON DELETE CASCADE,
+    task_id uuid NOT NULL REFERENCES public.tasks(id) ON DELETE CASCADE,
+    mime_type text NOT NULL DEFAULT 'application/json',
+    size_bytes bigint NOT NULL,
+    sha256 text NOT NULL,
+    body bytea NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.task_results ALTER COLUMN body SET STORAGE EXTERNAL;
+
+CREATE INDEX IF NOT EXISTS idx_task_results_task
+    ON public.task_results (task_id, created_at DESC);
+
+ALTER TABLE public.task_results OWNER TO fluidmanager;
+GRANT ALL ON public.task_results TO fluidmanager;
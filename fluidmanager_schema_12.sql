@@ -0,0 +1,42 @@
+-- =============================================================================
+-- FluidManager Schema Migration v12: Typed task lifecycle columns
+-- =============================================================================
+-- celery_task_id, previous_celery_task_id, celery_task_name, started_at,
+-- finished_at and last_retry_at leave runtime_json for plain columns.
+-- Writing them no longer copies (and re-TOASTs) the whole runtime_json
+-- document; none of them is indexed, so with some free space on the page
+-- (fillfactor 90) these updates stay heap-only (HOT). runtime_json keeps the
+-- job spec and the user / integration payload.
+-- Note: status changes remain non-HOT (idx_tasks_status, idx_tasks_project).
+-- Bench: python -m worker.bench_task_updates
+-- =============================================================================
+
+ALTER TABLE public.tasks
+    ADD COLUMN IF NOT EXISTS celery_task_id text,
+    ADD COLUMN IF NOT EXISTS previous_celery_task_id text,
+    ADD COLUMN IF NOT EXISTS celery_task_name text,
+    ADD COLUMN IF NOT EXISTS started_at timestamp with time zone,
+    ADD COLUMN IF NOT EXISTS finished_at timestamp with time zone,
+    ADD COLUMN IF NOT EXISTS last_retry_at timestamp with time zone;
+
+-- Backfill from runtime_json, then drop the keys
+UPDATE public.tasks t
+SET celery_task_id = NULLIF(t.runtime_json->>'celery_task_id', ''),
+    previous_celery_task_id = NULLIF(t.runtime_json->>'previous_celery_task_id', ''),
+    celery_task_name = NULLIF(t.runtime_json->>'celery_task_name', ''),
+    started_at = CASE WHEN t.runtime_json->>'started_at' ~ '^\d{4}-\d{2}-\d{2}'
+                      THEN (t.runtime_json->>'started_at')::timestamptz END,
+    finished_at = CASE WHEN t.runtime_json->>'finished_at' ~ '^\d{4}-\d{2}-\d{2}'
+                       THEN (t.runtime_json->>'finished_at')::timestamptz END,
+    last_retry_at = CASE WHEN t.runtime_json->>'last_retry_at' ~ '^\d{4}-\d{2}-\d{2}'
+                         THEN (t.runtime_json->>'last_retry_at')::timestamptz END,
+    runtime_json = t.runtime_json
+        - 'celery_task_id' - 'previous_celery_task_id' - 'celery_task_name'
+        - 'started_at' - 'finished_at' - 'last_retry_at'
+WHERE t.runtime_json ?| ARRAY['celery_task_id', 'previous_celery_task_id', 'celery_task_name',
+                             'started_at', 'finished_at', 'last_retry_at'];
+
+-- Room for HOT updates. Only applies to newly written pages: run
+-- VACUUM FULL public.tasks (or pg_repack) in a maintenance window to
+-- rewrite the existing ones.
+ALTER TABLE public.tasks SET (fillfactor = 90);
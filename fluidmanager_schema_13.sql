@@ -0,0 +1,57 @@
+-- =============================================================================
+-- FluidManager Schema Migration v13: Celery enqueue outbox
+-- =============================================================================
+-- run / retry / scheduler_tick write the enqueue intent in the same
+-- transaction as the task state change; the relay (python -m worker.outbox_relay)
+-- publishes pending rows to the broker and deletes them.
+-- celery_task_id is generated at write time and is also tasks.celery_task_id:
+-- a message re-published after a relay crash carries the same id, and
+-- fm.run_task only runs when the id still matches the task (no duplicates,
+-- stale messages are skipped).
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS public.task_outbox (
+    id bigserial PRIMARY KEY,
+    company_id uuid NOT NULL,
+    task_id uuid,
+    celery_task_id text NOT NULL UNIQUE,
+    task_name text NOT NULL,
+    args jsonb NOT NULL DEFAULT '[]'::jsonb,
+    kwargs jsonb NOT NULL DEFAULT '{}'::jsonb,
+    options jsonb NOT NULL DEFAULT '{}'::jsonb,     -- send_task options (queue, priority, ...)
+    attempts integer NOT NULL DEFAULT 0,
+    last_error text,
+    available_at timestamptz NOT NULL DEFAULT now(),
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_task_outbox_available
+    ON public.task_outbox (available_at, id);
+
+ALTER TABLE public.task_outbox OWNER TO fluidmanager;
+ALTER SEQUENCE public.task_outbox_id_seq OWNER TO fluidmanager;
+
+-- relay wake-up, once per inserting statement
+CREATE OR REPLACE FUNCTION public.task_outbox_notify()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('fm_outbox', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_task_outbox_notify ON public.task_outbox;
+CREATE TRIGGER trg_task_outbox_notify
+    AFTER INSERT ON public.task_outbox
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION public.task_outbox_notify();
+
+-- tasks still carrying the old two-phase marker go back to the scheduler
+UPDATE public.tasks
+SET celery_task_id = NULL
+WHERE status = 'queued'
+  AND celery_task_id = '__PENDING__';
+
+GRANT ALL ON public.task_outbox TO fluidmanager;
+GRANT USAGE, SELECT ON SEQUENCE public.task_outbox_id_seq TO fluidmanager;
+GRANT EXECUTE ON FUNCTION public.task_outbox_notify() TO fluidmanager;
@@ -0,0 +1,13 @@
+-- =============================================================================
+-- FluidManager Schema Migration v14: Portrait derivatives
+-- =============================================================================
+-- Resized square variants generated after upload (64 / 128 / 256 px, WebP +
+-- JPEG), so avatar views no longer download the original image:
+--   derivatives = {"64": {"webp": "<uri>", "jpeg": "<uri>"}, "128": {...}, ...}
+-- Empty until generation finished: readers fall back to uri.
+-- =============================================================================
+
+ALTER TABLE public.portrait_library
+    ADD COLUMN IF NOT EXISTS derivatives jsonb NOT NULL DEFAULT '{}'::jsonb,
+    ADD COLUMN IF NOT EXISTS width integer,
+    ADD COLUMN IF NOT EXISTS height integer;
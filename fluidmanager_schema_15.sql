@@ -0,0 +1,15 @@
+-- =============================================================================
+-- FluidManager Schema Migration v15: Content-addressed portraits
+-- =============================================================================
+-- Portrait files are stored as <sha256>.<ext> (derivatives <sha256>_<size>.<ext>)
+-- in the portrait storage backend (filesystem volume or S3). The hash is kept
+-- here so uploading the same image twice returns the existing portrait.
+-- Rows uploaded before v15 keep their random file names and a NULL hash.
+-- =============================================================================
+
+ALTER TABLE public.portrait_library
+    ADD COLUMN IF NOT EXISTS content_sha256 text;
+
+CREATE UNIQUE INDEX IF NOT EXISTS portrait_library_content_sha256_uq
+    ON public.portrait_library (content_sha256)
+    WHERE content_sha256 IS NOT NULL;
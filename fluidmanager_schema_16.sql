@@ -0,0 +1,182 @@
+-- =============================================================================
+-- FluidManager Schema Migration v16: One dependency rule for trigger and API
+-- =============================================================================
+-- on_dependency_failure was only applied by tasks_release_waiters (v10), i.e.
+-- when a dependee changed state. A waiter created or linked to a dependee that
+-- had already failed / been canceled was born (or left) queued and ran, even
+-- with policy block or fail.
+--
+-- tasks_settle_waiters(waiter_ids) now holds the rule, for every caller:
+--   - the v10 statement trigger (a dependee became terminal);
+--   - task creation (tasks:batch) and add_dependencies, right after the edges
+--     are written.
+-- Candidates: blocked waiters (blocked_reason '', waiting_dependencies or
+-- dependency_failed) and queued tasks not dispatched yet (no celery_task_id).
+--   failed / canceled dependee + policy fail  -> failed (failed_dependencies)
+--   failed / canceled dependee + policy block -> blocked (dependency_failed)
+--   all dependees terminal otherwise          -> queued (fm_task_dispatch)
+--   some dependee still pending               -> blocked (waiting_dependencies)
+-- Returns the waiters whose state changed, with the outcome.
+-- =============================================================================
+
+CREATE OR REPLACE FUNCTION public.tasks_settle_waiters(p_waiter_ids uuid[])
+RETURNS TABLE (waiter_id uuid, outcome text) AS $$
+DECLARE
+    changes jsonb;
+BEGIN
+    IF p_waiter_ids IS NULL OR cardinality(p_waiter_ids) = 0 THEN
+        RETURN;
+    END IF;
+
+    -- lock them: a concurrent transaction finishing another dependee of the
+    -- same waiter waits here, then sees our commit
+    PERFORM 1
+    FROM public.tasks w
+    WHERE w.id = ANY(p_waiter_ids)
+      AND w.status IN ('blocked', 'queued')
+    ORDER BY w.id
+    FOR UPDATE;
+
+    WITH waiters AS (
+        SELECT w.id, w.company_id,
+               COALESCE(w.control_json->>'on_dependency_failure', 'ignore') AS policy
+        FROM public.tasks w
+        WHERE w.id = ANY(p_waiter_ids)
+          AND (
+              (w.status = 'blocked'
+               AND COALESCE(w.runtime_json->>'blocked_reason', '')
+                   IN ('', 'waiting_dependencies', 'dependency_failed'))
+              OR (w.status = 'queued' AND COALESCE(w.celery_task_id, '') = '')
+          )
+    ),
+    state AS (
+        SELECT wt.id, wt.company_id, wt.policy,
+               count(*) FILTER (WHERE t.status NOT IN ('done', 'failed', 'canceled')) AS pending,
+               array_agg(t.id) FILTER (WHERE t.status IN ('failed', 'canceled')) AS failed_deps
+        FROM waiters wt
+        JOIN public.task_dependencies d ON d.waiter_task_id = wt.id
+        JOIN public.tasks t ON t.id = d.dependee_task_id
+        GROUP BY wt.id, wt.company_id, wt.policy
+    ),
+    decided AS (
+        SELECT id, company_id, failed_deps,
+               CASE
+                   WHEN failed_deps IS NOT NULL AND policy = 'fail' THEN 'fail'
+                   WHEN failed_deps IS NOT NULL AND policy = 'block' THEN 'hold'
+                   WHEN pending = 0 THEN 'release'
+                   ELSE 'wait'
+               END AS action
+        FROM state
+    ),
+    released AS (
+        UPDATE public.tasks t
+        SET status = 'queued',
+            runtime_json = COALESCE(t.runtime_json, '{}'::jsonb)
+                - 'blocked_reason' - 'failed_dependencies'
+        FROM decided x
+        WHERE x.id = t.id AND x.action = 'release'
+          AND t.status = 'blocked'
+        RETURNING t.id, t.company_id
+    ),
+    waiting AS (
+        UPDATE public.tasks t
+        SET status = 'blocked',
+            runtime_json = COALESCE(t.runtime_json, '{}'::jsonb)
+                || jsonb_build_object('blocked_reason', 'waiting_dependencies')
+        FROM decided x
+        WHERE x.id = t.id AND x.action = 'wait'
+          AND t.status = 'queued'
+        RETURNING t.id, t.company_id
+    ),
+    failed AS (
+        UPDATE public.tasks t
+        SET status = 'failed',
+            last_error = 'Dependency failed: ' || x.failed_deps[1]::text,
+            runtime_json = (COALESCE(t.runtime_json, '{}'::jsonb) - 'blocked_reason')
+                || jsonb_build_object('failed_dependencies', to_jsonb(x.failed_deps))
+        FROM decided x
+        WHERE x.id = t.id AND x.action = 'fail'
+        RETURNING t.id, t.company_id, x.failed_deps
+    ),
+    held AS (
+        UPDATE public.tasks t
+        SET status = 'blocked',
+            runtime_json = COALESCE(t.runtime_json, '{}'::jsonb)
+                || jsonb_build_object(
+                    'blocked_reason', 'dependency_failed',
+                    'failed_dependencies', to_jsonb(x.failed_deps)
+                )
+        FROM decided x
+        WHERE x.id = t.id AND x.action = 'hold'
+          AND (t.status <> 'blocked'
+               OR t.runtime_json->'failed_dependencies' IS DISTINCT FROM to_jsonb(x.failed_deps))
+        RETURNING t.id, t.company_id, x.failed_deps
+    ),
+    events AS (
+        INSERT INTO public.task_events (company_id, task_id, event_type, actor_type, payload)
+        SELECT company_id, id, 'dependencies_released', 'system',
+               jsonb_build_object('ts', now())
+        FROM released
+        UNION ALL
+        SELECT company_id, id, 'dependency_failed', 'system',
+               jsonb_build_object('ts', now(), 'policy', 'fail', 'failed_dependencies', to_jsonb(failed_deps))
+        FROM failed
+        UNION ALL
+        SELECT company_id, id, 'dependency_failed', 'system',
+               jsonb_build_object('ts', now(), 'policy', 'block', 'failed_dependencies', to_jsonb(failed_deps))
+        FROM held
+        RETURNING 1
+    )
+    SELECT jsonb_agg(jsonb_build_object('task_id', c.id, 'company_id', c.company_id, 'outcome', c.outcome))
+      INTO changes
+    FROM (
+        SELECT id, company_id, 'release' AS outcome FROM released
+        UNION ALL SELECT id, company_id, 'wait' FROM waiting
+        UNION ALL SELECT id, company_id, 'fail' FROM failed
+        UNION ALL SELECT id, company_id, 'hold' FROM held
+    ) c;
+
+    IF changes IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- dispatcher wake-up (outbox relay; the scheduler tick still polls)
+    PERFORM pg_notify('fm_task_dispatch', jsonb_build_object(
+                'task_id', m->'task_id',
+                'company_id', m->'company_id',
+                'reason', 'dependencies_released'
+            )::text)
+    FROM jsonb_array_elements(changes) AS m
+    WHERE m->>'outcome' = 'release';
+
+    RETURN QUERY
+    SELECT (m->>'task_id')::uuid, m->>'outcome'
+    FROM jsonb_array_elements(changes) AS m;
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT EXECUTE ON FUNCTION public.tasks_settle_waiters(uuid[]) TO fluidmanager;
+
+
+-- v10 trigger: finds the waiters of rows that just became terminal, then
+-- applies the shared rule
+CREATE OR REPLACE FUNCTION public.tasks_release_waiters()
+RETURNS TRIGGER AS $$
+DECLARE
+    waiter_ids uuid[];
+BEGIN
+    SELECT array_agg(DISTINCT d.waiter_task_id)
+      INTO waiter_ids
+    FROM new_rows n
+    JOIN old_rows o ON o.id = n.id
+    JOIN public.task_dependencies d ON d.dependee_task_id = n.id
+    WHERE n.status IN ('done', 'failed', 'canceled')
+      AND o.status IS DISTINCT FROM n.status;
+
+    IF waiter_ids IS NOT NULL THEN
+        PERFORM public.tasks_settle_waiters(waiter_ids);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,19 @@
+-- =============================================================================
+-- FluidManager Schema Migration v6: Keyset pagination indexes
+-- =============================================================================
+-- Composite indexes matching the (created_at, id) cursors used by
+-- list_tasks, list_task_events and list_artifacts.
+-- CONCURRENTLY: run this file with psql outside of an explicit transaction.
+-- =============================================================================
+
+-- Board pages: tasks of one project, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_project_keyset
+    ON public.tasks (company_id, project_id, created_at DESC, id DESC);
+
+-- Event timeline of one task, oldest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_events_task_keyset
+    ON public.task_events (task_id, created_at, id);
+
+-- Company artifacts, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_artifacts_company_keyset
+    ON public.artifacts (company_id, created_at DESC, id DESC);
@@ -0,0 +1,62 @@
+-- =============================================================================
+-- FluidManager Schema Migration v7: Task notifications (LISTEN/NOTIFY)
+-- =============================================================================
+-- Feeds the API's shared listener (app/task_stream.py):
+--   fm_task_events : one message per inserted task_events row
+--   fm_task_status : one message per tasks.status transition
+-- NOTIFY is transactional: listeners only see committed rows.
+-- =============================================================================
+
+CREATE OR REPLACE FUNCTION public.notify_task_event()
+RETURNS TRIGGER AS $$
+DECLARE
+    msg jsonb;
+BEGIN
+    msg := jsonb_build_object(
+        'id', NEW.id,
+        'task_id', NEW.task_id,
+        'company_id', NEW.company_id,
+        'event_type', NEW.event_type,
+        'actor_type', NEW.actor_type,
+        'created_at', NEW.created_at,
+        'payload', NEW.payload
+    );
+
+    -- NOTIFY payloads are limited to 8000 bytes: big payloads are re-read by the listener
+    IF octet_length(msg::text) > 7500 THEN
+        msg := (msg - 'payload') || jsonb_build_object('truncated', true);
+    END IF;
+
+    PERFORM pg_notify('fm_task_events', msg::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_task_events_notify ON public.task_events;
+CREATE TRIGGER trg_task_events_notify
+    AFTER INSERT ON public.task_events
+    FOR EACH ROW
+    EXECUTE FUNCTION public.notify_task_event();
+
+CREATE OR REPLACE FUNCTION public.notify_task_status()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('fm_task_status', jsonb_build_object(
+        'task_id', NEW.id,
+        'company_id', NEW.company_id,
+        'status', NEW.status,
+        'old_status', OLD.status
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_tasks_status_notify ON public.tasks;
+CREATE TRIGGER trg_tasks_status_notify
+    AFTER UPDATE OF status ON public.tasks
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION public.notify_task_status();
+
+GRANT EXECUTE ON FUNCTION public.notify_task_event() TO fluidmanager;
+GRANT EXECUTE ON FUNCTION public.notify_task_status() TO fluidmanager;
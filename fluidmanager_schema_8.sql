@@ -0,0 +1,43 @@
+-- =============================================================================
+-- FluidManager Schema Migration v8: Trigram search documents
+-- =============================================================================
+-- Each searchable admin table gets a generated, lower-cased `search_doc`
+-- column with a pg_trgm GIN index. `search_doc ILIKE '%x%'` and the
+-- word-similarity operator (`<%`) can then use the index instead of a
+-- sequential scan. Used by the admin lists and GET /admin/search.
+-- =============================================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Companies: code, name, legal_name
+ALTER TABLE public.companies
+    ADD COLUMN IF NOT EXISTS search_doc text GENERATED ALWAYS AS (
+        lower(code || ' ' || name || ' ' || COALESCE(legal_name, ''))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_companies_search_trgm
+    ON public.companies USING gin (search_doc gin_trgm_ops);
+
+-- Admin users: email, first_name, last_name, organization
+ALTER TABLE public.admin_users
+    ADD COLUMN IF NOT EXISTS search_doc text GENERATED ALWAYS AS (
+        lower(email::text || ' ' || first_name || ' ' || last_name || ' ' || COALESCE(organization, ''))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_admin_users_search_trgm
+    ON public.admin_users USING gin (search_doc gin_trgm_ops);
+
+-- Blueprints: code, role (fr/en), default names
+ALTER TABLE public.blueprints
+    ADD COLUMN IF NOT EXISTS search_doc text GENERATED ALWAYS AS (
+        lower(
+            code
+            || ' ' || COALESCE(role->>'fr', '')
+            || ' ' || COALESCE(role->>'en', '')
+            || ' ' || COALESCE(default_first_name, '')
+            || ' ' || COALESCE(default_last_name, '')
+        )
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_blueprints_search_trgm
+    ON public.blueprints USING gin (search_doc gin_trgm_ops);
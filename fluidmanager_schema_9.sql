@@ -0,0 +1,95 @@
+-- =============================================================================
+-- FluidManager Schema Migration v9: Task change feed (delta sync)
+-- =============================================================================
+-- - tasks.updated_at is maintained by a trigger on every UPDATE
+-- - task_changes keeps one row per task with a monotonic change_seq and the
+--   writing transaction id; deletes leave a tombstone (deleted = true)
+-- Read by GET /companies/{company}/projects/{project}/tasks/changes.
+-- The feed lives in its own table so the extra index on change_seq does not
+-- make every task update non-HOT.
+-- =============================================================================
+
+-- 1) updated_at
+CREATE OR REPLACE FUNCTION public.tasks_touch_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_tasks_touch_updated_at ON public.tasks;
+CREATE TRIGGER trg_tasks_touch_updated_at
+    BEFORE UPDATE ON public.tasks
+    FOR EACH ROW
+    WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION public.tasks_touch_updated_at();
+
+-- 2) Change feed
+CREATE SEQUENCE IF NOT EXISTS public.task_change_seq;
+
+CREATE TABLE IF NOT EXISTS public.task_changes (
+    task_id uuid PRIMARY KEY,              -- no FK: tombstones outlive the task
+    company_id uuid NOT NULL,
+    project_id uuid,
+    change_seq bigint NOT NULL,
+    change_xid xid8 NOT NULL,              -- writer transaction (see the API cursor)
+    deleted boolean NOT NULL DEFAULT false,
+    changed_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_task_changes_project_seq
+    ON public.task_changes (company_id, project_id, change_seq);
+
+ALTER TABLE public.task_changes OWNER TO fluidmanager;
+ALTER SEQUENCE public.task_change_seq OWNER TO fluidmanager;
+
+CREATE OR REPLACE FUNCTION public.tasks_record_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    r record;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        r := OLD;
+    ELSE
+        r := NEW;
+    END IF;
+
+    INSERT INTO public.task_changes (task_id, company_id, project_id, change_seq, change_xid, deleted, changed_at)
+    VALUES (r.id, r.company_id, r.project_id, nextval('public.task_change_seq'),
+            pg_current_xact_id(), TG_OP = 'DELETE', now())
+    ON CONFLICT (task_id) DO UPDATE
+    SET company_id = EXCLUDED.company_id,
+        project_id = EXCLUDED.project_id,
+        change_seq = EXCLUDED.change_seq,
+        change_xid = EXCLUDED.change_xid,
+        deleted = EXCLUDED.deleted,
+        changed_at = EXCLUDED.changed_at;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_tasks_record_change ON public.tasks;
+CREATE TRIGGER trg_tasks_record_change
+    AFTER INSERT OR DELETE ON public.tasks
+    FOR EACH ROW
+    EXECUTE FUNCTION public.tasks_record_change();
+
+DROP TRIGGER IF EXISTS trg_tasks_record_update ON public.tasks;
+CREATE TRIGGER trg_tasks_record_update
+    AFTER UPDATE ON public.tasks
+    FOR EACH ROW
+    WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION public.tasks_record_change();
+
+-- 3) Backfill: existing tasks start in the feed
+INSERT INTO public.task_changes (task_id, company_id, project_id, change_seq, change_xid)
+SELECT t.id, t.company_id, t.project_id, nextval('public.task_change_seq'), pg_current_xact_id()
+FROM (SELECT id, company_id, project_id FROM public.tasks ORDER BY created_at) t
+ON CONFLICT (task_id) DO NOTHING;
+
+GRANT ALL ON public.task_changes TO fluidmanager;
+GRANT USAGE, SELECT ON SEQUENCE public.task_change_seq TO fluidmanager;
+GRANT EXECUTE ON FUNCTION public.tasks_touch_updated_at() TO fluidmanager;
+GRANT EXECUTE ON FUNCTION public.tasks_record_change() TO fluidmanager;